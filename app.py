@@ -1,15 +1,68 @@
+import os
 import pyperclip
 import streamlit as st
 import streamlit_nested_layout
-from src.assistant.graph import researcher
-from src.assistant.utils import get_report_structures, process_uploaded_files
+from src.assistant.checkpoints import delete_checkpoints, new_thread_id, node_updates, open_async_checkpointer, resume_input
+from src.assistant.graph import compile_researcher
+from src.assistant.utils import get_report_structures, process_uploaded_files, run_until_complete, warm_up_models
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def generate_response(user_input, enable_web_search, report_structure, max_search_queries):
+# Generation backend of every run, "ollama" runs OLLAMA_MODEL locally
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "deepseek")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "deepseek-r1:7b")
+
+@st.cache_resource
+def warm_up(llm_backend, ollama_model):
+    """Load the local models once per server process, not on every rerun."""
+    warm_up_models({"llm_backend": llm_backend, "ollama_model": ollama_model})
+
+def render_query_timings(events):
+    """Show the per-step timing breakdown of one research query."""
+    rows = []
+    for event in events:
+        if event["type"] == "query":
+            rows.append({"step": "queue (waiting for a slot)", "seconds": round(event["queue_time"], 2)})
+        elif event["type"] == "node":
+            rows.append({"step": event["name"], "seconds": round(event["wall_time"], 2)})
+        elif event["type"] == "call":
+            rows.append({
+                "step": f"  {event['kind']}: {event['name']}",
+                "seconds": round(event["wall_time"], 2),
+                "prompt tokens": event.get("prompt_tokens", 0),
+                "completion tokens": event.get("completion_tokens", 0),
+                "retries": event.get("retries", 0),
+                "cached": event.get("cache_hit", False),
+            })
+        elif event["type"] == "gate":
+            similarity = f"{event['similarity']:.2f}" if event["similarity"] is not None else "n/a"
+            rows.append({
+                "step": f"  relevance gate: {event['decision']} (similarity {similarity})",
+                "seconds": 0.0,
+            })
+        elif event["type"] == "prompt":
+            rows.append({
+                "step": f"  {event['name']} prompt",
+                "seconds": 0.0,
+                "prompt tokens": event["prompt_tokens"],
+            })
+        elif event["type"] == "prune":
+            rows.append({
+                "step": f"  pruning: kept {event['documents_kept']}/{event['documents_total']} documents, "
+                        f"{event['tokens_saved']} tokens saved",
+                "seconds": 0.0,
+            })
+    if rows:
+        st.caption("Timing breakdown")
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+def generate_response(user_input, enable_web_search, report_structure, max_search_queries, max_concurrent_queries, thread_id):
     """
     Generate response using the researcher agent and stream steps
+
+    The run is checkpointed under `thread_id`, calling this again with the
+    same thread ID resumes it where it stopped.
     """
     # Initialize state for the researcher
     initial_state = {
@@ -21,11 +74,19 @@ def generate_response(user_input, enable_web_search, report_structure, max_searc
         "enable_web_search": enable_web_search,
         "report_structure": report_structure,
         "max_search_queries": max_search_queries,
+        "max_concurrent_queries": max_concurrent_queries,
+        "llm_backend": LLM_BACKEND,
+        "ollama_model": OLLAMA_MODEL,
+        "thread_id": thread_id,
     }}
 
     # Create the status for the global "Researcher" process
     langgraph_status = st.status("**Researcher Running...**", state="running")
 
+    # The report is rendered here while it is being written
+    report_placeholder = st.empty()
+    report_tokens = []
+
     # Force order of expanders by creating them before iteration
     with langgraph_status:
         generate_queries_expander = st.expander("Generate Research Queries", expanded=False)
@@ -33,29 +94,66 @@ def generate_response(user_input, enable_web_search, report_structure, max_searc
         final_answer_expander = st.expander("Generate Final Answer", expanded=False)
 
         steps = []
-
-        # Run the researcher graph and stream outputs
-        for output in researcher.stream(initial_state, config=config):
-            for key, value in output.items():
-                expander_label = key.replace("_", " ").title()
-
-                if key == "generate_research_queries":
-                    with generate_queries_expander:
-                        st.write(value)
-
-                elif key.startswith("search_and_summarize_query"):
-                    with search_queries_expander:
-                        with st.expander(expander_label, expanded=False):
-                            st.write(value)
-
-                elif key == "generate_final_answer":
-                    with final_answer_expander:
-                        st.write(value)
-
-                steps.append({"step": key, "content": value})
+        # Trace events (timings, tokens) of each query, streamed before the query completes
+        query_events = {}
+
+        async def stream_researcher():
+            # Runs are checkpointed under their thread ID, an interrupted run
+            # is resumed without redoing the queries it already finished
+            async with open_async_checkpointer() as checkpointer:
+                researcher = compile_researcher(checkpointer)
+                inputs = initial_state
+                if checkpointer is not None:
+                    inputs = await resume_input(researcher, config, initial_state)
+
+                # Run the researcher graph asynchronously and stream outputs
+                async for mode, output in researcher.astream(inputs, config=config, stream_mode=["updates", "custom"]):
+                    if mode == "custom":
+                        if output["type"] == "token":
+                            report_tokens.append(output["text"])
+                            report_placeholder.markdown("".join(report_tokens) + "▌")
+                            continue
+                        if output["type"] == "query_cache" and output["hit"]:
+                            with search_queries_expander:
+                                st.caption(f"{output['query']}: served from the cache of \"{output['cached_query']}\"")
+                            continue
+                        if output["type"] == "dedup" and output["subgraph_runs_saved"]:
+                            with generate_queries_expander:
+                                st.caption(f"Merged {output['subgraph_runs_saved']} duplicate queries: {output['merged']}")
+                        if output.get("query"):
+                            query_events.setdefault(output["query"], []).append(output)
+                        continue
+
+                    for key, value in node_updates(output):
+                        expander_label = key.replace("_", " ").title()
+
+                        if key == "generate_research_queries":
+                            with generate_queries_expander:
+                                st.write(value)
+
+                        elif key.startswith("search_and_summarize_query"):
+                            query = value["query_timings"][0]["query"]
+                            with search_queries_expander:
+                                with st.expander(expander_label, expanded=False):
+                                    st.write(value)
+                                    render_query_timings(query_events.get(query, []))
+
+                        elif key == "generate_final_answer":
+                            with final_answer_expander:
+                                st.write(value)
+
+                        steps.append({"step": key, "content": value})
+
+                # The run completed, its checkpoints are no longer needed
+                await delete_checkpoints(checkpointer, thread_id)
+
+        # Each request runs on its own event loop, its connections are closed with it
+        run_until_complete(stream_researcher())
 
     # Update status to complete
     langgraph_status.update(state="complete", label="**Using Langgraph** (Research completed)")
+    # The complete report is shown in the chat message instead
+    report_placeholder.empty()
 
     # Return the final report
     return steps[-1]["content"] if steps else "No response generated"
@@ -67,6 +165,7 @@ def clear_chat():
 
 def main():
     st.set_page_config(page_title="Workshoprobot RAG Researcher", layout="wide")
+    warm_up(LLM_BACKEND, OLLAMA_MODEL)
 
     # Initialize session states
     if "processing_complete" not in st.session_state:
@@ -79,8 +178,12 @@ def main():
         st.session_state.selected_report_structure = None
     if "max_search_queries" not in st.session_state:
         st.session_state.max_search_queries = 5  # Default value of 5
+    if "max_concurrent_queries" not in st.session_state:
+        st.session_state.max_concurrent_queries = 3
     if "files_ready" not in st.session_state:
         st.session_state.files_ready = False  # Tracks if files are uploaded but not processed
+    if "pending_run" not in st.session_state:
+        st.session_state.pending_run = None  # Research run started but not finished (error, rerun)
 
     # Title row with clear button
     col1, col2 = st.columns([6, 1])
@@ -137,6 +240,15 @@ def main():
         help="Set the maximum number of search queries to be made. (1-10)"
     )
     
+    # Number of queries researched at the same time
+    st.session_state.max_concurrent_queries = st.sidebar.number_input(
+        "Max Concurrent Queries",
+        min_value=1,
+        max_value=10,
+        value=st.session_state.max_concurrent_queries,
+        help="Number of queries researched in parallel. Lower it if you hit provider rate limits. (1-10)"
+    )
+
     enable_web_search = st.sidebar.checkbox("Enable Web Search", value=False)
 
     # Upload file logic
@@ -181,6 +293,13 @@ def main():
                 if st.button("📋", key=f"copy_{len(st.session_state.messages)}"):
                     pyperclip.copy(message["content"])
 
+    # An interrupted run can be resumed from its checkpoint
+    run = None
+    if st.session_state.pending_run is not None:
+        st.sidebar.caption(f"Interrupted research run: `{st.session_state.pending_run['thread_id']}`")
+        if st.sidebar.button("Resume Research", use_container_width=True):
+            run = st.session_state.pending_run
+
     # Chat input and response handling
     if user_input := st.chat_input("Type your message here..."):
         # Add user message
@@ -188,14 +307,21 @@ def main():
         with st.chat_message("user"):
             st.write(user_input)
 
-        # Generate and display assistant response
-        report_structure = st.session_state.selected_report_structure["content"]
-        assistant_response = generate_response(
-            user_input, 
-            enable_web_search, 
-            report_structure,
-            st.session_state.max_search_queries
-        )
+        run = {
+            "user_input": user_input,
+            "enable_web_search": enable_web_search,
+            "report_structure": st.session_state.selected_report_structure["content"],
+            "max_search_queries": st.session_state.max_search_queries,
+            "max_concurrent_queries": st.session_state.max_concurrent_queries,
+            "thread_id": new_thread_id(),
+        }
+
+    if run is not None:
+        # Generate and display assistant response, the run stays pending
+        # until it completes
+        st.session_state.pending_run = run
+        assistant_response = generate_response(**run)
+        st.session_state.pending_run = None
 
         # Store assistant message
         st.session_state.messages.append({"role": "assistant", "content": assistant_response["final_answer"]})
@@ -0,0 +1,224 @@
+"""
+Fake OpenAI-compatible provider server for exercising the call governor.
+
+The server answers `/chat/completions` (plain and streamed) and
+`/embeddings`, and injects rate limits (429 with `Retry-After`), server
+errors (503) and tail latency at configurable ratios. Running this module
+points the Deepseek client at the server, fires concurrent `invoke_llm` /
+`ainvoke_llm` calls through the governor and prints its stats:
+
+    python -m benchmarks.fake_provider --calls 50 --rate-limit-ratio 0.2 --hedge-after 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FaultInjector:
+    """Decides the fate of every request: rate limited, failed, slow or normal."""
+
+    def __init__(self, rate_limit_ratio=0.0, error_ratio=0.0, slow_ratio=0.0, latency=0.05, slow_latency=2.0,
+                 retry_after=None, seed=0):
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        self.slow_ratio = slow_ratio
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after
+        self.counts = {"requests": 0, "rate_limited": 0, "errors": 0, "slow": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        with self._lock:
+            self.counts["requests"] += 1
+            roll = self._random.random()
+            if roll < self.rate_limit_ratio:
+                self.counts["rate_limited"] += 1
+                return 429, 0.0
+            if roll < self.rate_limit_ratio + self.error_ratio:
+                self.counts["errors"] += 1
+                return 503, 0.0
+            if self._random.random() < self.slow_ratio:
+                self.counts["slow"] += 1
+                return 200, self.slow_latency
+            return 200, self.latency
+
+def _completion(model, text):
+    return {
+        "id": f"chatcmpl-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": len(text.split()), "total_tokens": 10 + len(text.split())},
+    }
+
+def _chunk(model, delta, finish_reason=None, usage=None):
+    chunk = {
+        "id": "chatcmpl-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+    }
+    if usage is not None:
+        chunk["usage"] = usage
+    return chunk
+
+def make_handler(faults):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            status, latency = faults.draw()
+            if status == 429:
+                headers = {"Retry-After": str(faults.retry_after)} if faults.retry_after is not None else {}
+                return self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, headers)
+            if status != 200:
+                return self._send_json(status, {"error": {"message": "Service unavailable", "type": "server_error"}})
+            time.sleep(latency)
+
+            if self.path.endswith("/embeddings"):
+                inputs = request.get("input", [])
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                data = [{"object": "embedding", "index": i, "embedding": [random.random() for _ in range(8)]} for i in range(len(inputs))]
+                return self._send_json(200, {"object": "list", "data": data, "model": request.get("model"),
+                                             "usage": {"prompt_tokens": 1, "total_tokens": 1}})
+
+            model = request.get("model", "fake")
+            text = f"Answer to: {request['messages'][-1]['content'][:40]}"
+            if not request.get("stream"):
+                return self._send_json(200, _completion(model, text))
+
+            # Server-sent events, one chunk per word and the usage last
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunks = [_chunk(model, {"role": "assistant", "content": ""})]
+            chunks += [_chunk(model, {"content": word + " "}) for word in text.split()]
+            chunks.append(_chunk(model, {}, finish_reason="stop"))
+            chunks.append(_chunk(model, None, usage=_completion(model, text)["usage"]))
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return Handler
+
+def start_server(faults, port=0):
+    """Start the fake provider on a background thread, returning the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exercise the call governor against a fake provider server")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--parallel", type=int, default=10, help="Calls in flight at the same time")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--stream", action="store_true", help="Stream the completions")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.2)
+    parser.add_argument("--error-ratio", type=float, default=0.05)
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After header of 429 responses")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Governor requests per second")
+    parser.add_argument("--deadline", type=float, default=None, help="Governor deadline per call")
+    parser.add_argument("--hedge-after", type=float, default=None, help="Governor hedging delay")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    faults = FaultInjector(args.rate_limit_ratio, args.error_ratio, args.slow_ratio, args.latency,
+                           args.slow_latency, args.retry_after)
+    server = start_server(faults)
+
+    # Route the Deepseek client to the fake server, without the response cache
+    os.environ["DEEPSEEK_API_BASE"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["DEEPSEEK_API_KEY"] = "fake"
+    os.environ.pop("LLM_CACHE_PATH", None)
+    for name, value in (("RATE_LIMIT", args.rate_limit), ("DEADLINE", args.deadline), ("HEDGE_AFTER", args.hedge_after)):
+        if value is not None:
+            os.environ[f"DEEPSEEK_{name}"] = str(value)
+
+    from src.assistant.governor import get_governor_stats, reset_governors
+    from src.assistant.utils import ainvoke_llm, astream_llm, invoke_llm, run_until_complete, stream_llm
+    reset_governors()
+
+    prompts = [f"Question {i}" for i in range(args.calls)]
+    outcomes = {"ok": 0, "failed": 0}
+    latencies = []
+
+    def record(started_at, error=None):
+        outcomes["failed" if error else "ok"] += 1
+        latencies.append(time.perf_counter() - started_at)
+
+    def run_sync(prompt):
+        started_at = time.perf_counter()
+        try:
+            if args.stream:
+                stream_llm("You are a test", prompt, on_token=lambda text: None)
+            else:
+                invoke_llm("You are a test", prompt)
+            record(started_at)
+        except Exception as e:
+            record(started_at, e)
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(args.parallel)
+
+        async def one(prompt):
+            async with semaphore:
+                started_at = time.perf_counter()
+                try:
+                    if args.stream:
+                        await astream_llm("You are a test", prompt, on_token=lambda text: None)
+                    else:
+                        await ainvoke_llm("You are a test", prompt)
+                    record(started_at)
+                except Exception as e:
+                    record(started_at, e)
+
+        await asyncio.gather(*(one(prompt) for prompt in prompts))
+
+    started_at = time.perf_counter()
+    if args.mode == "sync":
+        with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+            list(pool.map(run_sync, prompts))
+    else:
+        run_until_complete(run_async())
+    wall_time = time.perf_counter() - started_at
+    server.shutdown()
+
+    latencies.sort()
+    print(f"Calls: {outcomes['ok']} succeeded, {outcomes['failed']} failed in {wall_time:.2f}s "
+          f"(p50 {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s)")
+    print(f"Server: {faults.counts}")
+    for provider, stats in get_governor_stats().items():
+        print(f"Governor {provider}: {stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Deterministic stand-ins for the LLM, embedding and web search providers.
+
+Every fake sleeps for a configurable latency plus uniform jitter, so the
+benchmark exercises the same concurrency behavior as live providers
+without any network access or API keys.
+"""
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.assistant.tracing import trace_call
+from src.assistant.utils import DocumentGrades, Queries
+
+class Latency:
+    """Latency model: `base` seconds plus uniform jitter in [0, `jitter`]."""
+
+    def __init__(self, base=0.0, jitter=0.0, seed=0):
+        self.base = base
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            return self.base + self._random.uniform(0, self.jitter)
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+    async def asleep(self):
+        await asyncio.sleep(self.sample())
+
+def _stable_fraction(text):
+    """Map a text to a stable number in [0, 1)."""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000
+
+class FakeLLM:
+    """
+    Drop-in replacement for `invoke_llm` / `ainvoke_llm` and their streaming
+    counterparts `stream_llm` / `astream_llm`.
+
+    Returns as many `Queries` as the query writer prompt allows, a stable
+    `duplicate_query_ratio` share of them repeating the previous one, finds
+    relevant documents for a stable `relevant_ratio` share of queries, and
+    returns canned summaries and reports for free-text calls.
+    """
+
+    def __init__(self, latency, relevant_ratio=0.8, duplicate_query_ratio=0.0):
+        self.latency = latency
+        self.relevant_ratio = relevant_ratio
+        self.duplicate_query_ratio = duplicate_query_ratio
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, system_prompt, user_prompt, output_format):
+        with self._lock:
+            self.calls += 1
+
+        if output_format is Queries:
+            match = re.search(r"up to (\d+) queries", system_prompt)
+            max_queries = int(match.group(1)) if match else 3
+            topic = user_prompt.split(":", 1)[-1].strip()
+            queries = []
+            for i in range(max_queries):
+                # A stable share of queries repeats the previous one
+                if queries and _stable_fraction(f"{topic} {i}") < self.duplicate_query_ratio:
+                    queries.append(queries[-1])
+                else:
+                    queries.append(f"{topic} aspect {i + 1}")
+            return Queries(queries=queries)
+
+        if output_format is DocumentGrades:
+            # Relevant queries get their first document graded relevant and
+            # stable grades for the others, irrelevant ones get low grades only
+            query = user_prompt.split(":", 1)[-1].strip()
+            num_documents = len(re.findall(r"^\[Document \d+\]", system_prompt, re.MULTILINE))
+            if _stable_fraction(query) >= self.relevant_ratio:
+                return DocumentGrades(scores=[0.1] * num_documents)
+            return DocumentGrades(scores=[0.9] + [_stable_fraction(f"{query} {i}") for i in range(1, num_documents)])
+
+        if output_format is not None:
+            # Any other schema: build it from the schema defaults
+            return output_format.model_validate({})
+
+        return f"Synthetic response ({len(system_prompt)} prompt characters). " * 20
+
+    def invoke(self, system_prompt, user_prompt, output_format=None, temperature=0, **kwargs):
+        with trace_call("llm", "fake") as span:
+            self.latency.sleep()
+            span["prompt_tokens"] = len(system_prompt + user_prompt) // 4
+            return self._respond(system_prompt, user_prompt, output_format)
+
+    async def ainvoke(self, system_prompt, user_prompt, output_format=None, temperature=0, **kwargs):
+        with trace_call("llm", "fake") as span:
+            await self.latency.asleep()
+            span["prompt_tokens"] = len(system_prompt + user_prompt) // 4
+            return self._respond(system_prompt, user_prompt, output_format)
+
+    def _chunks(self, text):
+        # Word sized chunks, like a provider token stream
+        return re.findall(r"\S+\s*", text)
+
+    def stream(self, system_prompt, user_prompt, on_token, temperature=0, **kwargs):
+        with trace_call("llm", "fake", streaming=True) as span:
+            self.latency.sleep()
+            span["prompt_tokens"] = len(system_prompt + user_prompt) // 4
+            response = self._respond(system_prompt, user_prompt, None)
+            for chunk in self._chunks(response):
+                on_token(chunk)
+            return response
+
+    async def astream(self, system_prompt, user_prompt, on_token, temperature=0, **kwargs):
+        with trace_call("llm", "fake", streaming=True) as span:
+            await self.latency.asleep()
+            span["prompt_tokens"] = len(system_prompt + user_prompt) // 4
+            response = self._respond(system_prompt, user_prompt, None)
+            for chunk in self._chunks(response):
+                on_token(chunk)
+            return response
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    """Hash-seeded random vectors with a simulated request latency per call."""
+
+    latency: Latency
+    requests: int = 0
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        self.latency.sleep()
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.requests += 1
+        self.latency.sleep()
+        return super().embed_query(text)
+
+    # Queries are embedded like documents, in one request (as with OpenAI)
+    def embed_queries(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        self.requests += 1
+        await self.latency.asleep()
+        return super().embed_documents(texts)
+
+    async def aembed_queries(self, texts):
+        return await self.aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        self.requests += 1
+        await self.latency.asleep()
+        return super().embed_query(text)
+
+class FakeTavily:
+    """Replacement for `web_search` / `aweb_search` returning synthetic pages."""
+
+    def __init__(self, latency, max_results=3):
+        self.latency = latency
+        self.max_results = max_results
+
+    def _results(self, query, max_results):
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"{query} - result {i + 1}",
+                    "url": f"https://example.com/{hashlib.sha1(query.encode()).hexdigest()[:8]}/{i}",
+                    "content": f"Snippet {i + 1} about {query}.",
+                    "raw_content": f"Full page {i + 1} about {query}. " * 50,
+                }
+                for i in range(max_results or self.max_results)
+            ],
+        }
+
+    def search(self, query, include_raw_content=True, max_results=3, **kwargs):
+        self.latency.sleep()
+        return self._results(query, max_results)
+
+    async def asearch(self, query, include_raw_content=True, max_results=3, **kwargs):
+        await self.latency.asleep()
+        return self._results(query, max_results)
+
+TOPICS = [
+    "battery chemistry", "supply chain resilience", "reasoning language models",
+    "renewable energy storage", "semiconductor manufacturing", "clinical trial design",
+    "urban mobility", "quantum error correction", "retail pricing", "climate adaptation",
+]
+
+WORDS = (
+    "analysis growth market model data performance cost risk efficiency capacity "
+    "benchmark adoption policy research evaluation accuracy latency throughput scale "
+    "revenue margin forecast trend region segment strategy investment outcome metric"
+).split()
+
+def write_synthetic_corpus(directory, num_documents, paragraphs=6, seed=0):
+    """Write `num_documents` text files mixing a topic with filler vocabulary."""
+    import os
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for i in range(num_documents):
+        topic = TOPICS[i % len(TOPICS)]
+        body = []
+        for p in range(paragraphs):
+            sentences = [
+                f"The {topic} {rng.choice(WORDS)} shows {rng.choice(WORDS)} {rng.choice(WORDS)} "
+                f"of {rng.randint(1, 99)} percent in {rng.choice(WORDS)}."
+                for _ in range(rng.randint(4, 8))
+            ]
+            body.append(" ".join(sentences))
+        with open(os.path.join(directory, f"doc_{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"# Report {i} on {topic}\n\n" + "\n\n".join(body))
@@ -0,0 +1,264 @@
+"""
+Offline benchmark for the researcher graph.
+
+Runs ingestion and the full research graph over a synthetic corpus with
+fake LLM, embedding and web search providers, for several corpus sizes and
+query concurrency levels, and reports end-to-end latency percentiles,
+per-node timing and throughput.
+
+Usage:
+    python -m benchmarks.run_benchmark --corpus-sizes 50,200 --concurrency 1,3,5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from benchmarks.fakes import FakeEmbeddings, FakeLLM, FakeTavily, Latency, TOPICS, write_synthetic_corpus
+from src.assistant import graph, vector_db
+from src.assistant.ingestion import sync_directory
+from src.assistant.tracing import add_trace_sink, remove_trace_sink
+
+NODE_NAMES = {
+    "generate_research_queries", "search_queries", "search_and_summarize_query", "plan_synthesis",
+    "condense_summaries", "generate_final_answer",
+    "retrieve_rag_documents", "evaluate_retrieved_documents", "web_research", "summarize_query_research",
+}
+
+class NodeTimer(BaseCallbackHandler):
+    """Callback handler recording the wall time of every graph node run."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.timings = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, name=None, **kwargs):
+        if name not in NODE_NAMES:
+            return
+        with self._lock:
+            # The node's task and the runnable inside it share the name, only time the outer one
+            if self._active.get(parent_run_id, (None,))[0] == name:
+                return
+            self._active[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id):
+        with self._lock:
+            name, started_at = self._active.pop(run_id, (None, None))
+            if name:
+                self.timings.setdefault(name, []).append(time.perf_counter() - started_at)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+class RelevanceCounter:
+    """Trace sink counting the merged queries, relevance gate decisions and pruned context."""
+
+    def __init__(self):
+        self.subgraph_runs_saved = 0
+        self.decisions = {}
+        self.pruning = {"documents_total": 0, "documents_kept": 0, "tokens_total": 0, "tokens_saved": 0}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event.get("type") == "dedup":
+                self.subgraph_runs_saved += event["subgraph_runs_saved"]
+            elif event.get("type") == "gate":
+                self.decisions[event["decision"]] = self.decisions.get(event["decision"], 0) + 1
+            elif event.get("type") == "prune":
+                for key in self.pruning:
+                    self.pruning[key] += event[key]
+
+def install_fakes(llm, embeddings, tavily):
+    """Route the graph's provider calls to the fakes."""
+    graph.invoke_llm = llm.invoke
+    graph.ainvoke_llm = llm.ainvoke
+    graph.stream_llm = llm.stream
+    graph.astream_llm = llm.astream
+    graph.web_search = tavily.search
+    graph.aweb_search = tavily.asearch
+    vector_db._embeddings = embeddings
+    vector_db.reset_vector_db()
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def run_sessions(args, concurrency, timer):
+    """Run `args.sessions` research sessions and return their end-to-end latencies."""
+    config = {
+        "configurable": {
+            "enable_web_search": args.web_search,
+            "report_structure": "# Introduction\n# Findings\n# Conclusion",
+            "max_search_queries": args.queries,
+            "max_concurrent_queries": concurrency,
+            "retrieval_mode": args.retrieval_mode,
+            "relevance_gate": not args.no_relevance_gate,
+            "synthesis_mode": args.synthesis_mode,
+        },
+        "callbacks": [timer],
+    }
+    instructions = [
+        {"user_instructions": f"Research the current state of {TOPICS[i % len(TOPICS)]}"}
+        for i in range(args.sessions)
+    ]
+
+    def run_sync(state):
+        started_at = time.perf_counter()
+        for _ in graph.researcher.stream(state, config=config):
+            pass
+        return time.perf_counter() - started_at
+
+    async def run_async(state):
+        started_at = time.perf_counter()
+        async for _ in graph.researcher.astream(state, config=config):
+            pass
+        return time.perf_counter() - started_at
+
+    if args.mode == "sync":
+        with ThreadPoolExecutor(max_workers=args.parallel_sessions) as pool:
+            return list(pool.map(run_sync, instructions))
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.parallel_sessions)
+
+        async def bounded(state):
+            async with semaphore:
+                return await run_async(state)
+
+        return await asyncio.gather(*(bounded(state) for state in instructions))
+
+    return asyncio.run(run_all())
+
+def benchmark_corpus(args, corpus_size, workspace):
+    """Ingest a synthetic corpus of `corpus_size` documents and benchmark every concurrency level."""
+    os.chdir(workspace)
+    llm = FakeLLM(Latency(args.llm_latency, args.jitter, seed=1), relevant_ratio=args.relevant_ratio,
+                  duplicate_query_ratio=args.duplicate_query_ratio)
+    embeddings = FakeEmbeddings(size=args.embedding_size, latency=Latency(args.embedding_latency, args.jitter, seed=2))
+    tavily = FakeTavily(Latency(args.search_latency, args.jitter, seed=3))
+    install_fakes(llm, embeddings, tavily)
+
+    write_synthetic_corpus("files", corpus_size)
+    ingestion = sync_directory("files", workers=args.ingest_workers)
+
+    results = []
+    for concurrency in args.concurrency:
+        timer = NodeTimer()
+        relevance = RelevanceCounter()
+        llm.calls = 0
+        add_trace_sink(relevance)
+        started_at = time.perf_counter()
+        try:
+            latencies = run_sessions(args, concurrency, timer)
+        finally:
+            remove_trace_sink(relevance)
+        wall_time = time.perf_counter() - started_at
+
+        results.append({
+            "corpus_size": corpus_size,
+            "concurrency": concurrency,
+            "sessions": len(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "throughput_per_min": len(latencies) / wall_time * 60,
+            "llm_calls": llm.calls,
+            "subgraph_runs_saved": relevance.subgraph_runs_saved,
+            "gate": dict(relevance.decisions),
+            "pruning": dict(relevance.pruning),
+            "nodes": {
+                name: {"count": len(values), "mean": float(np.mean(values)), "p95": percentile(values, 95)}
+                for name, values in sorted(timer.timings.items())
+            },
+            "ingestion": {
+                key: ingestion[key]
+                for key in ("documents", "chunks", "tokens", "seconds", "documents_per_second", "tokens_per_second")
+            },
+        })
+    return results
+
+def print_results(results):
+    print(f"\n{'corpus':>7} {'conc':>5} {'p50 s':>8} {'p95 s':>8} {'runs/min':>9} {'llm calls':>10}")
+    for result in results:
+        print(f"{result['corpus_size']:>7} {result['concurrency']:>5} {result['p50']:>8.2f} {result['p95']:>8.2f} "
+              f"{result['throughput_per_min']:>9.1f} {result['llm_calls']:>10}")
+        if result["subgraph_runs_saved"]:
+            print(f"{'':>14}query dedup: {result['subgraph_runs_saved']} subgraph runs saved")
+        if result["gate"]:
+            decisions = ", ".join(f"{decision}={count}" for decision, count in sorted(result["gate"].items()))
+            avoided = sum(count for decision, count in result["gate"].items() if decision != "uncertain")
+            print(f"{'':>14}relevance gate: {decisions}, {avoided} LLM calls avoided")
+        pruning = result["pruning"]
+        if pruning["documents_total"]:
+            print(f"{'':>14}pruning: kept {pruning['documents_kept']}/{pruning['documents_total']} documents, "
+                  f"{pruning['tokens_saved']}/{pruning['tokens_total']} tokens saved")
+        for name, node in result["nodes"].items():
+            print(f"{'':>14}{name:<32} n={node['count']:<4} mean={node['mean']:.3f}s p95={node['p95']:.3f}s")
+
+    print("\nIngestion:")
+    for result in {r["corpus_size"]: r for r in results}.values():
+        ingestion = result["ingestion"]
+        print(f"  {result['corpus_size']:>6} docs: {ingestion['chunks']} chunks in {ingestion['seconds']:.2f}s, "
+              f"{ingestion['documents_per_second']:.1f} docs/s, {ingestion['tokens_per_second']:.0f} tokens/s")
+
+def parse_args():
+    def int_list(value):
+        return [int(v) for v in value.split(",") if v]
+
+    parser = argparse.ArgumentParser(description="Offline benchmark for the researcher graph")
+    parser.add_argument("--corpus-sizes", type=int_list, default=[50, 200])
+    parser.add_argument("--concurrency", type=int_list, default=[1, 3, 5])
+    parser.add_argument("--sessions", type=int, default=5, help="Research sessions per configuration")
+    parser.add_argument("--parallel-sessions", type=int, default=1, help="Sessions running at the same time")
+    parser.add_argument("--queries", type=int, default=5, help="max_search_queries per session")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--retrieval-mode", choices=["hybrid", "similarity"], default="hybrid")
+    parser.add_argument("--no-relevance-gate", action="store_true", help="Send every query to the LLM evaluator")
+    parser.add_argument("--synthesis-mode", choices=["auto", "single", "hierarchical"], default="auto")
+    parser.add_argument("--web-search", action="store_true", help="Enable the web search fallback")
+    parser.add_argument("--relevant-ratio", type=float, default=0.8)
+    parser.add_argument("--duplicate-query-ratio", type=float, default=0.0, help="Share of generated queries repeating the previous one")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--embedding-size", type=int, default=256)
+    parser.add_argument("--ingest-workers", type=int, default=None)
+    parser.add_argument("--json", help="Write the results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # Keep the benchmark away from the real caches
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    os.environ.pop("LLM_CACHE_PATH", None)
+
+    cwd = os.getcwd()
+    results = []
+    for corpus_size in args.corpus_sizes:
+        workspace = tempfile.mkdtemp(prefix="researcher-bench-")
+        try:
+            results.extend(benchmark_corpus(args, corpus_size, workspace))
+        finally:
+            os.chdir(cwd)
+            vector_db.reset_vector_db()
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
-from src.assistant.graph import researcher
-from src.assistant.vector_db import get_or_create_vector_db
+import argparse
+import os
+from src.assistant.cache import get_llm_cache
+from src.assistant.checkpoints import delete_checkpoints, new_thread_id, node_updates, open_async_checkpointer, resume_input, with_thread_id
+from src.assistant.governor import get_governor_stats
+from src.assistant.graph import compile_researcher
+from src.assistant.ingestion import sync_directory
+from src.assistant.query_cache import get_query_cache
+from src.assistant.tracing import METRICS
+from src.assistant.utils import run_until_complete, warm_up_models
+from src.assistant.vector_db import FILES_PATH, get_or_create_vector_db
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,16 +41,105 @@ config = {
   "configurable": {
     "enable_web_search": False,
     "report_structure": report_structure,
-    "max_search_queries": 5
+    "max_search_queries": 5,
+    "max_concurrent_queries": 3,
+    "stream_report": True,
+    "llm_backend": os.environ.get("LLM_BACKEND", "deepseek"),
+    "ollama_model": os.environ.get("OLLAMA_MODEL", "deepseek-r1:7b"),
 }}
 
+# Load local models (if any) before the first request
+warm_up_models(config["configurable"])
+
 # Init vector store
 # Must add your own documents in the /files directory before running this script
 vector_db = get_or_create_vector_db()
+# Only new or changed files are ingested, chunks of deleted files are removed
+if os.path.isdir(FILES_PATH):
+    sync_directory(FILES_PATH)
+
+async def main(thread_id):
+    # Runs are checkpointed under their thread ID, run the script again with
+    # the same ID to resume an interrupted run
+    print(f"Thread ID: {thread_id}")
+    async with open_async_checkpointer() as checkpointer:
+        researcher = compile_researcher(checkpointer)
+        run_config = with_thread_id(config, thread_id)
+        inputs = initial_state
+        if checkpointer is not None:
+            inputs = await resume_input(researcher, run_config, initial_state)
+            if inputs is None:
+                print("--- Resuming research run ---")
+
+        # Run the researcher graph
+        async for mode, output in researcher.astream(inputs, config=run_config, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                # Report tokens, printed as they are written
+                if output["type"] == "token":
+                    print(output["text"], end="", flush=True)
+                    continue
+                # Trace events: per node and per provider call timings
+                if output["type"] == "call":
+                    print(f"  [{output['kind']}] {output['name']}: {output['wall_time']:.2f}s, "
+                          f"{output.get('prompt_tokens', 0)} prompt / {output.get('completion_tokens', 0)} completion tokens")
+                elif output["type"] == "query":
+                    print(f"  [query] {output['query']}: queued {output['queue_time']:.2f}s, ran {output['run_time']:.2f}s")
+                elif output["type"] == "gate":
+                    print(f"  [gate] {output['query']}: {output['decision']}"
+                          f"{' (LLM call avoided)' if output['llm_call_avoided'] else ''}")
+                elif output["type"] == "prompt":
+                    print(f"  [prompt] {output['name']}: {output['prompt_tokens']} tokens "
+                          f"({output['duplicates_removed']} duplicates removed, {output['truncated']} passages truncated)")
+                elif output["type"] == "query_cache" and output["hit"]:
+                    print(f"  [query cache] {output['query']}: served from \"{output['cached_query']}\" "
+                          f"(similarity {output['similarity']:.2f})")
+                elif output["type"] == "dedup":
+                    print(f"  [dedup] kept {output['queries_kept']}/{output['queries_total']} queries, "
+                          f"{output['subgraph_runs_saved']} subgraph runs saved")
+                elif output["type"] == "synthesis":
+                    print(f"  [synthesis] {output['mode']}: {output['summary_tokens']} summary tokens, {output['groups']} groups")
+                elif output["type"] == "prune":
+                    print(f"  [prune] {output['query']}: kept {output['documents_kept']}/{output['documents_total']} documents, "
+                          f"{output['tokens_saved']} tokens saved")
+                continue
+
+            for key, value in node_updates(output):
+                # The streamed report was already printed
+                report_streamed = key == "generate_final_answer" and config["configurable"]["stream_report"]
+                if report_streamed:
+                    print()
+                print(f"Finished running: **{key}**")
+                if not report_streamed:
+                    print(value)
+
+        # The run completed, its checkpoints are no longer needed
+        await delete_checkpoints(checkpointer, thread_id)
+
+    query_cache = get_query_cache()
+    if query_cache is not None:
+        stats = query_cache.stats()
+        print(f"Query cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+              f"{stats['invalidations']} invalidated entries")
+
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['time_saved']:.1f}s saved")
+
+    for provider, stats in get_governor_stats().items():
+        print(f"Governor {provider}: {stats['calls']} calls, {stats['retries']} retries "
+              f"({stats['rate_limited']} rate limited, {stats['server_errors']} server errors), "
+              f"{stats['hedge_wins']}/{stats['hedges']} hedges won, {stats['deadline_exceeded']} deadlines exceeded, "
+              f"{stats['throttle_time']:.1f}s throttled")
 
-# Run the researcher graph
-for output in researcher.stream(initial_state, config=config):
-    for key, value in output.items():
-        print(f"Finished running: **{key}**")
-        print(value)
+    # Export the aggregated metrics in the OpenMetrics format
+    if os.environ.get("TRACE_OPENMETRICS_PATH"):
+        with open(os.environ["TRACE_OPENMETRICS_PATH"], "w", encoding="utf-8") as f:
+            f.write(METRICS.render())
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the researcher graph")
+    parser.add_argument("--thread-id", default=None, help="Thread ID of an interrupted run to resume")
+    args = parser.parse_args()
+    run_until_complete(main(args.thread_id or new_thread_id()))
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from src.assistant.configuration import DEFAULT_REPORT_STRUCTURE
+from src.assistant.governor import get_governor_stats
+from src.assistant.jobs import AdmissionError, JobManager
+from src.assistant.utils import aclose_async_clients, warm_up_models
+from src.assistant.vector_db import get_or_create_vector_db
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Run settings every job starts from, overridden by the job's `configurable`
+DEFAULT_CONFIGURABLE = {
+    "report_structure": DEFAULT_REPORT_STRUCTURE,
+    "max_search_queries": 5,
+    "max_concurrent_queries": 3,
+    "enable_web_search": False,
+    "stream_report": True,
+    "llm_backend": os.environ.get("LLM_BACKEND", "deepseek"),
+    "ollama_model": os.environ.get("OLLAMA_MODEL", "deepseek-r1:7b"),
+}
+
+# Fields a client may set: their type, and limits (min, max) for numbers or
+# a maximum length for strings. Concurrency and backends stay server-side,
+# so every job shares the same provider limits
+CLIENT_CONFIG_FIELDS = {
+    "report_structure": (str, int(os.environ.get("SERVICE_MAX_REPORT_STRUCTURE_CHARS", "5000"))),
+    "enable_web_search": (bool, None),
+    "stream_report": (bool, None),
+    "max_search_queries": (int, (1, int(os.environ.get("SERVICE_MAX_SEARCH_QUERIES", "10")))),
+    "retrieval_k": (int, (1, 10)),
+}
+
+class JobRequest(BaseModel):
+    user_instructions: str
+    # Fields of `Configuration` listed in CLIENT_CONFIG_FIELDS
+    configurable: dict[str, Any] = {}
+
+def _client_configurable(configurable):
+    """
+    Validate the client's settings against CLIENT_CONFIG_FIELDS, clamping the numbers.
+
+    Raises:
+        HTTPException: 400 for a setting clients may not set, or of the wrong type or size
+    """
+    unknown = sorted(set(configurable) - set(CLIENT_CONFIG_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Settings not allowed: {', '.join(unknown)}")
+
+    settings = {}
+    for key, value in configurable.items():
+        kind, limits = CLIENT_CONFIG_FIELDS[key]
+        # JSON booleans are Python ints, they are not accepted as numbers
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            raise HTTPException(status_code=400, detail=f"{key} must be of type {kind.__name__}")
+        if kind is int:
+            value = min(max(value, limits[0]), limits[1])
+        elif kind is str and len(value) > limits:
+            raise HTTPException(status_code=400, detail=f"{key} is longer than {limits} characters")
+        settings[key] = value
+    return settings
+
+jobs = JobManager()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared vector store and load local models before taking jobs
+    await asyncio.to_thread(get_or_create_vector_db)
+    await asyncio.to_thread(warm_up_models, DEFAULT_CONFIGURABLE)
+    await jobs.start()
+    yield
+    await jobs.stop()
+    await aclose_async_clients()
+
+app = FastAPI(title="Workshoprobot RAG Researcher", lifespan=lifespan)
+
+def _get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+def _refused(error):
+    headers = {"Retry-After": str(error.retry_after)} if error.retry_after is not None else None
+    return JSONResponse(status_code=429, content={"detail": str(error)}, headers=headers)
+
+def _to_json(value):
+    # NumPy scalars (similarities) are converted to plain numbers
+    return json.dumps(value, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest, x_user: Optional[str] = Header(default="anonymous")):
+    """Queue a research job, refused with 429 when the queue or the user's quota is full."""
+    configurable = {**DEFAULT_CONFIGURABLE, **_client_configurable(request.configurable)}
+    try:
+        job = jobs.submit(
+            x_user,
+            {"user_instructions": request.user_instructions},
+            {"configurable": configurable},
+        )
+    except AdmissionError as e:
+        return _refused(e)
+    return job.to_dict(jobs.position(job))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = _get_job(job_id)
+    return job.to_dict(jobs.position(job))
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, request: Request, last_event_id: Optional[str] = Header(default=None)):
+    """
+    Stream the events of a job as server-sent events, until it finishes.
+
+    Events are replayed from the start, or after `Last-Event-ID` when a
+    client reconnects.
+    """
+    job = _get_job(job_id)
+    try:
+        start = int(last_event_id) + 1 if last_event_id else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid Last-Event-ID {last_event_id!r}")
+
+    async def events():
+        async for index, event in job.subscribe(start):
+            if await request.is_disconnected():
+                return
+            yield f"id: {index}\nevent: {event.get('type', 'message')}\ndata: {_to_json(event)}\n\n"
+        yield f"event: end\ndata: {_to_json(job.to_dict())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = _get_job(job_id)
+    if not await jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already {job.status}")
+    return {"id": job_id, "cancelled": True}
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str):
+    """Queue a failed or cancelled job again, from where it stopped."""
+    job = _get_job(job_id)
+    try:
+        if not await jobs.resume(job_id):
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}, only failed or cancelled jobs can be resumed")
+    except AdmissionError as e:
+        return _refused(e)
+    return job.to_dict(jobs.position(job))
+
+@app.get("/stats")
+async def get_stats():
+    return {**jobs.stats(), "governors": get_governor_stats()}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.environ.get("SERVICE_HOST", "127.0.0.1"), port=int(os.environ.get("SERVICE_PORT", "8000")))
@@ -0,0 +1,118 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from langchain_core.documents import Document
+
+# Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how in is it its of on or that the their this to was
+were what when where which who why will with about into than then them these they those do does
+""".split())
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords."""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    Persistent inverted index scoring chunks with Okapi BM25.
+
+    Postings, document lengths and the chunk texts live in SQLite, next to
+    the Chroma collection, so lexical hits can be returned without a
+    round-trip to the vector store. Updates are transactional and the index
+    can be shared by several processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc_id ON postings (doc_id);
+            """
+        )
+        self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _delete(self, ids):
+        self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(id_,) for id_ in ids])
+        self._conn.executemany("DELETE FROM docs WHERE id = ?", [(id_,) for id_ in ids])
+
+    def add(self, ids, texts, metadatas):
+        """Index (or re-index) chunks under their vector store IDs."""
+        with self._lock:
+            self._delete(ids)
+            for id_, text, metadata in zip(ids, texts, metadatas):
+                term_counts = Counter(tokenize(text))
+                self._conn.execute(
+                    "INSERT INTO docs (id, length, text, metadata) VALUES (?, ?, ?, ?)",
+                    (id_, sum(term_counts.values()), text, json.dumps(metadata or {}, default=str))
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, id_, tf) for term, tf in term_counts.items()]
+                )
+            self._conn.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete(list(ids))
+            self._conn.commit()
+
+    def search(self, query, k=10):
+        """
+        Return the `k` best matching chunks as `(Document, score)` pairs.
+
+        Documents carry their vector store ID in `Document.id`.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            num_docs, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not num_docs:
+                return []
+            avg_length = total_length / num_docs
+
+            scores = Counter()
+            placeholders = ",".join("?" * len(terms))
+            rows = self._conn.execute(
+                f"""SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id
+                    WHERE p.term IN ({placeholders})""",
+                list(terms)
+            ).fetchall()
+            doc_freqs = Counter(term for term, _, _, _ in rows)
+            for term, doc_id, tf, length in rows:
+                df = doc_freqs[term]
+                idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+            top = scores.most_common(k)
+            if not top:
+                return []
+            docs = {
+                id_: (text, metadata)
+                for id_, text, metadata in self._conn.execute(
+                    f"SELECT id, text, metadata FROM docs WHERE id IN ({','.join('?' * len(top))})",
+                    [id_ for id_, _ in top]
+                )
+            }
+
+        return [
+            (Document(id=id_, page_content=docs[id_][0], metadata=json.loads(docs[id_][1])), score)
+            for id_, score in top
+        ]
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class DiskCache:
+    """
+    Small persistent key/value cache backed by SQLite.
+
+    The database runs in WAL mode so several processes can share the same
+    cache file. Entries expire after `ttl` seconds and the least recently
+    used ones are evicted once the stored values exceed `max_bytes`.
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "time_saved": 0.0, "evictions": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Returns:
+            The JSON-decoded value, or None when missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, cost, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+            # Time the original call took, which the hit just saved
+            self._stats["time_saved"] += row[1]
+            return json.loads(row[0])
+
+    def set(self, key, value, cost=0.0):
+        """
+        Store a JSON-serializable value.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            cost: Seconds it took to compute the value
+        """
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, cost, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, len(payload), cost, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones above the size limit."""
+        if self.ttl:
+            cursor = self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+            self._stats["evictions"] += cursor.rowcount
+
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._stats["evictions"] += len(evicted)
+
+    def stats(self):
+        """Return hit/miss counters, hit rate and time saved since the process started."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+def cache_key(*parts):
+    """Content-addressed key: SHA-256 over the JSON encoding of the parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """
+    Get the LLM response cache, or None when caching is disabled.
+
+    The cache is opt-in: set `LLM_CACHE_PATH` to enable it. `LLM_CACHE_TTL`
+    (seconds) and `LLM_CACHE_MAX_MB` bound how long and how much is kept.
+    """
+    global _llm_cache
+    path = os.environ.get("LLM_CACHE_PATH")
+    if not path:
+        return None
+
+    with _llm_cache_lock:
+        if _llm_cache is None or _llm_cache.path != path:
+            ttl = os.environ.get("LLM_CACHE_TTL")
+            max_mb = os.environ.get("LLM_CACHE_MAX_MB")
+            _llm_cache = DiskCache(
+                path,
+                ttl=float(ttl) if ttl else None,
+                max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+            )
+        return _llm_cache
+
+# Web search responses and pages change, so they expire after a day by default
+DEFAULT_WEB_CACHE_PATH = ".cache/web_cache.sqlite3"
+DEFAULT_WEB_CACHE_TTL = 24 * 60 * 60
+
+_web_cache = None
+
+def get_web_cache():
+    """
+    Get the web search and page cache, or None when it is disabled.
+
+    Enabled by default at `.cache/web_cache.sqlite3`, set `WEB_CACHE_PATH=""`
+    to disable it. `WEB_CACHE_TTL` (seconds) and `WEB_CACHE_MAX_MB` bound how
+    long and how much is kept.
+    """
+    global _web_cache
+    path = os.environ.get("WEB_CACHE_PATH", DEFAULT_WEB_CACHE_PATH)
+    if not path:
+        return None
+
+    with _llm_cache_lock:
+        if _web_cache is None or _web_cache.path != path:
+            ttl = os.environ.get("WEB_CACHE_TTL")
+            max_mb = os.environ.get("WEB_CACHE_MAX_MB")
+            _web_cache = DiskCache(
+                path,
+                ttl=float(ttl) if ttl else DEFAULT_WEB_CACHE_TTL,
+                max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+            )
+        return _web_cache
+
+def llm_cache_key(provider, model, system_prompt, user_prompt, output_format=None, temperature=0):
+    """Cache key for an LLM call, covering the model, prompts, output schema and temperature."""
+    schema = output_format.model_json_schema() if output_format else None
+    return cache_key("llm", provider, model, system_prompt, user_prompt, schema, temperature)
@@ -0,0 +1,74 @@
+import os
+import uuid
+from contextlib import asynccontextmanager
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# Research runs are checkpointed here, set CHECKPOINT_PATH="" to disable it
+DEFAULT_CHECKPOINT_PATH = ".cache/checkpoints.sqlite3"
+
+def get_checkpoint_path():
+    return os.environ.get("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+
+@asynccontextmanager
+async def open_async_checkpointer():
+    """
+    Open a SQLite checkpointer for async runs, or yield None when disabled.
+
+    Every step of a run and the output of every finished parallel branch are
+    saved under the run's thread ID, so an interrupted run can be resumed.
+    The aiosqlite connection is bound to the running event loop, so it is
+    opened for the duration of a run instead of shared.
+    """
+    path = get_checkpoint_path()
+    if not path:
+        yield None
+        return
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(path) as checkpointer:
+        yield checkpointer
+
+async def delete_checkpoints(checkpointer, thread_id):
+    """
+    Delete the checkpoints of a thread once its run is over.
+
+    They are only needed to resume the run, and hold every step of it
+    (retrieved documents included), so they are not kept around.
+    """
+    if checkpointer is not None:
+        await checkpointer.adelete_thread(thread_id)
+
+def new_thread_id():
+    return uuid.uuid4().hex
+
+def with_thread_id(config, thread_id):
+    """Copy of a run config targeting the given thread."""
+    return {**config, "configurable": {**config.get("configurable", {}), "thread_id": thread_id}}
+
+async def resume_input(researcher, config, initial_state):
+    """
+    Input to run the thread of `config` with.
+
+    An interrupted run (nodes still to run) is resumed from its last
+    checkpoint with a None input: the branches that already finished are
+    not run again. Any other thread starts from the initial state, after
+    dropping the checkpoints a completed run left behind (e.g. a crash
+    before they were deleted), whose state would leak into the new run.
+    """
+    snapshot = await researcher.aget_state(config)
+    if snapshot.next:
+        return None
+    if snapshot.values:
+        await delete_checkpoints(researcher.checkpointer, config["configurable"]["thread_id"])
+    return initial_state
+
+def node_updates(output):
+    """
+    `(node, update)` pairs of an "updates" stream chunk.
+
+    LangGraph's own entries (`__metadata__` of a resumed run, `__interrupt__`)
+    are left out.
+    """
+    return [(key, value) for key, value in output.items() if not key.startswith("__")]
@@ -29,6 +29,28 @@ class Configuration:
     report_structure: str = DEFAULT_REPORT_STRUCTURE
     max_search_queries: int = 5
     enable_web_search: bool = False
+    max_concurrent_queries: int = 3
+    query_dedup_threshold: float = 0.9
+    query_cache_threshold: float = 0.95
+    retrieval_mode: str = "hybrid"  # "hybrid" (BM25 + vector) or "similarity"
+    retrieval_k: int = 3
+    retrieval_fetch_k: int = 20
+    rrf_k: int = 60
+    relevance_gate: bool = True
+    relevance_accept_threshold: float = 0.6
+    relevance_reject_threshold: float = 0.3
+    document_grade_threshold: float = 0.5
+    context_token_budget: int = 3000
+    summarizer_context_tokens: int = 6000
+    report_context_tokens: int = 12000
+    max_tokens_per_source: int = 2000
+    near_duplicate_threshold: float = 0.8
+    stream_report: bool = True
+    synthesis_mode: str = "auto"  # "auto", "single" or "hierarchical"
+    synthesis_threshold_tokens: int = 8000
+    synthesis_group_size: int = 5
+    llm_backend: str = "deepseek"  # "deepseek" (API) or "ollama" (local)
+    ollama_model: str = "deepseek-r1:7b"
 
     @classmethod
     def from_runnable_config(
@@ -0,0 +1,129 @@
+import re
+from src.assistant.tokens import count_tokens, get_encoding
+
+# Token budgets of the assembled context, per prompt
+DEFAULT_SUMMARIZER_CONTEXT_TOKENS = 6000
+DEFAULT_REPORT_CONTEXT_TOKENS = 12000
+
+# No single source (document, web page, summary) may take more than this
+DEFAULT_MAX_TOKENS_PER_SOURCE = 2000
+
+# Passages sharing at least this fraction of their word shingles with a
+# kept passage are dropped as near-duplicates
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.8
+
+SHINGLE_SIZE = 5
+SEPARATOR = "\n\n---\n\n"
+TRUNCATION_MARKER = " [...]"
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut a text down to at most `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    tokenizer = get_encoding()
+    if tokenizer is None:
+        return text[:max_tokens * 4]
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[:max_tokens])
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _similarity(a, b):
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def documents_to_passages(documents):
+    """Turn retrieved Documents into `(source, text)` passages."""
+    return [(doc.metadata.get("source", "Unknown source"), doc.page_content) for doc in documents]
+
+def web_results_to_passages(results):
+    """Turn Tavily results into `(source, text)` passages, preferring the full page content."""
+    passages = []
+    for result in results:
+        text = result.get("raw_content") or result.get("content") or ""
+        if result.get("title"):
+            text = f"{result['title']}\n{text}"
+        passages.append((result.get("url", "Unknown source"), text))
+    return passages
+
+def summaries_to_passages(summaries):
+    """Turn query summaries into `(source, text)` passages, one source per summary."""
+    return [(f"summary {i}", summary) for i, summary in enumerate(summaries, start=1)]
+
+def build_context(
+    passages,
+    token_budget,
+    max_tokens_per_source=DEFAULT_MAX_TOKENS_PER_SOURCE,
+    near_duplicate_threshold=DEFAULT_NEAR_DUPLICATE_THRESHOLD,
+    with_sources=True,
+):
+    """
+    Assemble passages into a prompt context that fits a token budget.
+
+    Passages are taken in order, so the most important ones should come
+    first. Near-duplicates of an already kept passage are dropped, and
+    passages are truncated to the space left for their source and in the
+    overall budget.
+
+    Args:
+        passages: List of `(source, text)` tuples
+        token_budget: Maximum number of tokens of the assembled context
+        max_tokens_per_source: Maximum number of tokens taken from one source
+        near_duplicate_threshold: Shingle similarity above which a passage is a duplicate
+        with_sources: Prefix every passage with its source
+
+    Returns:
+        The context string and a report with the passage and token counts
+    """
+    parts = []
+    kept_shingles = []
+    source_tokens = {}
+    used_tokens = 0
+    report = {"passages_total": len(passages), "passages_kept": 0, "duplicates_removed": 0, "truncated": 0, "tokens_in": 0}
+    separator_tokens = count_tokens(SEPARATOR)
+    marker_tokens = count_tokens(TRUNCATION_MARKER)
+
+    for source, text in passages:
+        text = text.strip()
+        text_tokens = count_tokens(text)
+        report["tokens_in"] += text_tokens
+        if not text:
+            continue
+
+        shingles = _shingles(text)
+        if any(_similarity(shingles, kept) >= near_duplicate_threshold for kept in kept_shingles):
+            report["duplicates_removed"] += 1
+            continue
+
+        header = f"Source: {source}\nContent: " if with_sources else ""
+        overhead = count_tokens(header) + (separator_tokens if parts else 0)
+        available = min(
+            max_tokens_per_source - source_tokens.get(source, 0),
+            token_budget - used_tokens - overhead,
+        )
+        if available <= 0:
+            continue
+        if text_tokens > available:
+            if available <= marker_tokens:
+                # No room left for any of the text, only for the marker
+                continue
+            text = truncate_to_tokens(text, available - marker_tokens) + TRUNCATION_MARKER
+            text_tokens = count_tokens(text)
+            report["truncated"] += 1
+
+        parts.append(header + text)
+        kept_shingles.append(shingles)
+        source_tokens[source] = source_tokens.get(source, 0) + text_tokens
+        used_tokens += overhead + text_tokens
+        report["passages_kept"] += 1
+
+    report["tokens_out"] = used_tokens
+    return SEPARATOR.join(parts), report
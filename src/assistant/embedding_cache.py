@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+INITIAL_CAPACITY = 1024
+
+class EmbeddingStore:
+    """
+    Persistent store of embedding vectors for one model and dimension size.
+
+    Vectors live in a float32 NumPy memmap (`vectors.f32`), one row per
+    slot. A SQLite index maps text hashes to slots and tracks last access
+    for LRU eviction. Slot allocation goes through SQLite transactions, so
+    several processes can share the same store.
+    """
+
+    def __init__(self, directory, max_entries=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._dims = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _meta(self, name):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _map(self, min_slots=0):
+        """(Re)open the memmap so it covers at least `min_slots` rows, growing the file if needed."""
+        capacity = self._meta("capacity") or 0
+        if capacity < min_slots:
+            capacity = max(INITIAL_CAPACITY, capacity)
+            while capacity < min_slots:
+                capacity *= 2
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * self._dims * 4)
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('capacity', ?)", (capacity,))
+
+        if self._vectors is None or self._vectors.shape[0] < capacity:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dims))
+
+    def _slots(self, keys):
+        """Slots of the stored keys among `keys`."""
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return found
+
+    def get(self, keys):
+        """Return a dict of key -> vector for the keys found in the store."""
+        with self._lock:
+            if self._dims is None:
+                self._dims = self._meta("dims")
+                if self._dims is None:
+                    return {}
+
+            found = self._slots(keys)
+            if not found:
+                return {}
+
+            self._map(max(found.values()) + 1)
+            self._conn.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                [(time.time(), key) for key in found]
+            )
+            return {key: self._vectors[slot].tolist() for key, slot in found.items()}
+
+    def put(self, items):
+        """Store `(key, vector)` pairs, evicting least recently used entries above `max_entries`."""
+        if not items:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._dims is None:
+                    self._dims = self._meta("dims")
+                if self._dims is None:
+                    self._dims = len(items[0][1])
+                    self._conn.execute("INSERT INTO meta (name, value) VALUES ('dims', ?)", (self._dims,))
+
+                # Stored keys are only overwritten, room is made for the new ones
+                slots_by_key = self._slots([key for key, _ in items])
+                new_keys = {key for key, _ in items if key not in slots_by_key}
+                self._evict(len(new_keys), keep=slots_by_key)
+                now = time.time()
+                slots = []
+                for key, vector in items:
+                    if key not in slots_by_key:
+                        slots_by_key[key] = self._allocate_slot()
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, slot, last_access) VALUES (?, ?, ?)",
+                        (key, slots_by_key[key], now)
+                    )
+                    slots.append(slots_by_key[key])
+
+                self._map(max(slots) + 1)
+                for slot, (_, vector) in zip(slots, items):
+                    self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+                self._vectors.flush()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _allocate_slot(self):
+        row = self._conn.execute("SELECT slot FROM free_slots LIMIT 1").fetchone()
+        if row:
+            self._conn.execute("DELETE FROM free_slots WHERE slot = ?", row)
+            return row[0]
+        next_slot = self._meta("next_slot") or 0
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('next_slot', ?)", (next_slot + 1,))
+        return next_slot
+
+    def _evict(self, incoming, keep=()):
+        """
+        Free the slots of the least recently used entries to make room for `incoming` new ones.
+
+        Entries in `keep` (about to be overwritten) are never evicted.
+        """
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count + incoming - self.max_entries
+        if overflow <= 0:
+            return
+        candidates = self._conn.execute(
+            "SELECT key, slot FROM entries ORDER BY last_access LIMIT ?", (overflow + len(keep),)
+        ).fetchall()
+        evicted = [(key, slot) for key, slot in candidates if key not in keep][:overflow]
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+        self._conn.executemany("INSERT OR IGNORE INTO free_slots (slot) VALUES (?)", [(slot,) for _, slot in evicted])
+
+def batch_embed_queries(embeddings, texts):
+    """
+    Embed search queries with the query path of `embeddings`.
+
+    Models may embed queries differently from documents (instructions or
+    prefixes), so queries go through `embed_query`, or through the
+    `embed_queries` batch method of the wrappers defining one.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+async def abatch_embed_queries(embeddings, texts):
+    """Async counterpart of `batch_embed_queries`."""
+    if hasattr(embeddings, "aembed_queries"):
+        return await embeddings.aembed_queries(texts)
+    return [await embeddings.aembed_query(text) for text in texts]
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves previously computed vectors from an `EmbeddingStore`.
+
+    Only texts missing from the store are sent to the wrapped embeddings
+    client, in one batched request. Query vectors are stored apart from
+    document vectors, as models may embed the same text differently.
+    """
+
+    def __init__(self, embeddings, cache_dir, max_entries=None):
+        self.embeddings = embeddings
+        model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+        dimensions = getattr(embeddings, "dimensions", None)
+        namespace = hashlib.sha256(f"{model}|{dimensions}".encode("utf-8")).hexdigest()[:16]
+        self.store = EmbeddingStore(os.path.join(cache_dir, namespace), max_entries=max_entries)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(text, kind="document"):
+        prefix = "query:" if kind == "query" else ""
+        return hashlib.sha256((prefix + text).encode("utf-8")).hexdigest()
+
+    def _lookup(self, texts, kind="document"):
+        keys = [self._key(text, kind) for text in texts]
+        cached = self.store.get(list(set(keys)))
+        # Unique texts missing from the cache, in first-seen order
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        with self._lock:
+            self._stats["hits"] += len(texts) - len(missing)
+            self._stats["misses"] += len(missing)
+        return keys, cached, missing
+
+    def _store(self, keys, cached, missing, vectors, kind="document"):
+        items = [(self._key(text, kind), vector) for text, vector in zip(missing, vectors)]
+        self.store.put(items)
+        cached.update(items)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts):
+        keys, cached, missing = self._lookup(texts)
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        return self._store(keys, cached, missing, vectors)
+
+    def embed_queries(self, texts):
+        keys, cached, missing = self._lookup(texts, "query")
+        vectors = batch_embed_queries(self.embeddings, missing) if missing else []
+        return self._store(keys, cached, missing, vectors, "query")
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    # Store reads and writes (SQLite and memmap I/O) run in a thread, off the event loop
+    async def aembed_documents(self, texts):
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        vectors = await self.embeddings.aembed_documents(missing) if missing else []
+        return await asyncio.to_thread(self._store, keys, cached, missing, vectors)
+
+    async def aembed_queries(self, texts):
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts, "query")
+        vectors = await abatch_embed_queries(self.embeddings, missing) if missing else []
+        return await asyncio.to_thread(self._store, keys, cached, missing, vectors, "query")
+
+    async def aembed_query(self, text):
+        return (await self.aembed_queries([text]))[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,391 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from langchain_core.embeddings import Embeddings
+
+# Retry defaults, overridable per provider with <PROVIDER>_MAX_RETRIES
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+# After a 429 the provider's request rate is halved, then recovers by this
+# fraction of its configured rate on every successful call
+MIN_RATE_FRACTION = 0.1
+RATE_RECOVERY_FRACTION = 0.05
+
+# Worker threads of one governor, running the sync calls that have a
+# deadline or may be hedged
+MAX_WORKERS = 64
+
+STAT_NAMES = (
+    "calls", "attempts", "retries", "rate_limited", "server_errors", "errors",
+    "hedges", "hedge_wins", "deadline_exceeded", "throttle_time",
+)
+
+class DeadlineExceeded(TimeoutError):
+    """A governed call did not complete within its deadline."""
+
+def error_status(error):
+    """HTTP status code carried by a provider error, if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_rate_limited(error):
+    # Tavily reports 429 responses as UsageLimitExceededError
+    return error_status(error) == 429 or type(error).__name__ in ("RateLimitError", "UsageLimitExceededError")
+
+def is_retryable(error):
+    """Rate limits, server errors, timeouts and dropped connections are retried."""
+    if is_rate_limited(error):
+        return True
+    status = error_status(error)
+    if status is not None:
+        return status >= 500
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connection" in name
+
+def retry_after(error):
+    """Delay requested by the provider in a `Retry-After` header, in seconds."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate to one provider.
+
+    The rate adapts to the provider: it is halved on every rate limit
+    response and recovers additively on successful calls, never above the
+    configured rate.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token, returning how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # Tokens may go negative, queued callers then wait their turn in order
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait_time = self._reserve()
+        if wait_time:
+            time.sleep(wait_time)
+        return wait_time
+
+    async def aacquire(self):
+        wait_time = self._reserve()
+        if wait_time:
+            await asyncio.sleep(wait_time)
+        return wait_time
+
+    def slow_down(self):
+        with self._lock:
+            self.rate = max(self.rate / 2, self.max_rate * MIN_RATE_FRACTION)
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.rate + self.max_rate * RATE_RECOVERY_FRACTION, self.max_rate)
+
+class CallGovernor:
+    """
+    Rate limits, retries, deadlines and hedging for the calls to one provider.
+
+    Args:
+        provider: Provider name, used in the stats
+        rate: Requests per second, None for no limit
+        burst: Requests allowed at once above the rate
+        max_retries: Retries of a failed call on rate limits, server errors and timeouts
+        base_delay: First retry delay, doubled on every retry with full jitter
+        max_delay: Upper bound of a retry delay
+        deadline: Seconds after which a call gives up, retries included
+        hedge_after: Seconds after which a duplicate of a slow call is sent,
+            the first response wins. None disables hedging
+    """
+
+    def __init__(self, provider, rate=None, burst=None, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, deadline=None, hedge_after=None):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(STAT_NAMES, 0)
+        self._executor = None
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rate"] = self.bucket.rate if self.bucket else None
+        return stats
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        # Never retry earlier than the provider asked for
+        return max(delay, retry_after(error) or 0.0)
+
+    def _on_error(self, error, attempt, can_retry, expires_at):
+        """Record a failed attempt and return the delay before retrying, or None to give up."""
+        if is_rate_limited(error):
+            self._count("rate_limited")
+            if self.bucket:
+                self.bucket.slow_down()
+        elif (error_status(error) or 0) >= 500:
+            self._count("server_errors")
+
+        if attempt >= self.max_retries or not is_retryable(error) or (can_retry and not can_retry()):
+            self._count("errors")
+            return None
+        delay = self._backoff(attempt, error)
+        if expires_at is not None and time.monotonic() + delay >= expires_at:
+            self._count("errors")
+            return None
+        self._count("retries")
+        return delay
+
+    def _remaining(self, expires_at):
+        if expires_at is None:
+            return None
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"{self.provider} call exceeded its deadline")
+        return remaining
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix=f"governor-{self.provider}")
+            return self._executor
+
+    def _attempt(self, func, expires_at, hedge):
+        """One attempt, run on a worker thread when it needs a deadline or a hedge."""
+        hedge_after = self.hedge_after if hedge else None
+        if expires_at is None and hedge_after is None:
+            return func()
+
+        executor = self._get_executor()
+        # Worker threads run in a copy of the caller's context (tracing, callbacks)
+        submit = lambda: executor.submit(contextvars.copy_context().run, func)
+        futures = [submit()]
+        if hedge_after is not None:
+            done, _ = wait(futures, timeout=min(hedge_after, self._remaining(expires_at) or hedge_after))
+            if not done and (expires_at is None or time.monotonic() < expires_at):
+                self._count("hedges")
+                futures.append(submit())
+
+        pending = futures
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=self._remaining(expires_at), return_when=FIRST_COMPLETED)
+            if not done:
+                self._count("deadline_exceeded")
+                raise DeadlineExceeded(f"{self.provider} call exceeded its deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count("hedge_wins")
+                    # The losing request finishes in the background, its result is dropped
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, func, span=None, hedge=True, can_retry=None, deadline=None):
+        """
+        Run `func` (a provider call without arguments) under the governor.
+
+        Args:
+            func: The call to make
+            span: Trace span receiving the number of `retries`
+            hedge: Whether a duplicate request may be sent for a slow call,
+                only for calls without side effects
+            can_retry: Callable telling whether a failed call may be retried,
+                e.g. False once a stream started forwarding tokens
+            deadline: Overrides the governor deadline for this call
+        """
+        self._count("calls")
+        deadline = deadline if deadline is not None else self.deadline
+        expires_at = time.monotonic() + deadline if deadline else None
+        attempt = 0
+        while True:
+            if self.bucket:
+                self._count("throttle_time", self.bucket.acquire())
+            self._remaining(expires_at)
+            self._count("attempts")
+            try:
+                result = self._attempt(func, expires_at, hedge)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                delay = self._on_error(e, attempt, can_retry, expires_at)
+                if delay is None:
+                    raise
+                attempt += 1
+                if span is not None:
+                    span["retries"] = attempt
+                time.sleep(delay)
+                continue
+            if self.bucket:
+                self.bucket.speed_up()
+            return result
+
+    async def _aattempt(self, afunc, expires_at, hedge):
+        hedge_after = self.hedge_after if hedge else None
+        tasks = [asyncio.ensure_future(afunc())]
+        try:
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(tasks, timeout=min(hedge_after, self._remaining(expires_at) or hedge_after))
+                if not done and (expires_at is None or time.monotonic() < expires_at):
+                    self._count("hedges")
+                    tasks.append(asyncio.ensure_future(afunc()))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self._remaining(expires_at), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded(f"{self.provider} call exceeded its deadline")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Unlike threads, the losing or expired requests can be cancelled
+            for task in tasks:
+                task.cancel()
+
+    async def acall(self, afunc, span=None, hedge=True, can_retry=None, deadline=None):
+        """Async version of `call`, `afunc` returns the awaitable of one attempt."""
+        self._count("calls")
+        deadline = deadline if deadline is not None else self.deadline
+        expires_at = time.monotonic() + deadline if deadline else None
+        attempt = 0
+        while True:
+            if self.bucket:
+                self._count("throttle_time", await self.bucket.aacquire())
+            self._remaining(expires_at)
+            self._count("attempts")
+            try:
+                result = await self._aattempt(afunc, expires_at, hedge)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                delay = self._on_error(e, attempt, can_retry, expires_at)
+                if delay is None:
+                    raise
+                attempt += 1
+                if span is not None:
+                    span["retries"] = attempt
+                await asyncio.sleep(delay)
+                continue
+            if self.bucket:
+                self.bucket.speed_up()
+            return result
+
+class GovernedEmbeddings(Embeddings):
+    """Embeddings wrapper sending every request through a `CallGovernor`, traced as an embedding call."""
+
+    def __init__(self, embeddings, governor):
+        self.embeddings = embeddings
+        self.governor = governor
+
+    def __getattr__(self, name):
+        # Model name and dimensions of the wrapped client (embedding cache namespace)
+        return getattr(self.embeddings, name)
+
+    def _name(self):
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+    def embed_documents(self, texts):
+        from src.assistant.tracing import trace_call
+        with trace_call("embedding", self._name(), texts=len(texts)) as span:
+            return self.governor.call(lambda: self.embeddings.embed_documents(texts), span)
+
+    # The wrapped client (OpenAI) embeds queries like documents, so a batch
+    # of queries is a single request
+    def embed_queries(self, texts):
+        return self.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        from src.assistant.tracing import trace_call
+        with trace_call("embedding", self._name(), texts=len(texts)) as span:
+            return await self.governor.acall(lambda: self.embeddings.aembed_documents(texts), span)
+
+    async def aembed_queries(self, texts):
+        return await self.aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+def _env_float(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+def get_governor(provider):
+    """
+    Get the shared governor of a provider ("deepseek", "openai", "ollama", "tavily").
+
+    Configured from the environment with the upper-cased provider prefix:
+    `<PROVIDER>_RATE_LIMIT` (requests per second), `<PROVIDER>_BURST`,
+    `<PROVIDER>_MAX_RETRIES`, `<PROVIDER>_DEADLINE` (seconds) and
+    `<PROVIDER>_HEDGE_AFTER` (seconds).
+    """
+    with _governors_lock:
+        if provider not in _governors:
+            prefix = provider.upper()
+            max_retries = os.environ.get(f"{prefix}_MAX_RETRIES")
+            _governors[provider] = CallGovernor(
+                provider,
+                rate=_env_float(f"{prefix}_RATE_LIMIT"),
+                burst=_env_float(f"{prefix}_BURST"),
+                max_retries=int(max_retries) if max_retries else DEFAULT_MAX_RETRIES,
+                deadline=_env_float(f"{prefix}_DEADLINE"),
+                hedge_after=_env_float(f"{prefix}_HEDGE_AFTER"),
+            )
+        return _governors[provider]
+
+def reset_governors():
+    """Drop the governors, the next calls pick up the current environment."""
+    with _governors_lock:
+        _governors.clear()
+
+def get_governor_stats():
+    """Return the stats of every governor used so far, by provider."""
+    with _governors_lock:
+        governors = dict(_governors)
+    return {provider: governor.stats() for provider, governor in governors.items()}
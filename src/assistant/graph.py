@@ -1,123 +1,436 @@
+import asyncio
 import datetime
+import time
 from typing_extensions import Literal
 from langgraph.constants import Send
 from langgraph.graph import START, END, StateGraph
+from langchain_core.runnables import RunnableLambda
 from langchain_core.runnables.config import RunnableConfig
 from src.assistant.configuration import Configuration
-from src.assistant.vector_db import get_or_create_vector_db
-from src.assistant.state import ResearcherState, ResearcherStateInput, ResearcherStateOutput, QuerySearchState, QuerySearchStateInput, QuerySearchStateOutput
-from src.assistant.prompts import RESEARCH_QUERY_WRITER_PROMPT, RELEVANCE_EVALUATOR_PROMPT, SUMMARIZER_PROMPT, REPORT_WRITER_PROMPT
-from src.assistant.utils import format_documents_with_metadata, invoke_llm, invoke_ollama, parse_output, tavily_search, Evaluation, Queries
-
-# Number of query to process in parallel for each batch
-# Change depending on the performance of the system
-BATCH_SIZE = 3
-
-def generate_research_queries(state: ResearcherState, config: RunnableConfig):
-    print("--- Generating research queries ---")
+from src.assistant.context import DEFAULT_MAX_TOKENS_PER_SOURCE, DEFAULT_NEAR_DUPLICATE_THRESHOLD, DEFAULT_REPORT_CONTEXT_TOKENS, DEFAULT_SUMMARIZER_CONTEXT_TOKENS, build_context, documents_to_passages, summaries_to_passages, web_results_to_passages
+from src.assistant.query_cache import DEFAULT_QUERY_CACHE_THRESHOLD, get_query_cache, query_cache_config_key
+from src.assistant.query_dedup import DEFAULT_QUERY_DEDUP_THRESHOLD, dedupe_queries
+from src.assistant.relevance import DEFAULT_ACCEPT_THRESHOLD, DEFAULT_CONTEXT_TOKEN_BUDGET, DEFAULT_GRADE_THRESHOLD, DEFAULT_REJECT_THRESHOLD, IRRELEVANT, UNCERTAIN, gate_documents, local_grades, prune_documents
+from src.assistant.synthesis import DEFAULT_SYNTHESIS_GROUP_SIZE, DEFAULT_SYNTHESIS_THRESHOLD_TOKENS, group_summaries, report_sections
+from src.assistant.tokens import count_tokens
+from src.assistant.tracing import collect_events, current_query, emit, trace_call, traced_node, write_to_stream
+from src.assistant.scheduler import DEFAULT_MAX_CONCURRENT_QUERIES, get_query_scheduler
+from src.assistant.vector_db import DEFAULT_FETCH_K, DEFAULT_RETRIEVAL_K, DEFAULT_RRF_K, batch_search, abatch_search, embed_queries, aembed_queries, get_collection_name, get_embedding_model, get_embeddings
+from src.assistant.state import ResearcherState, ResearcherStateInput, ResearcherStateOutput, QuerySearchState, QuerySearchStateInput, QuerySearchStateOutput, SectionCondenseState
+from src.assistant.prompts import RESEARCH_QUERY_WRITER_PROMPT, DOCUMENT_GRADER_PROMPT, SUMMARIZER_PROMPT, REPORT_WRITER_PROMPT, SECTION_CONDENSER_PROMPT
+from src.assistant.utils import DEFAULT_LLM_BACKEND, DEFAULT_OLLAMA_MODEL, format_numbered_documents, invoke_llm, ainvoke_llm, invoke_ollama, ainvoke_ollama, parse_output, stream_llm, astream_llm, stream_ollama, astream_ollama, web_search, aweb_search, DocumentGrades, Queries
+
+# Every node has a sync and an async implementation, `researcher.stream` runs
+# the sync ones and `researcher.astream` the async ones
+def _node(func, afunc):
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+# Every LLM call goes through these helpers, which pick the backend of the
+# run: the Deepseek API (default) or a local model served by Ollama
+def _llm_settings(config: RunnableConfig):
+    configurable = config["configurable"]
+    return configurable.get("llm_backend", DEFAULT_LLM_BACKEND), configurable.get("ollama_model", DEFAULT_OLLAMA_MODEL)
+
+def _strip_reasoning(text):
+    # Remove thinking part (reasoning between <think> tags) of local reasoning models
+    return parse_output(text)["response"]
+
+def _generate(config: RunnableConfig, system_prompt, user_prompt, output_format=None):
+    backend, model = _llm_settings(config)
+    if backend == "ollama":
+        result = invoke_ollama(model=model, system_prompt=system_prompt, user_prompt=user_prompt, output_format=output_format)
+        return result if output_format else _strip_reasoning(result)
+    # Using external LLM providers with OpenRouter: GPT-4o, Claude, Deepseek R1,...
+    return invoke_llm(system_prompt=system_prompt, user_prompt=user_prompt, output_format=output_format)
+
+async def _agenerate(config: RunnableConfig, system_prompt, user_prompt, output_format=None):
+    backend, model = _llm_settings(config)
+    if backend == "ollama":
+        result = await ainvoke_ollama(model=model, system_prompt=system_prompt, user_prompt=user_prompt, output_format=output_format)
+        return result if output_format else _strip_reasoning(result)
+    return await ainvoke_llm(system_prompt=system_prompt, user_prompt=user_prompt, output_format=output_format)
+
+def _stream_generate(config: RunnableConfig, system_prompt, user_prompt, on_token):
+    backend, model = _llm_settings(config)
+    if backend == "ollama":
+        # Reasoning is dropped while streaming, only the answer reaches `on_token`
+        return stream_ollama(model=model, system_prompt=system_prompt, user_prompt=user_prompt, on_token=on_token)
+    return stream_llm(system_prompt=system_prompt, user_prompt=user_prompt, on_token=on_token)
+
+async def _astream_generate(config: RunnableConfig, system_prompt, user_prompt, on_token):
+    backend, model = _llm_settings(config)
+    if backend == "ollama":
+        return await astream_ollama(model=model, system_prompt=system_prompt, user_prompt=user_prompt, on_token=on_token)
+    return await astream_llm(system_prompt=system_prompt, user_prompt=user_prompt, on_token=on_token)
+
+def _query_writer_prompts(state: ResearcherState, config: RunnableConfig):
     user_instructions = state["user_instructions"]
     max_queries = config["configurable"].get("max_search_queries", 3)
-    
+
     query_writer_prompt = RESEARCH_QUERY_WRITER_PROMPT.format(
         max_queries=max_queries,
-        date=datetime.datetime.now().strftime("%Y/%m/%d %H:%M")
-    )
-    
-    # Using local Deepseek R1 model with Ollama
-    # result = invoke_ollama(
-    #     model='deepseek-r1:7b',
-    #     system_prompt=query_writer_prompt,
-    #     user_prompt=f"Generate research queries for this user instruction: {user_instructions}",
-    #     output_format=Queries
-    # )
-    
-    # Using external LLM providers with OpenRouter: GPT-4o, Claude, Deepseek R1,... 
-    
-    result = invoke_llm(
-        #model='gpt-4o-mini',
+        # Day granularity: the prompt (and its LLM cache entry) stays the same all day
+        date=datetime.date.today().strftime("%Y/%m/%d")
+    )
+    return query_writer_prompt, f"Generate research queries for this user instruction: {user_instructions}"
+
+@traced_node
+def generate_research_queries(state: ResearcherState, config: RunnableConfig):
+    print("--- Generating research queries ---")
+    query_writer_prompt, user_prompt = _query_writer_prompts(state, config)
+    result = _generate(
+        config,
         system_prompt=query_writer_prompt,
-        user_prompt=f"Generate research queries for this user instruction: {user_instructions}",
+        user_prompt=user_prompt,
         output_format=Queries
     )
 
     return {"research_queries": result.queries}
 
-def search_queries(state: ResearcherState):
-    # Kick off the search for each query by calling initiate_query_research
-    print("--- Searching queries ---")
-    pass
-
-def initiate_query_research(state: ResearcherState):
-    # Kick off the search for each query in parallel using Send method and calling the "search_and_summarize_query" subgraph
-    return [
-        Send("search_and_summarize_query", {"query": s})
-        for s in state["research_queries"]
-    ]
-
-def search_queries(state: ResearcherState):
-    # Kick off the search for each query by calling initiate_query_research
-    print("--- Searching queries ---")
-    # Get the current processing position from state or initialize to 0
-    current_position = state.get("current_position", 0)
-
-    return {"current_position": current_position + BATCH_SIZE}
+@traced_node
+async def agenerate_research_queries(state: ResearcherState, config: RunnableConfig):
+    print("--- Generating research queries ---")
+    query_writer_prompt, user_prompt = _query_writer_prompts(state, config)
+    result = await _agenerate(
+        config,
+        system_prompt=query_writer_prompt,
+        user_prompt=user_prompt,
+        output_format=Queries
+    )
 
+    return {"research_queries": result.queries}
 
-def check_more_queries(state: ResearcherState) -> Literal["search_queries", "generate_final_answer"]:
-    """Check if there are more queries to process"""
-    current_position = state.get("current_position", 0)
-    if current_position < len(state["research_queries"]):
-        return "search_queries"
-    return "generate_final_answer"
+def _retrieval_settings(config: RunnableConfig):
+    configurable = config["configurable"]
+    return (
+        configurable.get("retrieval_mode", "hybrid"),
+        configurable.get("retrieval_k", DEFAULT_RETRIEVAL_K),
+        configurable.get("retrieval_fetch_k", DEFAULT_FETCH_K),
+        configurable.get("rrf_k", DEFAULT_RRF_K),
+    )
 
-def initiate_query_research(state: ResearcherState):
-    # Get the next batch of queries
+def _dedupe_queries(queries, embeddings, config: RunnableConfig):
+    """Merge near-duplicate queries, returning the kept queries and their embeddings."""
+    threshold = config["configurable"].get("query_dedup_threshold", DEFAULT_QUERY_DEDUP_THRESHOLD)
+    kept, merged = dedupe_queries(queries, embeddings, threshold)
+    saved = len(queries) - len(kept)
+    emit({
+        "type": "dedup",
+        "queries_total": len(queries),
+        "queries_kept": len(kept),
+        "subgraph_runs_saved": saved,
+        "merged": {query: duplicates for query, duplicates in merged.items() if duplicates},
+    })
+    if saved:
+        print(f"--- Merged {saved} duplicate queries ---")
+    return [queries[i] for i in kept], [embeddings[i] for i in kept]
+
+def _query_cache_key(config: RunnableConfig):
+    return query_cache_config_key(config["configurable"], get_embedding_model(), get_collection_name())
+
+def _lookup_cached_queries(queries, embeddings, config: RunnableConfig):
+    """
+    Serve queries from the query result cache.
+
+    Returns the queries still to research with their embeddings, and the
+    cached summaries of the others.
+    """
+    cache = get_query_cache()
+    if cache is None:
+        return queries, embeddings, []
+
+    config_key = _query_cache_key(config)
+    threshold = config["configurable"].get("query_cache_threshold", DEFAULT_QUERY_CACHE_THRESHOLD)
+    misses, miss_embeddings, cached_summaries = [], [], []
+    for query, embedding in zip(queries, embeddings):
+        hit = cache.lookup(embedding, config_key, threshold)
+        if hit is None:
+            emit({"type": "query_cache", "query": query, "hit": False})
+            misses.append(query)
+            miss_embeddings.append(embedding)
+            continue
+        emit({"type": "query_cache", "query": query, "hit": True, "cached_query": hit["query"], "similarity": hit["similarity"]})
+        cached_summaries.extend(hit["summaries"])
+    if len(misses) < len(queries):
+        print(f"--- Served {len(queries) - len(misses)} queries from the query cache ---")
+    return misses, miss_embeddings, cached_summaries
+
+def _query_embeddings(queries, embeddings):
+    # Plain floats, so the state stays serializable by the checkpointer
+    return {query: [float(x) for x in embedding] for query, embedding in zip(queries, embeddings)}
+
+@traced_node
+def search_queries(state: ResearcherState, config: RunnableConfig):
+    # Embed the queries once to merge near-duplicates and retrieve the
+    # documents of every remaining query in one batch, then kick off the
+    # search for each query by calling initiate_query_research
+    print("--- Searching queries ---")
+    queries = state["research_queries"]
+    mode, k, fetch_k, rrf_k = _retrieval_settings(config)
+    embeddings = embed_queries(queries)
+    queries, embeddings = _dedupe_queries(queries, embeddings, config)
+    queries, embeddings, cached_summaries = _lookup_cached_queries(queries, embeddings, config)
+    with trace_call("retrieval", "chroma", mode=mode, queries=len(queries)) as span:
+        query_documents = batch_search(queries, k=k, fetch_k=fetch_k, rrf_k=rrf_k, mode=mode, embeddings=embeddings)
+        span["documents"] = len({id(doc) for results in query_documents.values() for doc, _ in results})
+
+    return {
+        "research_queries": queries,
+        "query_documents": query_documents,
+        "query_embeddings": _query_embeddings(queries, embeddings),
+        "search_summaries": cached_summaries,
+    }
+
+@traced_node
+async def asearch_queries(state: ResearcherState, config: RunnableConfig):
+    print("--- Searching queries ---")
     queries = state["research_queries"]
-    current_position = state["current_position"]
-    batch_end = min(current_position, len(queries))
-    current_batch = queries[current_position - BATCH_SIZE:batch_end]
+    mode, k, fetch_k, rrf_k = _retrieval_settings(config)
+    embeddings = await aembed_queries(queries)
+    queries, embeddings = _dedupe_queries(queries, embeddings, config)
+    # The cache lookup reads SQLite, kept off the event loop
+    queries, embeddings, cached_summaries = await asyncio.to_thread(_lookup_cached_queries, queries, embeddings, config)
+    with trace_call("retrieval", "chroma", mode=mode, queries=len(queries)) as span:
+        query_documents = await abatch_search(queries, k=k, fetch_k=fetch_k, rrf_k=rrf_k, mode=mode, embeddings=embeddings)
+        span["documents"] = len({id(doc) for results in query_documents.values() for doc, _ in results})
+
+    return {
+        "research_queries": queries,
+        "query_documents": query_documents,
+        "query_embeddings": _query_embeddings(queries, embeddings),
+        "search_summaries": cached_summaries,
+    }
 
-    # Return the batch of queries to process
-    return [
-        Send("search_and_summarize_query", {"query": s})
-        for s in current_batch
-    ]
+def initiate_query_research(state: ResearcherState):
+    # Fan out every query at once, the query scheduler keeps at most
+    # `max_concurrent_queries` of them running at the same time. Each branch
+    # gets the documents prefetched and the embedding computed for its query.
+    if not state["research_queries"]:
+        # Every query was served from the cache
+        return "plan_synthesis"
+
+    queued_at = time.time()
+    query_documents = state.get("query_documents") or {}
+    query_embeddings = state.get("query_embeddings") or {}
+    sends = []
+    for s in state["research_queries"]:
+        payload = {"query": s, "queued_at": queued_at}
+        if s in query_embeddings:
+            payload["query_embedding"] = query_embeddings[s]
+        if s in query_documents:
+            payload["retrieved_documents"] = [doc for doc, _ in query_documents[s]]
+            payload["relevance_scores"] = [score for _, score in query_documents[s]]
+        sends.append(Send("search_and_summarize_query", payload))
+    return sends
+
+def _store_query_result(state: QuerySearchStateInput, result, embedding, config: RunnableConfig):
+    """Cache the outcome of a query search for later near-identical queries."""
+    get_query_cache().store(
+        state["query"],
+        embedding,
+        _query_cache_key(config),
+        [doc.id for doc in result.get("retrieved_documents", []) if doc.id],
+        result.get("are_documents_relevant", False),
+        result.get("search_summaries", []),
+    )
 
-def retrieve_rag_documents(state: QuerySearchState):
+def _stream_query_events(events, timing):
+    # Forward the events of the subgraph run, which the caller cannot see in the stream
+    for event in events:
+        write_to_stream(event)
+    emit({"type": "query", **timing})
+
+@traced_node
+def search_and_summarize_query(state: QuerySearchStateInput, config: RunnableConfig):
+    """Run the query search subgraph once a scheduler slot is free."""
+    max_concurrency = config["configurable"].get("max_concurrent_queries", DEFAULT_MAX_CONCURRENT_QUERIES)
+    scheduler = get_query_scheduler(max_concurrency)
+
+    token = current_query.set(state["query"])
+    try:
+        with collect_events() as events, scheduler.slot(state["query"], state.get("queued_at")) as timing:
+            result = query_search_graph.invoke(state, config)
+    finally:
+        current_query.reset(token)
+
+    if get_query_cache() is not None:
+        # The query was embedded by search_queries
+        embedding = state.get("query_embedding")
+        if embedding is None:
+            embedding = get_embeddings().embed_query(state["query"])
+        _store_query_result(state, result, embedding, config)
+
+    _stream_query_events(events, timing)
+    return {
+        "search_summaries": result.get("search_summaries", []),
+        "query_timings": [timing],
+    }
+
+@traced_node
+async def asearch_and_summarize_query(state: QuerySearchStateInput, config: RunnableConfig):
+    max_concurrency = config["configurable"].get("max_concurrent_queries", DEFAULT_MAX_CONCURRENT_QUERIES)
+    scheduler = get_query_scheduler(max_concurrency)
+
+    token = current_query.set(state["query"])
+    try:
+        with collect_events() as events:
+            async with scheduler.aslot(state["query"], state.get("queued_at")) as timing:
+                result = await query_search_graph.ainvoke(state, config)
+    finally:
+        current_query.reset(token)
+
+    if get_query_cache() is not None:
+        embedding = state.get("query_embedding")
+        if embedding is None:
+            embedding = await get_embeddings().aembed_query(state["query"])
+        await asyncio.to_thread(_store_query_result, state, result, embedding, config)
+
+    _stream_query_events(events, timing)
+    return {
+        "search_summaries": result.get("search_summaries", []),
+        "query_timings": [timing],
+    }
+
+@traced_node
+def retrieve_rag_documents(state: QuerySearchState, config: RunnableConfig):
     """Retrieve documents from the RAG database."""
+    if state.get("retrieved_documents") is not None:
+        # Already retrieved by the batched search_queries stage
+        return {}
+
     print("--- Retrieving documents ---")
     query = state["query"]
-    vectorstore = get_or_create_vector_db()
-    vectorstore_retreiver = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-    documents = vectorstore_retreiver.invoke(query)
+    mode, k, fetch_k, rrf_k = _retrieval_settings(config)
+    with trace_call("retrieval", "chroma", mode=mode) as span:
+        # In hybrid mode dense and BM25 candidates are merged with reciprocal rank fusion
+        results = batch_search([query], k=k, fetch_k=fetch_k, rrf_k=rrf_k, mode=mode)[query]
+        span["documents"] = len(results)
+
+    return {
+        "retrieved_documents": [doc for doc, _ in results],
+        "relevance_scores": [score for _, score in results],
+    }
+
+@traced_node
+async def aretrieve_rag_documents(state: QuerySearchState, config: RunnableConfig):
+    if state.get("retrieved_documents") is not None:
+        return {}
 
-    return {"retrieved_documents": documents}
-
-def evaluate_retrieved_documents(state: QuerySearchState):
+    print("--- Retrieving documents ---")
     query = state["query"]
-    retrieved_documents = state["retrieved_documents"]
-    evaluation_prompt = RELEVANCE_EVALUATOR_PROMPT.format(
+    mode, k, fetch_k, rrf_k = _retrieval_settings(config)
+    # Embed the query with the native async client, only the local
+    # Chroma and BM25 lookups are pushed to a worker thread
+    with trace_call("retrieval", "chroma", mode=mode) as span:
+        results = (await abatch_search([query], k=k, fetch_k=fetch_k, rrf_k=rrf_k, mode=mode))[query]
+        span["documents"] = len(results)
+
+    return {
+        "retrieved_documents": [doc for doc, _ in results],
+        "relevance_scores": [score for _, score in results],
+    }
+
+def _prune_documents(state: QuerySearchState, config: RunnableConfig, grades):
+    """Keep the chunks graded above the threshold, within the context token budget."""
+    configurable = config["configurable"]
+    documents, report = prune_documents(
+        state["retrieved_documents"],
+        grades,
+        threshold=configurable.get("document_grade_threshold", DEFAULT_GRADE_THRESHOLD),
+        token_budget=configurable.get("context_token_budget", DEFAULT_CONTEXT_TOKEN_BUDGET),
+    )
+    if documents:
+        emit({"type": "prune", **report})
+
+    return {
+        "document_grades": grades,
+        "relevant_documents": documents,
+        "are_documents_relevant": bool(documents),
+    }
+
+def _gate_documents(state: QuerySearchState, config: RunnableConfig):
+    """
+    Run the local relevance gate, returning the node update when it is
+    confident enough to skip the LLM grader, None otherwise.
+    """
+    configurable = config["configurable"]
+    if not configurable.get("relevance_gate", True):
+        return None
+
+    accept_threshold = configurable.get("relevance_accept_threshold", DEFAULT_ACCEPT_THRESHOLD)
+    reject_threshold = configurable.get("relevance_reject_threshold", DEFAULT_REJECT_THRESHOLD)
+    gate = gate_documents(
+        state["query"],
+        state["retrieved_documents"],
+        state.get("relevance_scores"),
+        accept_threshold=accept_threshold,
+        reject_threshold=reject_threshold,
+    )
+    emit({"type": "gate", **gate, "llm_call_avoided": gate["decision"] != UNCERTAIN})
+    if gate["decision"] == UNCERTAIN:
+        return None
+
+    print(f"--- Relevance gate: {gate['decision']} ---")
+    if gate["decision"] == IRRELEVANT:
+        return {
+            "document_grades": [0.0] * len(state["retrieved_documents"]),
+            "relevant_documents": [],
+            "are_documents_relevant": False,
+        }
+    # Clear hit: grade the chunks from their similarity scores
+    grades = local_grades(state["relevance_scores"], accept_threshold, reject_threshold)
+    return _prune_documents(state, config, grades)
+
+def _grading_prompts(state: QuerySearchState):
+    query = state["query"]
+    grader_prompt = DOCUMENT_GRADER_PROMPT.format(
         query=query,
-        documents=format_documents_with_metadata(retrieved_documents)
-    )
-    
-    # Using local Deepseek R1 model with Ollama
-    # evaluation = invoke_ollama(
-    #     model='deepseek-r1:7b',
-    #     system_prompt=evaluation_prompt,
-    #     user_prompt=f"Evaluate the relevance of the retrieved documents for this query: {query}",
-    #     output_format=Evaluation
-    # )
-    
-    # Using external LLM providers with OpenRouter: GPT-4o, Claude, Deepseek R1,... 
-    evaluation = invoke_llm(
-        #model='gpt-4o-mini',
-        system_prompt=evaluation_prompt,
-        user_prompt=f"Evaluate the relevance of the retrieved documents for this query: {query}",
-        output_format=Evaluation
-    )
-
-    return {"are_documents_relevant": evaluation.is_relevant}
+        documents=format_numbered_documents(state["retrieved_documents"]),
+        num_documents=len(state["retrieved_documents"])
+    )
+    return grader_prompt, f"Grade the relevance of each retrieved document for this query: {query}"
+
+def _document_grades(state: QuerySearchState, result: DocumentGrades):
+    # One grade in [0, 1] per document, missing grades count as irrelevant
+    num_documents = len(state["retrieved_documents"])
+    scores = (result.scores + [0.0] * num_documents)[:num_documents]
+    return [min(max(float(score), 0.0), 1.0) for score in scores]
+
+@traced_node
+def evaluate_retrieved_documents(state: QuerySearchState, config: RunnableConfig):
+    # Clear hits and clear misses are decided locally, only ambiguous
+    # cases reach the LLM grader
+    gated = _gate_documents(state, config)
+    if gated is not None:
+        return gated
+
+    grader_prompt, user_prompt = _grading_prompts(state)
+
+    # Every document is graded in one structured output call
+    grades = _generate(
+        config,
+        system_prompt=grader_prompt,
+        user_prompt=user_prompt,
+        output_format=DocumentGrades
+    )
+
+    return _prune_documents(state, config, _document_grades(state, grades))
+
+@traced_node
+async def aevaluate_retrieved_documents(state: QuerySearchState, config: RunnableConfig):
+    gated = _gate_documents(state, config)
+    if gated is not None:
+        return gated
+
+    grader_prompt, user_prompt = _grading_prompts(state)
+    grades = await _agenerate(
+        config,
+        system_prompt=grader_prompt,
+        user_prompt=user_prompt,
+        output_format=DocumentGrades
+    )
+
+    return _prune_documents(state, config, _document_grades(state, grades))
 
 def route_research(state: QuerySearchState, config: RunnableConfig) -> Literal["summarize_query_research", "web_research", "__end__"]:
     """ Route the research based on the documents relevance """
@@ -130,83 +443,266 @@ def route_research(state: QuerySearchState, config: RunnableConfig) -> Literal["
         print("Skipping query due to irrelevant documents and web search disabled.")
         return "__end__"
 
+@traced_node
 def web_research(state: QuerySearchState):
     print("--- Web research ---")
-    output = tavily_search(state["query"])
+    output = web_search(state["query"])
     search_results = output["results"]
 
     return {"web_search_results": search_results}
 
-def summarize_query_research(state: QuerySearchState):
+@traced_node
+async def aweb_research(state: QuerySearchState):
+    print("--- Web research ---")
+    output = await aweb_search(state["query"])
+    search_results = output["results"]
+
+    return {"web_search_results": search_results}
+
+def _context_settings(config: RunnableConfig):
+    configurable = config["configurable"]
+    return {
+        "max_tokens_per_source": configurable.get("max_tokens_per_source", DEFAULT_MAX_TOKENS_PER_SOURCE),
+        "near_duplicate_threshold": configurable.get("near_duplicate_threshold", DEFAULT_NEAR_DUPLICATE_THRESHOLD),
+    }
+
+def _log_prompt_size(name, system_prompt, user_prompt, report):
+    prompt_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+    print(f"--- {name} prompt: {prompt_tokens} tokens, context {report['tokens_out']}/{report['tokens_in']} tokens ---")
+    emit({"type": "prompt", "name": name, "prompt_tokens": prompt_tokens, **report})
+
+def _summarizer_prompts(state: QuerySearchState, config: RunnableConfig):
     query = state["query"]
 
-    information = None
+    passages = None
     if state["are_documents_relevant"]:
-        # If documents are relevant: Use RAG documents
-        information = state["retrieved_documents"]
+        # If documents are relevant: Use the RAG documents kept after pruning
+        passages = documents_to_passages(state["relevant_documents"])
     else:
         # If documents are irrelevant: Use web search results,
         # if enabled, otherwise query will be skipped in the previous router node
-        information = state["web_search_results"]
+        passages = web_results_to_passages(state["web_search_results"])
+
+    # Long web pages are truncated and duplicated passages dropped so the
+    # prompt always fits the summarizer budget
+    information, report = build_context(
+        passages,
+        config["configurable"].get("summarizer_context_tokens", DEFAULT_SUMMARIZER_CONTEXT_TOKENS),
+        **_context_settings(config)
+    )
 
     summary_prompt = SUMMARIZER_PROMPT.format(
         query=query,
         docmuents=information
     )
-    
-    # Using local Deepseek R1 model with Ollama
-    # summary = invoke_ollama(
-    #     model='deepseek-r1:7b',
-    #     system_prompt=summary_prompt,
-    #     user_prompt=f"Generate a research summary for this query: {query}"
-    # )
-    # Remove thinking part (reasoning between <think> tags)
-    #summary = parse_output(summary)["response"]
-    
-    # Using external LLM providers with OpenRouter: GPT-4o, Claude, Deepseek R1,... 
-    summary = invoke_llm(
-        #model='gpt-4o-mini',
+    user_prompt = f"Generate a research summary for this query: {query}"
+    _log_prompt_size("summarizer", summary_prompt, user_prompt, report)
+    return summary_prompt, user_prompt
+
+@traced_node
+def summarize_query_research(state: QuerySearchState, config: RunnableConfig):
+    summary_prompt, user_prompt = _summarizer_prompts(state, config)
+    summary = _generate(
+        config,
         system_prompt=summary_prompt,
-        user_prompt=f"Generate a research summary for this query: {query}"
+        user_prompt=user_prompt
     )
 
     return {"search_summaries": [summary]}
 
-def generate_final_answer(state: ResearcherState, config: RunnableConfig):
-    print("--- Generating final answer ---")
+@traced_node
+async def asummarize_query_research(state: QuerySearchState, config: RunnableConfig):
+    summary_prompt, user_prompt = _summarizer_prompts(state, config)
+    summary = await _agenerate(
+        config,
+        system_prompt=summary_prompt,
+        user_prompt=user_prompt
+    )
+
+    return {"search_summaries": [summary]}
+
+def _synthesis_settings(state: ResearcherState, config: RunnableConfig):
+    """Return whether the report is synthesized hierarchically, and the summary token count."""
+    configurable = config["configurable"]
+    mode = configurable.get("synthesis_mode", "auto")
+    summary_tokens = sum(count_tokens(summary) for summary in state["search_summaries"])
+    if mode == "auto":
+        threshold = configurable.get("synthesis_threshold_tokens", DEFAULT_SYNTHESIS_THRESHOLD_TOKENS)
+        return summary_tokens > threshold and len(state["search_summaries"]) > 1, summary_tokens
+    return mode == "hierarchical", summary_tokens
+
+def _synthesis_texts(state: ResearcherState, config: RunnableConfig):
+    """Texts to embed for grouping: the report sections followed by the summaries."""
+    sections = report_sections(config["configurable"].get("report_structure", ""))
+    if not sections:
+        return []
+    return [f"{title}\n{description}" for title, description in sections] + state["search_summaries"]
+
+def _plan_synthesis(state: ResearcherState, config: RunnableConfig, summary_tokens, vectors):
+    # Map step: every summary goes to the report section it is closest to
+    sections = report_sections(config["configurable"].get("report_structure", ""))
+    groups = group_summaries(
+        sections,
+        state["search_summaries"],
+        vectors[:len(sections)],
+        vectors[len(sections):],
+        max_group_size=config["configurable"].get("synthesis_group_size", DEFAULT_SYNTHESIS_GROUP_SIZE),
+    )
+    emit({"type": "synthesis", "mode": "hierarchical", "summary_tokens": summary_tokens, "groups": len(groups)})
+    return {"synthesis_groups": groups}
+
+def _single_pass_synthesis(summary_tokens):
+    emit({"type": "synthesis", "mode": "single", "summary_tokens": summary_tokens, "groups": 0})
+    return {"synthesis_groups": []}
+
+@traced_node
+def plan_synthesis(state: ResearcherState, config: RunnableConfig):
+    print("--- Planning report synthesis ---")
+    hierarchical, summary_tokens = _synthesis_settings(state, config)
+    if not hierarchical:
+        return _single_pass_synthesis(summary_tokens)
+
+    texts = _synthesis_texts(state, config)
+    vectors = get_embeddings().embed_documents(texts) if texts else []
+    return _plan_synthesis(state, config, summary_tokens, vectors)
+
+@traced_node
+async def aplan_synthesis(state: ResearcherState, config: RunnableConfig):
+    print("--- Planning report synthesis ---")
+    hierarchical, summary_tokens = _synthesis_settings(state, config)
+    if not hierarchical:
+        return _single_pass_synthesis(summary_tokens)
+
+    texts = _synthesis_texts(state, config)
+    vectors = await get_embeddings().aembed_documents(texts) if texts else []
+    return _plan_synthesis(state, config, summary_tokens, vectors)
+
+def initiate_synthesis(state: ResearcherState):
+    # Condense the summary groups in parallel, or write the report directly
+    if not state.get("synthesis_groups"):
+        return "generate_final_answer"
+    return [
+        Send("condense_summaries", {"user_instructions": state["user_instructions"], "index": i, **group})
+        for i, group in enumerate(state["synthesis_groups"])
+    ]
+
+def _condenser_prompts(state: SectionCondenseState, config: RunnableConfig):
+    information, report = build_context(
+        summaries_to_passages(state["summaries"]),
+        config["configurable"].get("summarizer_context_tokens", DEFAULT_SUMMARIZER_CONTEXT_TOKENS),
+        with_sources=False,
+        **_context_settings(config)
+    )
+    condenser_prompt = SECTION_CONDENSER_PROMPT.format(
+        instruction=state["user_instructions"],
+        section=state["section"],
+        summaries=information
+    )
+    user_prompt = f"Condense the research summaries for this report section: {state['section']}"
+    _log_prompt_size("section_condenser", condenser_prompt, user_prompt, report)
+    return condenser_prompt, user_prompt
+
+@traced_node
+def condense_summaries(state: SectionCondenseState, config: RunnableConfig):
+    print(f"--- Condensing summaries: {state['section']} ---")
+    condenser_prompt, user_prompt = _condenser_prompts(state, config)
+    condensed = _generate(
+        config,
+        system_prompt=condenser_prompt,
+        user_prompt=user_prompt
+    )
+
+    return {"condensed_summaries": [{"index": state["index"], "section": state["section"], "text": condensed}]}
+
+@traced_node
+async def acondense_summaries(state: SectionCondenseState, config: RunnableConfig):
+    print(f"--- Condensing summaries: {state['section']} ---")
+    condenser_prompt, user_prompt = _condenser_prompts(state, config)
+    condensed = await _agenerate(
+        config,
+        system_prompt=condenser_prompt,
+        user_prompt=user_prompt
+    )
+
+    return {"condensed_summaries": [{"index": state["index"], "section": state["section"], "text": condensed}]}
+
+def _report_passages(state: ResearcherState):
+    if state.get("condensed_summaries"):
+        # Reduce step: the condensed notes of every section, in report order
+        condensed = sorted(state["condensed_summaries"], key=lambda item: item["index"])
+        return [(item["section"], f"## {item['section']}\n{item['text']}") for item in condensed]
+    return summaries_to_passages(state["search_summaries"])
+
+def _report_writer_prompts(state: ResearcherState, config: RunnableConfig):
     report_structure = config["configurable"].get("report_structure", "")
+    information, report = build_context(
+        _report_passages(state),
+        config["configurable"].get("report_context_tokens", DEFAULT_REPORT_CONTEXT_TOKENS),
+        with_sources=False,
+        **_context_settings(config)
+    )
     answer_prompt = REPORT_WRITER_PROMPT.format(
         instruction=state["user_instructions"],
         report_structure=report_structure,
-        information="\n\n---\n\n".join(state["search_summaries"])
-    )
-
-    # Using local Deepseek R1 model with Ollama
-    # result = invoke_ollama(
-    #     model='deepseek-r1:7b',
-    #     system_prompt=answer_prompt,
-    #     user_prompt=f"Generate a research summary using the provided information."
-    # )
-    # Remove thinking part (reasoning between <think> tags)
-    #answer = parse_output(result)["response"]
-    
-    # # Using external LLM providers with OpenRouter: GPT-4o, Claude, Deepseek R1,... 
-    answer = invoke_llm(
-        #model='gpt-4o-mini',
-        system_prompt=answer_prompt,
-        user_prompt=f"Generate a research summary using the provided information."
-    )  
-    
+        information=information
+    )
+    user_prompt = "Generate a research summary using the provided information."
+    _log_prompt_size("report_writer", answer_prompt, user_prompt, report)
+    return answer_prompt, user_prompt
+
+def _write_report_token(text):
+    # Tokens skip the trace sinks, they are only meant for live rendering
+    write_to_stream({"type": "token", "name": "report_writer", "text": text})
+
+@traced_node
+def generate_final_answer(state: ResearcherState, config: RunnableConfig):
+    print("--- Generating final answer ---")
+    answer_prompt, user_prompt = _report_writer_prompts(state, config)
+    if config["configurable"].get("stream_report", True):
+        # Forward the report as it is written, through the custom stream
+        answer = _stream_generate(
+            config,
+            system_prompt=answer_prompt,
+            user_prompt=user_prompt,
+            on_token=_write_report_token
+        )
+    else:
+        answer = _generate(
+            config,
+            system_prompt=answer_prompt,
+            user_prompt=user_prompt
+        )
+
+    return {"final_answer": answer}
+
+@traced_node
+async def agenerate_final_answer(state: ResearcherState, config: RunnableConfig):
+    print("--- Generating final answer ---")
+    answer_prompt, user_prompt = _report_writer_prompts(state, config)
+    if config["configurable"].get("stream_report", True):
+        answer = await _astream_generate(
+            config,
+            system_prompt=answer_prompt,
+            user_prompt=user_prompt,
+            on_token=_write_report_token
+        )
+    else:
+        answer = await _agenerate(
+            config,
+            system_prompt=answer_prompt,
+            user_prompt=user_prompt
+        )
+
     return {"final_answer": answer}
 
 # Create subghraph for searching each query
 query_search_subgraph = StateGraph(QuerySearchState, input=QuerySearchStateInput, output=QuerySearchStateOutput)
 
 # Define subgraph nodes for searching the query
-query_search_subgraph.add_node(retrieve_rag_documents)
-query_search_subgraph.add_node(evaluate_retrieved_documents)
-query_search_subgraph.add_node(web_research)
-query_search_subgraph.add_node(summarize_query_research)
+query_search_subgraph.add_node("retrieve_rag_documents", _node(retrieve_rag_documents, aretrieve_rag_documents))
+query_search_subgraph.add_node("evaluate_retrieved_documents", _node(evaluate_retrieved_documents, aevaluate_retrieved_documents))
+query_search_subgraph.add_node("web_research", _node(web_research, aweb_research))
+query_search_subgraph.add_node("summarize_query_research", _node(summarize_query_research, asummarize_query_research))
 
 # Set entry point and define transitions for the subgraph
 query_search_subgraph.add_edge(START, "retrieve_rag_documents")
@@ -215,21 +711,37 @@ query_search_subgraph.add_conditional_edges("evaluate_retrieved_documents", rout
 query_search_subgraph.add_edge("web_research", "summarize_query_research")
 query_search_subgraph.add_edge("summarize_query_research", END)
 
+query_search_graph = query_search_subgraph.compile()
+
 # Create main research agent graph
 researcher_graph = StateGraph(ResearcherState, input=ResearcherStateInput, output=ResearcherStateOutput, config_schema=Configuration)
 
 # Define main researcher nodes
-researcher_graph.add_node(generate_research_queries)
-researcher_graph.add_node(search_queries)
-researcher_graph.add_node("search_and_summarize_query", query_search_subgraph.compile())
-researcher_graph.add_node(generate_final_answer)
+researcher_graph.add_node("generate_research_queries", _node(generate_research_queries, agenerate_research_queries))
+researcher_graph.add_node("search_queries", _node(search_queries, asearch_queries))
+researcher_graph.add_node("search_and_summarize_query", _node(search_and_summarize_query, asearch_and_summarize_query))
+researcher_graph.add_node("plan_synthesis", _node(plan_synthesis, aplan_synthesis))
+researcher_graph.add_node("condense_summaries", _node(condense_summaries, acondense_summaries))
+researcher_graph.add_node("generate_final_answer", _node(generate_final_answer, agenerate_final_answer))
 
 # Define transitions for the main graph
 researcher_graph.add_edge(START, "generate_research_queries")
 researcher_graph.add_edge("generate_research_queries", "search_queries")
-researcher_graph.add_conditional_edges("search_queries", initiate_query_research, ["search_and_summarize_query"])
-researcher_graph.add_conditional_edges("search_and_summarize_query", check_more_queries)
+researcher_graph.add_conditional_edges("search_queries", initiate_query_research, ["search_and_summarize_query", "plan_synthesis"])
+researcher_graph.add_edge("search_and_summarize_query", "plan_synthesis")
+researcher_graph.add_conditional_edges("plan_synthesis", initiate_synthesis, ["condense_summaries", "generate_final_answer"])
+researcher_graph.add_edge("condense_summaries", "generate_final_answer")
 researcher_graph.add_edge("generate_final_answer", END)
 
+def compile_researcher(checkpointer=None):
+    """
+    Compile the researcher graph.
+
+    With a checkpointer, runs are saved under the `thread_id` of their
+    config, and a run interrupted halfway is resumed by running its thread
+    again with a None input.
+    """
+    return researcher_graph.compile(checkpointer=checkpointer)
+
 # Compile the researcher graph
-researcher = researcher_graph.compile()
\ No newline at end of file
+researcher = compile_researcher()
@@ -0,0 +1,376 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from langchain_community.document_loaders import CSVLoader, TextLoader, PDFPlumberLoader, UnstructuredFileLoader
+from src.assistant.tokens import count_tokens
+from src.assistant.vector_db import VECTOR_DB_PATH, CHUNK_SIZE, CHUNK_OVERLAP, get_collection_file, get_embeddings, get_or_create_vector_db, split_documents, upsert_embedded_chunks, delete_chunks
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+# Document loader for each supported file extension, other files
+# go through unstructured like the DirectoryLoader used to do
+LOADERS = {
+    "csv": CSVLoader,
+    "txt": TextLoader,
+    "md": TextLoader,
+    "pdf": PDFPlumberLoader,
+}
+DEFAULT_LOADER = UnstructuredFileLoader
+
+CHUNKING = {
+    "splitter": "SemanticChunker+RecursiveCharacterTextSplitter",
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+}
+
+# Chunks per embedding request, well below the OpenAI limit of 2048 inputs
+# and ~300k tokens per request for chunks of up to 2000 characters
+DEFAULT_EMBEDDING_BATCH_SIZE = 256
+
+FILE_STATUSES = ("added", "updated", "duplicate", "unchanged", "unsupported", "failed")
+
+_manifest_lock = threading.RLock()
+
+def get_manifest_path():
+    return get_collection_file(MANIFEST_FILENAME)
+
+def load_manifest():
+    """
+    Load the ingestion manifest.
+
+    The manifest maps every ingested source to its content hash, loader,
+    chunking parameters and the IDs of its chunks in the vector store.
+    """
+    try:
+        with open(get_manifest_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"version": 1, "files": {}}
+
+def save_manifest(manifest):
+    """Atomically write the manifest next to the vector store."""
+    os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+    tmp_path = get_manifest_path() + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, get_manifest_path())
+
+def file_hash(path):
+    """SHA-256 of the file content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_loader(path):
+    """Return the loader class for a file, or None for unsupported files."""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension in LOADERS:
+        return LOADERS[extension]
+    return DEFAULT_LOADER if extension else None
+
+def chunk_ids(content_hash, chunks):
+    """
+    Deterministic chunk IDs derived from the source content, the chunking
+    parameters and each chunk's position and text. Re-ingesting identical
+    content always yields the same IDs, so writes are idempotent upserts.
+    """
+    params = json.dumps(CHUNKING, sort_keys=True)
+    return [
+        hashlib.sha256(f"{content_hash}:{params}:{i}:{chunk.page_content}".encode("utf-8")).hexdigest()[:32]
+        for i, chunk in enumerate(chunks)
+    ]
+
+def _referenced_ids(manifest, exclude=None):
+    ids = set()
+    for source, entry in manifest["files"].items():
+        if source != exclude:
+            ids.update(entry["chunk_ids"])
+    return ids
+
+def _remove_source(manifest, source):
+    """Drop a source from the manifest and delete the chunks no other source shares."""
+    entry = manifest["files"].pop(source, None)
+    if entry is None:
+        return 0
+    stale_ids = set(entry["chunk_ids"]) - _referenced_ids(manifest)
+    delete_chunks(stale_ids)
+    return len(stale_ids)
+
+def _untracked_chunk_ids(path):
+    """IDs of chunks loaded from `path` before the manifest existed."""
+    vectorstore = get_or_create_vector_db()
+    return vectorstore.get(where={"source": path}, include=[])["ids"]
+
+def _load_file(path, loader_name):
+    """Load a file in a worker process. Loaders are looked up by name to keep the call picklable."""
+    loader_cls = next((cls for cls in (*LOADERS.values(), DEFAULT_LOADER) if cls.__name__ == loader_name))
+    return loader_cls(path).load()
+
+def _chunk_file(content_hash, documents):
+    chunks = split_documents(documents)
+    return chunks, chunk_ids(content_hash, chunks)
+
+def _plan_file(path, source, manifest):
+    """Decide what to do with a file: skip it, share a duplicate's chunks, or (re-)ingest it."""
+    loader_cls = get_loader(path)
+    if loader_cls is None:
+        return {"status": "unsupported", "source": source}
+
+    content_hash = file_hash(path)
+    previous = manifest["files"].get(source)
+    if previous and previous["content_hash"] == content_hash \
+            and previous["loader"] == loader_cls.__name__ and previous["chunking"] == CHUNKING:
+        return {"status": "unchanged", "source": source}
+
+    # Identical content already ingested under another name: share its chunks
+    duplicate_of = next(
+        (other for other, entry in manifest["files"].items()
+         if other != source and entry["content_hash"] == content_hash
+         and entry["loader"] == loader_cls.__name__ and entry["chunking"] == CHUNKING),
+        None
+    )
+    return {
+        "status": "duplicate" if duplicate_of else ("updated" if previous else "added"),
+        "path": path,
+        "source": source,
+        "loader": loader_cls.__name__,
+        "content_hash": content_hash,
+        "duplicate_of": duplicate_of,
+    }
+
+def _record_file(manifest, plan, ids):
+    """Point the manifest at the new chunks and delete those of the previous version."""
+    source = plan["source"]
+    previous = manifest["files"].get(source)
+    if previous:
+        stale_ids = set(previous["chunk_ids"]) - set(ids) - _referenced_ids(manifest, exclude=source)
+        delete_chunks(stale_ids)
+
+    manifest["files"][source] = {
+        "content_hash": plan["content_hash"],
+        "loader": plan["loader"],
+        "chunking": CHUNKING,
+        "chunk_ids": ids,
+        "ingested_at": time.time(),
+    }
+
+class _EmbeddingWriter:
+    """
+    Last pipeline stage: embeds chunks in provider-sized batches and
+    bulk-writes them to Chroma from a background thread. The bounded queue
+    applies backpressure to the loading and chunking stages.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self._embeddings = get_embeddings()
+        self.stats = {"chunks": 0, "tokens": 0, "embedding_requests": 0}
+        self._pending = []
+        self._queue = queue.Queue(maxsize=4)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="ingestion-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, chunks, ids):
+        self._pending.extend(zip(chunks, ids))
+        while len(self._pending) >= self.batch_size:
+            self._put(self._pending[:self.batch_size])
+            self._pending = self._pending[self.batch_size:]
+
+    def _put(self, batch):
+        if self._error:
+            raise self._error
+        self._queue.put(batch)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error:
+                continue
+            try:
+                chunks = [chunk for chunk, _ in batch]
+                ids = [chunk_id for _, chunk_id in batch]
+                texts = [chunk.page_content for chunk in chunks]
+                vectors = self._embeddings.embed_documents(texts)
+                upsert_embedded_chunks(chunks, ids, vectors)
+                self.stats["chunks"] += len(chunks)
+                self.stats["tokens"] += sum(count_tokens(text) for text in texts)
+                self.stats["embedding_requests"] += 1
+            except BaseException as e:
+                self._error = e
+
+    def close(self):
+        """Flush the last partial batch and wait for every write to finish."""
+        if self._pending and not self._error:
+            self._put(self._pending)
+        self._pending = []
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+def ingest_files(files, manifest=None, workers=None, batch_size=None):
+    """
+    Ingest files through a streaming pipeline.
+
+    Files are loaded and parsed in a process pool, chunked in a thread pool
+    as soon as each one is loaded, and the chunks stream into batched
+    embedding requests and bulk Chroma upserts.
+
+    Args:
+        files: List of `(path, source)` pairs, `source` being the manifest key
+            or None to use the normalized path
+        manifest: Manifest to update, loaded and saved when not provided
+        workers: Number of loader processes and chunking threads
+        batch_size: Number of chunks per embedding request
+
+    Returns:
+        dict: Number of files per ingestion status, plus throughput stats
+    """
+    workers = workers or int(os.environ.get("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+    batch_size = batch_size or int(os.environ.get("INGEST_EMBEDDING_BATCH_SIZE", DEFAULT_EMBEDDING_BATCH_SIZE))
+    report = {"added": 0, "updated": 0, "duplicate": 0, "unchanged": 0, "unsupported": 0, "failed": 0}
+    started_at = time.perf_counter()
+    documents_loaded = 0
+
+    with _manifest_lock:
+        owns_manifest = manifest is None
+        if owns_manifest:
+            manifest = load_manifest()
+
+        plans = []
+        for path, source in files:
+            path = os.path.normpath(path)
+            plan = _plan_file(path, source or path, manifest)
+            if plan["status"] == "duplicate":
+                _record_file(manifest, plan, manifest["files"][plan["duplicate_of"]]["chunk_ids"])
+            elif plan["status"] == "added" and plan["source"] not in manifest["files"]:
+                # Replace chunks written for this file before it was tracked
+                delete_chunks(set(_untracked_chunk_ids(path)) - _referenced_ids(manifest))
+            if plan["status"] in ("added", "updated"):
+                plans.append(plan)
+            else:
+                report[plan["status"]] += 1
+
+        # A single file is loaded in-process, starting a process pool is not worth it.
+        # Loader processes are spawned, not forked: the writer thread, the
+        # caller's threads and Chroma's own may hold locks a fork would copy.
+        if workers > 1 and len(plans) > 1:
+            load_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            load_pool = ThreadPoolExecutor(max_workers=workers)
+        writer = _EmbeddingWriter(batch_size)
+        written = []
+        try:
+            with load_pool, ThreadPoolExecutor(max_workers=workers) as chunk_pool:
+                pending = {
+                    load_pool.submit(_load_file, plan["path"], plan["loader"]): {**plan, "stage": "load"}
+                    for plan in plans
+                }
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        plan = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"Error ingesting {plan['path']}: {str(e)}")
+                            report["failed"] += 1
+                            continue
+
+                        if plan["stage"] == "load":
+                            # Loading stage finished, hand the documents to the chunking stage
+                            documents_loaded += len(result)
+                            pending[chunk_pool.submit(_chunk_file, plan["content_hash"], result)] = {**plan, "stage": "chunk"}
+                        else:
+                            # Chunking stage finished, stream the chunks to the writer
+                            chunks, ids = result
+                            writer.add(chunks, ids)
+                            written.append((plan, ids))
+        finally:
+            writer.close()
+
+        for plan, ids in written:
+            _record_file(manifest, plan, ids)
+            report[plan["status"]] += 1
+
+        if owns_manifest:
+            save_manifest(manifest)
+
+    elapsed = max(time.perf_counter() - started_at, 1e-9)
+    report.update({
+        "documents": documents_loaded,
+        "chunks": writer.stats["chunks"],
+        "tokens": writer.stats["tokens"],
+        "embedding_requests": writer.stats["embedding_requests"],
+        "seconds": round(elapsed, 3),
+        "documents_per_second": round(documents_loaded / elapsed, 2),
+        "tokens_per_second": round(writer.stats["tokens"] / elapsed, 2),
+    })
+    return report
+
+def ingest_file(path, source=None, manifest=None):
+    """
+    Ingest one file if it is new or changed since the last ingestion.
+
+    Args:
+        path: Path of the file to load
+        source: Manifest key of the file, defaults to the normalized path
+        manifest: Manifest to update, loaded and saved when not provided
+
+    Returns:
+        str: "unchanged", "duplicate", "added", "updated", "unsupported" or "failed"
+    """
+    report = ingest_files([(path, source)], manifest=manifest, workers=1)
+    return next(status for status in FILE_STATUSES if report[status])
+
+def sync_directory(directory, workers=None):
+    """
+    Bring the vector store in line with the files of a directory.
+
+    New and changed files are (re-)ingested, unchanged files are skipped and
+    the chunks of files deleted from the directory are removed.
+
+    Returns:
+        dict: Number of files per ingestion status, "removed" and throughput stats
+    """
+    directory = os.path.normpath(directory)
+
+    with _manifest_lock:
+        manifest = load_manifest()
+        paths = [
+            os.path.normpath(os.path.join(root, filename))
+            for root, _, filenames in os.walk(directory)
+            for filename in sorted(filenames)
+        ]
+        report = ingest_files([(path, None) for path in paths], manifest=manifest, workers=workers)
+
+        report["removed"] = 0
+        prefix = directory + os.sep
+        seen = set(paths)
+        for source in list(manifest["files"]):
+            if source.startswith(prefix) and source not in seen:
+                _remove_source(manifest, source)
+                report["removed"] += 1
+
+        save_manifest(manifest)
+
+    print(f"--- Synced {directory}: {report} ---")
+    return report
+
+def remove_source(source):
+    """Remove a previously ingested source and its chunks from the vector store."""
+    with _manifest_lock:
+        manifest = load_manifest()
+        removed = _remove_source(manifest, source)
+        save_manifest(manifest)
+        return removed
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import time
+import uuid
+from contextlib import AsyncExitStack
+from src.assistant.checkpoints import delete_checkpoints, node_updates, open_async_checkpointer, resume_input, with_thread_id
+from src.assistant.graph import compile_researcher
+
+# Worker pool and admission limits, overridable with JOB_WORKERS,
+# JOB_QUEUE_SIZE, JOB_MAX_PER_USER, JOB_TTL and JOB_RETRY_AFTER
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_JOB_QUEUE_SIZE = 20
+DEFAULT_JOB_MAX_PER_USER = 3
+# Finished jobs (status, events, report) are kept this long, in seconds
+DEFAULT_JOB_TTL = 3600
+# Retry-After of refused jobs, in seconds, until a job run time is known
+DEFAULT_JOB_RETRY_AFTER = 30
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+class AdmissionError(Exception):
+    """A job was refused because the queue or the user's quota is full."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class Job:
+    """One research run: its input, configuration, status and event log."""
+
+    def __init__(self, user, initial_state, config):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.initial_state = initial_state
+        self.config = with_thread_id(config, self.id)
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.final_answer = None
+        # Custom stream events and node completions, replayed to every subscriber
+        self.events = []
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    async def _publish(self, event):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def _set_status(self, status, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.status = status
+        await self._publish({"type": "status", "status": status, "ts": time.time()})
+
+    async def subscribe(self, start=0):
+        """
+        Yield `(index, event)` pairs from the `start`-th event on, until the job finishes.
+
+        Subscribers read the shared event log at their own pace, so a slow
+        client never holds up the job nor buffers events of its own.
+        """
+        index = start
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.status in FINISHED_STATUSES)
+                events = self.events[index:]
+                finished = self.status in FINISHED_STATUSES
+            for event in events:
+                yield index, event
+                index += 1
+            if finished and index >= len(self.events):
+                return
+
+    def to_dict(self, position=None):
+        return {
+            "id": self.id,
+            "user": self.user,
+            "status": self.status,
+            "queue_position": position,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "events": len(self.events),
+            "final_answer": self.final_answer,
+        }
+
+class JobManager:
+    """
+    Queue of research jobs drained by a pool of async workers.
+
+    Workers share the process-wide vector store, LLM clients, query
+    scheduler and call governors, so provider concurrency stays bounded
+    however many jobs run. Submissions beyond the queue size, or beyond a
+    user's quota of unfinished jobs, are refused instead of queued
+    (backpressure on the clients). Jobs are checkpointed under their ID, a
+    failed or cancelled job can be resumed from where it stopped.
+
+    Must be started and used from a single event loop.
+    """
+
+    def __init__(self, workers=None, queue_size=None, max_per_user=None, ttl=None, retry_after=None):
+        self.workers = workers or int(os.environ.get("JOB_WORKERS", DEFAULT_JOB_WORKERS))
+        self.queue_size = queue_size or int(os.environ.get("JOB_QUEUE_SIZE", DEFAULT_JOB_QUEUE_SIZE))
+        self.max_per_user = max_per_user or int(os.environ.get("JOB_MAX_PER_USER", DEFAULT_JOB_MAX_PER_USER))
+        self.ttl = ttl or float(os.environ.get("JOB_TTL", DEFAULT_JOB_TTL))
+        self.retry_after = retry_after or int(os.environ.get("JOB_RETRY_AFTER", DEFAULT_JOB_RETRY_AFTER))
+        self.jobs = {}
+        self._queue = None
+        self._worker_tasks = []
+        self._exit_stack = None
+        self._checkpointer = None
+        self._researcher = None
+        self._run_times = []
+
+    async def start(self):
+        self._exit_stack = AsyncExitStack()
+        self._checkpointer = await self._exit_stack.enter_async_context(open_async_checkpointer())
+        self._researcher = compile_researcher(self._checkpointer)
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the running and queued jobs, then stop the workers."""
+        for job in self.jobs.values():
+            if job.status not in FINISHED_STATUSES:
+                await self.cancel(job.id)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        # Jobs don't outlive the process, nor do the checkpoints to resume them
+        for job in self.jobs.values():
+            if job.status != SUCCEEDED:
+                await delete_checkpoints(self._checkpointer, job.id)
+        await self._exit_stack.aclose()
+
+    def _queued(self):
+        return [job for job in self.jobs.values() if job.status == QUEUED]
+
+    def _retry_after(self):
+        """Rough wait until a worker frees up, from the recent job run times."""
+        if not self._run_times:
+            return self.retry_after
+        mean_run_time = sum(self._run_times) / len(self._run_times)
+        return max(round(mean_run_time * (len(self._queued()) / self.workers + 1)), 1)
+
+    def _purge(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.status in FINISHED_STATUSES and now - job.finished_at > self.ttl:
+                del self.jobs[job_id]
+                if job.status != SUCCEEDED:
+                    # Kept to resume the job, which can't be looked up anymore
+                    asyncio.create_task(delete_checkpoints(self._checkpointer, job_id))
+
+    def _admit(self, user):
+        self._purge()
+        if len(self._queued()) >= self.queue_size:
+            raise AdmissionError("The job queue is full", retry_after=self._retry_after())
+        active = sum(1 for job in self.jobs.values() if job.user == user and job.status not in FINISHED_STATUSES)
+        if active >= self.max_per_user:
+            raise AdmissionError(f"User {user} already has {active} unfinished jobs", retry_after=self._retry_after())
+
+    def submit(self, user, initial_state, config):
+        """
+        Queue a research job.
+
+        Raises:
+            AdmissionError: The queue is full, or the user has too many unfinished jobs
+        """
+        self._admit(user)
+        job = Job(user, initial_state, config)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    async def resume(self, job_id):
+        """
+        Queue a failed or cancelled job again, returns False if it can't be resumed.
+
+        The queries it already finished are not run again.
+
+        Raises:
+            AdmissionError: The queue is full, or the user has too many unfinished jobs
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in (FAILED, CANCELLED):
+            return False
+        self._admit(job.user)
+        job.error = None
+        job.final_answer = None
+        job.finished_at = None
+        await job._set_status(QUEUED)
+        self._queue.put_nowait(job)
+        return True
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def position(self, job):
+        """Position of a queued job in the queue, 0 for the next one to run."""
+        if job.status != QUEUED:
+            return None
+        return [queued.id for queued in self._queued()].index(job.id)
+
+    async def cancel(self, job_id):
+        """Cancel a queued or running job, returns False if it already finished."""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return False
+        if job.status == QUEUED or job.task is None:
+            # Workers skip cancelled jobs when they dequeue them
+            await job._set_status(CANCELLED, finished_at=time.time())
+        else:
+            job.task.cancel()
+        return True
+
+    def stats(self):
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED_STATUSES}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"workers": self.workers, "queue_size": self.queue_size, "max_per_user": self.max_per_user, "jobs": counts}
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != QUEUED:
+                    continue
+                # Own task per job, so a job can be cancelled without its worker
+                job.task = asyncio.create_task(self._run(job))
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+            finally:
+                job.task = None
+                self._queue.task_done()
+
+    async def _run(self, job):
+        if job.status != QUEUED:
+            # Cancelled before the task started
+            return
+        print(f"--- Running job {job.id} ---")
+        await job._set_status(RUNNING, started_at=time.time())
+        try:
+            inputs = job.initial_state
+            if self._checkpointer is not None:
+                inputs = await resume_input(self._researcher, job.config, job.initial_state)
+            async for mode, output in self._researcher.astream(inputs, config=job.config, stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    await job._publish(output)
+                    continue
+                for key, value in node_updates(output):
+                    if key == "generate_final_answer":
+                        job.final_answer = value["final_answer"]
+                    await job._publish({"type": "node_finished", "name": key, "ts": time.time()})
+        except asyncio.CancelledError:
+            await job._set_status(CANCELLED, finished_at=time.time())
+            raise
+        except Exception as e:
+            await job._set_status(FAILED, finished_at=time.time(), error=f"{type(e).__name__}: {e}")
+            return
+
+        # Only needed to resume the job
+        await delete_checkpoints(self._checkpointer, job.id)
+        finished_at = time.time()
+        self._run_times = (self._run_times + [finished_at - job.started_at])[-20:]
+        await job._set_status(SUCCEEDED, finished_at=finished_at)
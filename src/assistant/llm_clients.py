@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+from ollama import Client as OllamaClient, AsyncClient as AsyncOllamaClient
+
+# Connection pool defaults, overridable with LLM_POOL_SIZE / LLM_TIMEOUT
+DEFAULT_POOL_SIZE = 20
+DEFAULT_TIMEOUT = 120.0
+
+# How long Ollama keeps a model loaded after a request, overridable with OLLAMA_KEEP_ALIVE
+DEFAULT_OLLAMA_KEEP_ALIVE = "30m"
+
+_lock = threading.Lock()
+_http_client = None
+_ollama_client = None
+_chat_models = {}
+# Async HTTP clients hold connections bound to the event loop that opened them,
+# so async clients and the models using them are kept per event loop, and
+# closed with `aclose_async_llm_clients` before the loop ends
+_async_registries = weakref.WeakKeyDictionary()
+
+def get_pool_settings():
+    """Return the `(pool_size, timeout)` used for every provider connection pool."""
+    pool_size = int(os.environ.get("LLM_POOL_SIZE", DEFAULT_POOL_SIZE))
+    timeout = float(os.environ.get("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+    return pool_size, timeout
+
+def _client_kwargs():
+    pool_size, timeout = get_pool_settings()
+    return {
+        "limits": httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        "timeout": httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+    }
+
+def get_http_client():
+    """Shared keep-alive HTTP client for sync provider calls, safe to use from any thread."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(**_client_kwargs())
+        return _http_client
+
+def _async_registry():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if loop not in _async_registries:
+            _async_registries[loop] = {"http_client": None, "ollama_client": None, "chat_models": {}}
+        return _async_registries[loop]
+
+async def aclose_async_llm_clients():
+    """Close the async clients of the running event loop, their sockets are released right away."""
+    with _lock:
+        registry = _async_registries.pop(asyncio.get_running_loop(), None)
+    if registry is None:
+        return
+    if registry["http_client"] is not None:
+        await registry["http_client"].aclose()
+    if registry["ollama_client"] is not None:
+        await registry["ollama_client"].close()
+
+def get_async_http_client():
+    """Shared keep-alive HTTP client for async provider calls on the running event loop."""
+    registry = _async_registry()
+    if registry["http_client"] is None:
+        registry["http_client"] = httpx.AsyncClient(**_client_kwargs())
+    return registry["http_client"]
+
+def get_ollama_client():
+    """Shared Ollama client with a pooled keep-alive connection to the Ollama server."""
+    global _ollama_client
+    with _lock:
+        if _ollama_client is None:
+            _ollama_client = OllamaClient(**_client_kwargs())
+        return _ollama_client
+
+def get_async_ollama_client():
+    """Shared Ollama `AsyncClient` for the running event loop."""
+    registry = _async_registry()
+    if registry["ollama_client"] is None:
+        registry["ollama_client"] = AsyncOllamaClient(**_client_kwargs())
+    return registry["ollama_client"]
+
+def get_ollama_keep_alive():
+    """Keep-alive sent with every Ollama request, so the model stays loaded between calls."""
+    return os.environ.get("OLLAMA_KEEP_ALIVE", DEFAULT_OLLAMA_KEEP_ALIVE)
+
+def warm_up_ollama(model):
+    """Load an Ollama model ahead of the first request, an empty prompt only loads it."""
+    get_ollama_client().generate(model=model, prompt="", keep_alive=get_ollama_keep_alive())
+
+def _build_chat_model(provider, model, temperature, output_format, http_client=None, http_async_client=None):
+    _, timeout = get_pool_settings()
+    if provider == "deepseek":
+        from langchain_deepseek import ChatDeepSeek
+        llm = ChatDeepSeek(
+            model=model,
+            temperature=temperature,
+            request_timeout=timeout,
+            # Retries are left to the call governor
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+    elif provider == "openai":
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            request_timeout=timeout,
+            # Retries are left to the call governor
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+    else:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+
+    # If Response format is provided use structured output, keeping the
+    # raw message for token usage
+    if output_format:
+        llm = llm.with_structured_output(output_format, include_raw=True)
+    return llm
+
+def get_chat_model(provider, model, temperature=0, output_format=None):
+    """
+    Get a chat model from the registry, building it on first use.
+
+    Models are keyed by provider, model, temperature and output schema and
+    share one pooled HTTP client, so every call reuses warm connections
+    instead of opening a new one.
+    """
+    key = (provider, model, temperature, output_format)
+    with _lock:
+        llm = _chat_models.get(key)
+    if llm is None:
+        llm = _build_chat_model(provider, model, temperature, output_format, http_client=get_http_client())
+        with _lock:
+            llm = _chat_models.setdefault(key, llm)
+    return llm
+
+def get_async_chat_model(provider, model, temperature=0, output_format=None):
+    """Async counterpart of `get_chat_model`, bound to the running event loop's HTTP client."""
+    registry = _async_registry()
+    key = (provider, model, temperature, output_format)
+    if key not in registry["chat_models"]:
+        registry["chat_models"][key] = _build_chat_model(
+            provider, model, temperature, output_format, http_async_client=get_async_http_client()
+        )
+    return registry["chat_models"][key]
@@ -14,15 +14,16 @@ Your output must only be a JSON object containing a single key "queries":
 * **Today is: {date}**
 """
 
-RELEVANCE_EVALUATOR_PROMPT = """Your goal is to evaluate and determine if the provided documents are relevant to answer the user's query.
+DOCUMENT_GRADER_PROMPT = """Your goal is to grade how relevant each of the provided documents is to answer the user's query.
 
 # Key Considerations:
 
+* Grade every document on its own, from 0 (unrelated to the query) to 1 (directly answers the query)
 * Focus on semantic relevance, not just keyword matching
 * Consider both explicit and implicit query intent
 * A document can be relevant even if it only partially answers the query.
-* **Your output must only be a valid JSON object with a single key "is_relevant":**
-{{'is_relevant': True/False}}
+* **Your output must only be a valid JSON object with a single key "scores", holding one score per document in the order the documents are given:**
+{{"scores": [0.9, 0.1, ...]}}
 
 # USER QUERY:
 {query}
@@ -31,8 +32,8 @@ RELEVANCE_EVALUATOR_PROMPT = """Your goal is to evaluate and determine if the pr
 {documents}
 
 # **IMPORTANT:**
-* **Your output must only be a valid JSON object with a single key "is_relevant":**
-{{'is_relevant': True/False}}
+* **Your output must only be a valid JSON object with a single key "scores", holding exactly {num_documents} scores:**
+{{"scores": [0.9, 0.1, ...]}}
 """
 
 
@@ -75,4 +76,22 @@ PROVIDED INFORMATION:
 - Start IMMEDIATELY with the summary content - no introductions or meta-commentary
 - Focus ONLY on factual, objective information
 - Avoid redundancy, repetition, or unnecessary commentary.
-"""
\ No newline at end of file
+"""
+
+SECTION_CONDENSER_PROMPT = """Your goal is to condense research summaries into the key information needed to write one section of a report.
+
+USER INSTRUCTION:
+{instruction}
+
+REPORT SECTION:
+{section}
+
+RESEARCH SUMMARIES:
+{summaries}
+
+# **CRITICAL GUIDELINES:**
+- Keep every fact, figure and finding relevant to this section, drop the rest
+- Merge overlapping findings instead of repeating them
+- Start IMMEDIATELY with the condensed content - no introductions or meta-commentary
+- Focus ONLY on factual, objective information
+"""
@@ -0,0 +1,248 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from src.assistant.cache import cache_key
+
+# Cached outcomes are reused for queries at least this similar to the cached query
+DEFAULT_QUERY_CACHE_THRESHOLD = 0.95
+DEFAULT_QUERY_CACHE_MAX_ENTRIES = 10_000
+# Entries expire after a day, summaries of web results would go stale otherwise
+DEFAULT_QUERY_CACHE_TTL = 86400
+
+# Settings changing the outcome of a query search, entries are only
+# reused under the same values
+QUERY_CACHE_CONFIG_KEYS = (
+    "enable_web_search", "retrieval_mode", "retrieval_k", "retrieval_fetch_k", "rrf_k",
+    "relevance_gate", "relevance_accept_threshold", "relevance_reject_threshold",
+    "document_grade_threshold", "context_token_budget", "summarizer_context_tokens",
+    "max_tokens_per_source", "near_duplicate_threshold", "llm_backend", "ollama_model",
+)
+
+class QueryResultCache:
+    """
+    Persistent cache of query search outcomes, looked up by query embedding.
+
+    Every entry stores the IDs of the retrieved chunks, the relevance
+    verdict and the summaries of one query. Lookups return the entry whose
+    query embedding is the most similar to the new one, above a threshold.
+    The embeddings are held in memory as one normalized matrix, so a lookup
+    is a single matrix-vector product, and reloaded when another process
+    writes to the cache.
+
+    Entries expire after `ttl` seconds and are dropped as soon as one of
+    their chunks is updated or deleted in the vector store.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_QUERY_CACHE_TTL, max_entries=DEFAULT_QUERY_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        self._index = None
+        self._data_version = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                query TEXT NOT NULL,
+                config_key TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                is_relevant INTEGER NOT NULL,
+                summaries TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunk_refs (chunk_id TEXT NOT NULL, entry_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS chunk_refs_chunk_id ON chunk_refs (chunk_id);
+            CREATE INDEX IF NOT EXISTS chunk_refs_entry_id ON chunk_refs (entry_id);
+            """
+        )
+        self._conn.commit()
+
+    def _load_index(self):
+        """(Re)build the in-memory embedding matrix when the database changed."""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._index is not None and data_version == self._data_version:
+            return self._index
+
+        rows = self._conn.execute("SELECT id, config_key, created_at, embedding FROM entries").fetchall()
+        if rows:
+            vectors = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+            self._index = {
+                "ids": np.array([row[0] for row in rows]),
+                "config_keys": np.array([row[1] for row in rows]),
+                "created_at": np.array([row[2] for row in rows]),
+                "vectors": vectors,
+            }
+        else:
+            self._index = {"ids": np.array([], dtype=int), "config_keys": np.array([]), "created_at": np.array([]), "vectors": None}
+        self._data_version = data_version
+        return self._index
+
+    def _delete_entries(self, entry_ids):
+        entry_ids = [(int(entry_id),) for entry_id in entry_ids]
+        self._conn.executemany("DELETE FROM chunk_refs WHERE entry_id = ?", entry_ids)
+        self._conn.executemany("DELETE FROM entries WHERE id = ?", entry_ids)
+        self._index = None
+
+    def lookup(self, embedding, config_key, threshold=DEFAULT_QUERY_CACHE_THRESHOLD):
+        """
+        Find the cached outcome of the most similar query.
+
+        Returns:
+            A dict with the cached `query`, `similarity`, `chunk_ids`,
+            `is_relevant` and `summaries`, or None on a miss
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        with self._lock:
+            index = self._load_index()
+            match = None
+            if index["vectors"] is not None and index["vectors"].shape[1] == vector.shape[0]:
+                similarities = index["vectors"] @ vector
+                valid = index["config_keys"] == config_key
+                if self.ttl:
+                    valid &= index["created_at"] >= now - self.ttl
+                similarities = np.where(valid, similarities, -np.inf)
+                best = int(similarities.argmax())
+                if similarities[best] >= threshold:
+                    match = (int(index["ids"][best]), float(similarities[best]))
+
+            if match is None:
+                self._stats["misses"] += 1
+                return None
+
+            entry_id, similarity = match
+            query, chunk_ids, is_relevant, summaries = self._conn.execute(
+                "SELECT query, chunk_ids, is_relevant, summaries FROM entries WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE id = ?", (now, entry_id))
+            self._conn.commit()
+            # Our own write, the loaded matrix is still current
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._stats["hits"] += 1
+
+        return {
+            "query": query,
+            "similarity": similarity,
+            "chunk_ids": json.loads(chunk_ids),
+            "is_relevant": bool(is_relevant),
+            "summaries": json.loads(summaries),
+        }
+
+    def store(self, query, embedding, config_key, chunk_ids, is_relevant, summaries):
+        """Cache the outcome of a query search."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """INSERT INTO entries (query, config_key, embedding, chunk_ids, is_relevant, summaries, created_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (query, config_key, vector.tobytes(), json.dumps(list(chunk_ids)), int(is_relevant), json.dumps(summaries), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO chunk_refs (chunk_id, entry_id) VALUES (?, ?)",
+                [(chunk_id, cursor.lastrowid) for chunk_id in set(chunk_ids)]
+            )
+            self._evict(now)
+            self._conn.commit()
+            self._index = None
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones above the entry limit."""
+        expired = []
+        if self.ttl:
+            expired = [row[0] for row in self._conn.execute("SELECT id FROM entries WHERE created_at < ?", (now - self.ttl,))]
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - len(expired)
+        if self.max_entries and count > self.max_entries:
+            expired += [
+                row[0] for row in self._conn.execute(
+                    "SELECT id FROM entries WHERE created_at >= ? ORDER BY last_access LIMIT ?",
+                    (now - self.ttl if self.ttl else 0, count - self.max_entries)
+                )
+            ]
+        if expired:
+            self._delete_entries(expired)
+
+    def invalidate_chunks(self, chunk_ids, drop_irrelevant=False):
+        """
+        Drop the entries built from any of the given chunks.
+
+        Args:
+            chunk_ids: IDs of updated or deleted chunks
+            drop_irrelevant: Also drop entries whose documents were judged
+                irrelevant, new chunks may now answer them
+        """
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            entry_ids = set()
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                entry_ids.update(
+                    row[0] for row in self._conn.execute(
+                        f"SELECT entry_id FROM chunk_refs WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+            if drop_irrelevant:
+                entry_ids.update(row[0] for row in self._conn.execute("SELECT id FROM entries WHERE is_relevant = 0"))
+            if entry_ids:
+                self._delete_entries(entry_ids)
+                self._conn.commit()
+                self._stats["invalidations"] += len(entry_ids)
+
+    def stats(self):
+        """Return hit/miss/invalidation counters and hit rate since the process started."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+def query_cache_config_key(configurable, embedding_model, collection_name):
+    """
+    Key of the settings an entry was computed with.
+
+    The embedding model and the collection are part of it: entries found
+    with other query embeddings or in another collection are never reused.
+    """
+    settings = {key: configurable.get(key) for key in QUERY_CACHE_CONFIG_KEYS}
+    return cache_key("query", {**settings, "embedding_model": embedding_model, "collection_name": collection_name})
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache():
+    """
+    Get the query result cache, or None when it is disabled.
+
+    The cache is opt-in: set `QUERY_CACHE_PATH` to enable it. `QUERY_CACHE_TTL`
+    (seconds) and `QUERY_CACHE_MAX_ENTRIES` bound how long and how much is kept.
+    """
+    global _query_cache
+    path = os.environ.get("QUERY_CACHE_PATH")
+    if not path:
+        return None
+
+    with _query_cache_lock:
+        if _query_cache is None or _query_cache.path != path:
+            ttl = os.environ.get("QUERY_CACHE_TTL")
+            max_entries = os.environ.get("QUERY_CACHE_MAX_ENTRIES")
+            _query_cache = QueryResultCache(
+                path,
+                ttl=float(ttl) if ttl else DEFAULT_QUERY_CACHE_TTL,
+                max_entries=int(max_entries) if max_entries else DEFAULT_QUERY_CACHE_MAX_ENTRIES,
+            )
+        return _query_cache
@@ -0,0 +1,41 @@
+import numpy as np
+
+# Queries at least this similar to an earlier one are merged into it
+DEFAULT_QUERY_DEDUP_THRESHOLD = 0.9
+
+def dedupe_queries(queries, embeddings, threshold=DEFAULT_QUERY_DEDUP_THRESHOLD):
+    """
+    Merge near-duplicate queries, keeping the first query of every cluster.
+
+    Each query joins the cluster of the first kept query whose embedding has
+    a cosine similarity of at least `threshold` with its own, or starts a
+    new cluster.
+
+    Args:
+        queries: The generated queries
+        embeddings: One embedding per query
+        threshold: Cosine similarity above which two queries are duplicates
+
+    Returns:
+        The indices of the kept queries and a dict mapping every kept query
+        to the queries merged into it
+    """
+    if not queries:
+        return [], {}
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+
+    kept = []
+    merged = {}
+    for i, query in enumerate(queries):
+        if kept:
+            similarities = vectors[kept] @ vectors[i]
+            best = int(similarities.argmax())
+            if similarities[best] >= threshold:
+                merged[queries[kept[best]]].append(query)
+                continue
+        kept.append(i)
+        merged.setdefault(query, [])
+    return kept, merged
@@ -0,0 +1,110 @@
+from src.assistant.bm25 import tokenize
+from src.assistant.tokens import count_tokens
+
+# Gate thresholds on the cosine similarity between the query and its best
+# chunk. Scores in between are left to the LLM evaluator.
+DEFAULT_ACCEPT_THRESHOLD = 0.6
+DEFAULT_REJECT_THRESHOLD = 0.3
+
+# A clear miss must also share less than this fraction of the query terms
+DEFAULT_MIN_LEXICAL_OVERLAP = 0.3
+
+RELEVANT = "relevant"
+IRRELEVANT = "irrelevant"
+UNCERTAIN = "uncertain"
+
+def lexical_overlap(query, text):
+    """Fraction of the query terms found in the text."""
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+def gate_documents(
+    query,
+    documents,
+    similarities,
+    accept_threshold=DEFAULT_ACCEPT_THRESHOLD,
+    reject_threshold=DEFAULT_REJECT_THRESHOLD,
+    min_lexical_overlap=DEFAULT_MIN_LEXICAL_OVERLAP,
+):
+    """
+    Decide locally whether retrieved documents answer a query.
+
+    Args:
+        query: The search query
+        documents: The retrieved chunks
+        similarities: Cosine similarity of each chunk to the query, or None if unknown
+        accept_threshold: Best similarity at or above which the documents are relevant
+        reject_threshold: Best similarity at or below which the documents are irrelevant
+        min_lexical_overlap: Term overlap protecting a low-similarity chunk from rejection
+
+    Returns:
+        A dict with the `decision` (relevant, irrelevant or uncertain), the best
+        `similarity` and the best `lexical_overlap`
+    """
+    if not documents:
+        return {"decision": IRRELEVANT, "similarity": None, "lexical_overlap": 0.0}
+
+    overlap = max(lexical_overlap(query, doc.page_content) for doc in documents)
+    if not similarities:
+        return {"decision": UNCERTAIN, "similarity": None, "lexical_overlap": overlap}
+
+    similarity = max(similarities)
+    if similarity >= accept_threshold:
+        decision = RELEVANT
+    elif similarity <= reject_threshold and overlap < min_lexical_overlap:
+        decision = IRRELEVANT
+    else:
+        decision = UNCERTAIN
+    return {"decision": decision, "similarity": similarity, "lexical_overlap": overlap}
+
+# Chunks graded below this score are dropped before summarization
+DEFAULT_GRADE_THRESHOLD = 0.5
+
+# Maximum number of document tokens sent to the summarizer per query
+DEFAULT_CONTEXT_TOKEN_BUDGET = 3000
+
+def local_grades(similarities, accept_threshold=DEFAULT_ACCEPT_THRESHOLD, reject_threshold=DEFAULT_REJECT_THRESHOLD):
+    """
+    Grade chunks from their similarity to the query, without an LLM call.
+
+    Similarities are mapped linearly so that the reject threshold grades 0
+    and the accept threshold grades 1.
+    """
+    span = max(accept_threshold - reject_threshold, 1e-6)
+    return [min(max((similarity - reject_threshold) / span, 0.0), 1.0) for similarity in similarities]
+
+def prune_documents(documents, grades, threshold=DEFAULT_GRADE_THRESHOLD, token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET):
+    """
+    Keep the best graded chunks that fit in the token budget.
+
+    Args:
+        documents: The retrieved chunks
+        grades: Relevance grade of each chunk, between 0 and 1
+        threshold: Minimum grade of a kept chunk
+        token_budget: Maximum number of tokens of the kept chunks, the best
+            chunk is always kept if it passes the threshold
+
+    Returns:
+        The kept chunks, best first, and a report with the document and token counts
+    """
+    tokens = [count_tokens(doc.page_content) for doc in documents]
+    kept = []
+    kept_tokens = 0
+    for i in sorted(range(len(documents)), key=lambda i: grades[i], reverse=True):
+        if grades[i] < threshold:
+            break
+        if kept and kept_tokens + tokens[i] > token_budget:
+            continue
+        kept.append(documents[i])
+        kept_tokens += tokens[i]
+
+    report = {
+        "documents_total": len(documents),
+        "documents_kept": len(kept),
+        "tokens_total": sum(tokens),
+        "tokens_kept": kept_tokens,
+        "tokens_saved": sum(tokens) - kept_tokens,
+    }
+    return kept, report
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+DEFAULT_MAX_CONCURRENT_QUERIES = 3
+
+class QueryScheduler:
+    """
+    Bounded-concurrency gate for the query research branches.
+
+    All queries are fanned out at once and each branch waits for a free slot
+    before running, so N queries are in flight at any time and a new one starts
+    as soon as any finishes. The scheduler is shared by the whole process,
+    which keeps the number of concurrent provider calls under control even
+    when several research runs are active. Async branches use an
+    `asyncio.Semaphore` of the same size per event loop.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENT_QUERIES):
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # asyncio semaphores are bound to the event loop they are used in
+        self._async_slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "completed": 0,
+            "failed": 0,
+            "max_in_flight": 0,
+            "total_queue_time": 0.0,
+            "total_run_time": 0.0,
+        }
+
+    @contextmanager
+    def slot(self, query, queued_at=None):
+        """
+        Hold one concurrency slot while running a query.
+
+        Args:
+            query: The research query being run
+            queued_at: `time.time()` when the query was scheduled
+
+        Yields:
+            dict: Timing record for the query, completed when the block exits
+        """
+        self._slots.acquire()
+        try:
+            with self._track(query, queued_at) as record:
+                yield record
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def aslot(self, query, queued_at=None):
+        """Async version of `slot`, waiting for a slot without blocking a thread."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_slots:
+                self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+            slots = self._async_slots[loop]
+
+        async with slots:
+            with self._track(query, queued_at) as record:
+                yield record
+
+    @contextmanager
+    def _track(self, query, queued_at):
+        """Record queue and run time of a query holding a slot."""
+        queued_at = queued_at or time.time()
+        started_at = time.time()
+        record = {
+            "query": query,
+            "queue_time": max(started_at - queued_at, 0.0),
+            "run_time": None,
+        }
+        with self._lock:
+            self._in_flight += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+
+        failed = True
+        try:
+            yield record
+            failed = False
+        finally:
+            record["run_time"] = time.time() - started_at
+            with self._lock:
+                self._in_flight -= 1
+                self._stats["failed" if failed else "completed"] += 1
+                self._stats["total_queue_time"] += record["queue_time"]
+                self._stats["total_run_time"] += record["run_time"]
+
+    def stats(self):
+        """Return a snapshot of the scheduler counters."""
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                **self._stats,
+            }
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_query_scheduler(max_concurrency=DEFAULT_MAX_CONCURRENT_QUERIES):
+    """Get the process-wide scheduler for the given concurrency limit."""
+    max_concurrency = max(int(max_concurrency), 1)
+    with _schedulers_lock:
+        if max_concurrency not in _schedulers:
+            _schedulers[max_concurrency] = QueryScheduler(max_concurrency)
+        return _schedulers[max_concurrency]
@@ -5,8 +5,12 @@ from typing_extensions import TypedDict
 class ResearcherState(TypedDict):
     user_instructions: str
     research_queries: list[str]
+    query_documents: dict
+    query_embeddings: dict
     search_summaries: Annotated[list, operator.add]
-    current_position: int
+    query_timings: Annotated[list, operator.add]
+    synthesis_groups: list[dict]
+    condensed_summaries: Annotated[list, operator.add]
     final_answer: str
 
 class ResearcherStateInput(TypedDict):
@@ -17,14 +21,30 @@ class ResearcherStateOutput(TypedDict):
 
 class QuerySearchState(TypedDict):
     query: str
+    queued_at: float
     web_search_results: list
     retrieved_documents: list
+    relevance_scores: list[float]
+    document_grades: list[float]
+    relevant_documents: list
     are_documents_relevant: bool
     search_summaries: list[str]
 
 class QuerySearchStateInput(TypedDict):
     query: str
+    queued_at: float
+    query_embedding: list[float]
+    retrieved_documents: list
+    relevance_scores: list[float]
 
 class QuerySearchStateOutput(TypedDict):
     query: str
-    search_summaries: list[str]
\ No newline at end of file
+    retrieved_documents: list
+    are_documents_relevant: bool
+    search_summaries: list[str]
+
+class SectionCondenseState(TypedDict):
+    user_instructions: str
+    index: int
+    section: str
+    summaries: list[str]
@@ -0,0 +1,55 @@
+import re
+import numpy as np
+
+# Summaries above this many tokens in total are condensed per report
+# section before the final report is written
+DEFAULT_SYNTHESIS_THRESHOLD_TOKENS = 8000
+
+# Maximum number of summaries condensed together
+DEFAULT_SYNTHESIS_GROUP_SIZE = 5
+
+def report_sections(report_structure):
+    """
+    Split a markdown report structure into its top level sections.
+
+    Returns:
+        List of `(title, description)` tuples, in report order
+    """
+    sections = []
+    for match in re.finditer(r"^#\s+(.+?)\s*$(.*?)(?=^#\s|\Z)", report_structure, re.MULTILINE | re.DOTALL):
+        sections.append((match.group(1), match.group(2).strip()))
+    return sections
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def group_summaries(sections, summaries, section_embeddings, summary_embeddings, max_group_size=DEFAULT_SYNTHESIS_GROUP_SIZE):
+    """
+    Assign every summary to the report section it is closest to.
+
+    Args:
+        sections: List of `(title, description)` tuples
+        summaries: The query summaries
+        section_embeddings: One embedding per section
+        summary_embeddings: One embedding per summary
+        max_group_size: Groups with more summaries are split
+
+    Returns:
+        List of `{"section": title, "summaries": [...]}` groups, in report
+        order, without empty sections
+    """
+    if not sections:
+        assignments = [0] * len(summaries)
+        sections = [("Research findings", "")]
+    else:
+        similarities = _normalize(summary_embeddings) @ _normalize(section_embeddings).T
+        assignments = similarities.argmax(axis=1).tolist()
+
+    groups = []
+    for index, (title, _) in enumerate(sections):
+        members = [summary for summary, assignment in zip(summaries, assignments) if assignment == index]
+        for start in range(0, len(members), max_group_size):
+            groups.append({"section": title, "summaries": members[start:start + max_group_size]})
+    return groups
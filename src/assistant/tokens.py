@@ -0,0 +1,28 @@
+import functools
+
+# Encoding used by the OpenAI text-embedding-3 and GPT-4 model families
+DEFAULT_ENCODING = "cl100k_base"
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name=DEFAULT_ENCODING):
+    """Return the tiktoken encoding, or None when tiktoken or its encoding files are unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+def count_tokens(text, encoding=DEFAULT_ENCODING):
+    """
+    Count the tokens of a text.
+
+    Falls back to the usual ~4 characters per token estimate when the
+    tokenizer cannot be loaded, rounded up so that the counts of the parts
+    of a text never add up to less than the count of the whole.
+    """
+    if not text:
+        return 0
+    tokenizer = get_encoding(encoding)
+    if tokenizer is None:
+        return -(-len(text) // 4)
+    return len(tokenizer.encode(text, disallowed_special=()))
@@ -0,0 +1,222 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Query the current graph branch is researching, attached to every event
+current_query = contextvars.ContextVar("current_query", default=None)
+
+# Events of a running query branch are collected here and forwarded to the
+# stream by the parent node, subgraph stream output is not visible to callers
+_collector = contextvars.ContextVar("trace_collector", default=None)
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+def add_trace_sink(sink):
+    """Register a callable receiving every trace event (dict)."""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+def remove_trace_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+def write_to_stream(event):
+    """Send an event to the LangGraph `custom` stream, if running inside a graph."""
+    try:
+        from langgraph.config import get_stream_writer
+        get_stream_writer()(event)
+    except Exception:
+        # Called outside of a graph run
+        pass
+
+def emit(event):
+    """Publish a trace event to the sinks and the graph stream."""
+    event.setdefault("ts", time.time())
+    if "query" not in event and current_query.get() is not None:
+        event["query"] = current_query.get()
+
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(event)
+        except Exception as e:
+            print(f"Error in trace sink: {str(e)}")
+
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(event)
+    else:
+        write_to_stream(event)
+
+@contextmanager
+def collect_events():
+    """Collect the events emitted inside the block instead of streaming them."""
+    events = []
+    token = _collector.set(events)
+    try:
+        yield events
+    finally:
+        _collector.reset(token)
+
+@contextmanager
+def trace_call(kind, name, **attributes):
+    """
+    Trace a provider call (LLM, embedding, search, retrieval).
+
+    Yields a span dict the caller can enrich with `prompt_tokens`,
+    `completion_tokens`, `retries`, `cache_hit`... The span is emitted
+    with its wall time when the block exits.
+    """
+    span = {
+        "type": "call",
+        "kind": kind,
+        "name": name,
+        "retries": 0,
+        **attributes,
+    }
+    started_at = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span["error"] = type(e).__name__
+        raise
+    finally:
+        span["wall_time"] = time.perf_counter() - started_at
+        emit(span)
+
+def traced_node(func):
+    """Decorator emitting a `node` event with the wall time of a sync or async graph node."""
+    # Async twins are named after the sync node with an "a" prefix
+    name = func.__name__[1:] if inspect.iscoroutinefunction(func) else func.__name__
+
+    def _emit(started_at, error=None):
+        event = {"type": "node", "name": name, "wall_time": time.perf_counter() - started_at}
+        if error:
+            event["error"] = type(error).__name__
+        emit(event)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException as e:
+                _emit(started_at, e)
+                raise
+            _emit(started_at)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            _emit(started_at, e)
+            raise
+        _emit(started_at)
+        return result
+    return wrapper
+
+class JsonlExporter:
+    """Trace sink appending every event as one JSON line to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+class MetricsExporter:
+    """Trace sink aggregating events into counters rendered in the OpenMetrics text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _add(self, metric, labels, value):
+        key = (metric, tuple(sorted(labels.items())))
+        self._metrics[key] = self._metrics.get(key, 0) + value
+
+    def __call__(self, event):
+        with self._lock:
+            if event.get("type") == "node":
+                labels = {"node": event["name"]}
+                self._add("researcher_node_seconds_sum", labels, event["wall_time"])
+                self._add("researcher_node_seconds_count", labels, 1)
+            elif event.get("type") == "call":
+                labels = {"kind": event["kind"], "name": event["name"]}
+                self._add("researcher_call_seconds_sum", labels, event["wall_time"])
+                self._add("researcher_call_seconds_count", labels, 1)
+                self._add("researcher_call_retries_total", labels, event.get("retries", 0))
+                self._add("researcher_call_prompt_tokens_total", labels, event.get("prompt_tokens", 0))
+                self._add("researcher_call_completion_tokens_total", labels, event.get("completion_tokens", 0))
+                if event.get("error"):
+                    self._add("researcher_call_errors_total", labels, 1)
+                if "first_token_time" in event:
+                    self._add("researcher_call_first_token_seconds_sum", labels, event["first_token_time"])
+                    self._add("researcher_call_first_token_seconds_count", labels, 1)
+            elif event.get("type") == "query":
+                self._add("researcher_query_queue_seconds_sum", {}, event["queue_time"])
+                self._add("researcher_query_queue_seconds_count", {}, 1)
+                self._add("researcher_query_run_seconds_sum", {}, event["run_time"])
+                self._add("researcher_query_run_seconds_count", {}, 1)
+            elif event.get("type") == "gate":
+                self._add("researcher_gate_decisions_total", {"decision": event["decision"]}, 1)
+                self._add("researcher_gate_llm_calls_avoided_total", {}, int(event["llm_call_avoided"]))
+            elif event.get("type") == "query_cache":
+                self._add("researcher_query_cache_lookups_total", {"result": "hit" if event["hit"] else "miss"}, 1)
+            elif event.get("type") == "dedup":
+                self._add("researcher_queries_generated_total", {}, event["queries_total"])
+                self._add("researcher_subgraph_runs_saved_total", {}, event["subgraph_runs_saved"])
+            elif event.get("type") == "prompt":
+                labels = {"prompt": event["name"]}
+                self._add("researcher_prompt_tokens_sum", labels, event["prompt_tokens"])
+                self._add("researcher_prompt_tokens_count", labels, 1)
+                self._add("researcher_context_duplicates_removed_total", labels, event["duplicates_removed"])
+                self._add("researcher_context_truncated_total", labels, event["truncated"])
+            elif event.get("type") == "prune":
+                self._add("researcher_prune_documents_dropped_total", {}, event["documents_total"] - event["documents_kept"])
+                self._add("researcher_prune_tokens_saved_total", {}, event["tokens_saved"])
+
+    def render(self):
+        """Return the aggregated metrics in the OpenMetrics text exposition format."""
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        lines = []
+        families = {}
+        for (metric, labels), value in sorted(metrics.items()):
+            family = metric.rsplit("_", 1)[0] if metric.endswith(("_sum", "_count", "_total")) else metric
+            if family not in families:
+                families[family] = "summary" if metric.endswith(("_sum", "_count")) else "counter"
+                lines.append(f"# TYPE {family} {families[family]}")
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+# Process-wide metrics, always collected
+METRICS = MetricsExporter()
+add_trace_sink(METRICS)
+
+# Optionally write every event to a JSON lines file
+if os.environ.get("TRACE_JSONL_PATH"):
+    add_trace_sink(JsonlExporter(os.environ["TRACE_JSONL_PATH"]))
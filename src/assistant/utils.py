@@ -1,27 +1,144 @@
+import asyncio
 import os
-import re
 import shutil
-from ollama import chat
-from tavily import TavilyClient
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from tavily import TavilyClient, AsyncTavilyClient
 from pydantic import BaseModel
-from langchain_community.document_loaders import CSVLoader, TextLoader, PDFPlumberLoader
-from src.assistant.vector_db import add_documents
+from src.assistant.bm25 import BM25Index
+from src.assistant.cache import cache_key, get_llm_cache, get_web_cache, llm_cache_key
+from src.assistant.governor import get_governor
+from src.assistant.vector_db import get_embedding_backend, warm_up_embeddings
+from src.assistant.ingestion import ingest_file
+from src.assistant.llm_clients import aclose_async_llm_clients, get_chat_model, get_async_chat_model, get_ollama_client, get_async_ollama_client, get_ollama_keep_alive, warm_up_ollama
+from src.assistant.tracing import trace_call
 
-class Evaluation(BaseModel):
-    is_relevant: bool
+DEEPSEEK_MODEL = "deepseek-chat"
+
+# Generation backends: "deepseek" through the API, or "ollama" with a local model
+DEFAULT_LLM_BACKEND = "deepseek"
+DEFAULT_OLLAMA_MODEL = "deepseek-r1:7b"
+
+# Pages fetched at the same time for one web search, overridable with WEB_FETCH_CONCURRENCY
+DEFAULT_WEB_FETCH_CONCURRENCY = 5
+
+def _web_fetch_concurrency():
+    return int(os.environ.get("WEB_FETCH_CONCURRENCY", DEFAULT_WEB_FETCH_CONCURRENCY))
+
+
+class DocumentGrades(BaseModel):
+    scores: list[float]
 
 class Queries(BaseModel):
     queries: list[str]
 
+class ThinkTagParser:
+    """
+    Incremental parser splitting streamed reasoning model output on `<think>` tags.
+
+    Answer text is forwarded to `on_answer` as soon as it can no longer be
+    part of a tag, reasoning text goes to `on_reasoning` or is dropped. Only
+    the answer is kept, and the reasoning too if `keep_reasoning` is set, so
+    long reasoning traces are never buffered.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self, on_answer=None, on_reasoning=None, keep_reasoning=False):
+        self.on_answer = on_answer
+        self.on_reasoning = on_reasoning
+        self.keep_reasoning = keep_reasoning
+        self.in_reasoning = False
+        self._pending = ""
+        self._answer = []
+        self._reasoning = []
+
+    @property
+    def answer(self):
+        return "".join(self._answer).strip()
+
+    @property
+    def reasoning(self):
+        return "".join(self._reasoning).strip()
+
+    def _emit(self, text):
+        if not text:
+            return
+        if self.in_reasoning:
+            if self.keep_reasoning:
+                self._reasoning.append(text)
+            if self.on_reasoning:
+                self.on_reasoning(text)
+            return
+        # The answer starts at its first non-whitespace character
+        if not self._answer:
+            text = text.lstrip()
+            if not text:
+                return
+        self._answer.append(text)
+        if self.on_answer:
+            self.on_answer(text)
+
+    def feed(self, text):
+        """Consume the next chunk of the stream."""
+        self._pending += text
+        while True:
+            tag = self.CLOSE_TAG if self.in_reasoning else self.OPEN_TAG
+            position = self._pending.find(tag)
+            if position < 0:
+                break
+            self._emit(self._pending[:position])
+            self._pending = self._pending[position + len(tag):]
+            self.in_reasoning = not self.in_reasoning
+
+        # Hold back a trailing partial tag until the next chunk completes or breaks it
+        held = next(
+            (size for size in range(min(len(tag) - 1, len(self._pending)), 0, -1)
+             if self._pending.endswith(tag[:size])),
+            0
+        )
+        self._emit(self._pending[:len(self._pending) - held])
+        self._pending = self._pending[len(self._pending) - held:]
+
+    def close(self):
+        """Flush the end of the stream, returning the answer."""
+        self._emit(self._pending)
+        self._pending = ""
+        return self.answer
+
 def parse_output(text):
-    think = re.search(r'<think>(.*?)</think>', text, re.DOTALL).group(1).strip()
-    output = re.search(r'</think>\s*(.*?)$', text, re.DOTALL).group(1).strip()
+    """Split a finished reasoning model completion into its reasoning and its response."""
+    # Some chat templates open the reasoning block in the prompt, so the
+    # completion only holds the closing tag
+    if ThinkTagParser.CLOSE_TAG in text and ThinkTagParser.OPEN_TAG not in text:
+        text = ThinkTagParser.OPEN_TAG + text
+    parser = ThinkTagParser(keep_reasoning=True)
+    parser.feed(text)
+    parser.close()
 
     return {
-        "reasoning": think,
-        "response": output
+        "reasoning": parser.reasoning,
+        "response": parser.answer
     }
 
+def format_numbered_documents(documents):
+    """
+    Convert a list of Documents into a numbered, formatted string including metadata.
+
+    Args:
+        documents: List of Document objects
+
+    Returns:
+        String with one "[Document N]" block per document
+    """
+    return "\n\n---\n\n".join(
+        f"[Document {i}]\n{format_documents_with_metadata([doc])}" for i, doc in enumerate(documents, start=1)
+    )
+
 def format_documents_with_metadata(documents):
     """
     Convert a list of Documents into a formatted string including metadata.
@@ -40,22 +157,98 @@ def format_documents_with_metadata(documents):
 
     return "\n\n---\n\n".join(formatted_docs)
 
+def _get_cached_response(key, output_format=None):
+    """Return the cached LLM response for `key`, or None on a miss or when caching is disabled."""
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    return output_format.model_validate(cached) if output_format else cached
+
+def _set_cached_response(key, response, started_at, output_format=None):
+    cache = get_llm_cache()
+    if cache is None:
+        return
+    value = response.model_dump() if output_format else response
+    cache.set(key, value, cost=time.perf_counter() - started_at)
+
+def _record_ollama_usage(span, response):
+    span["prompt_tokens"] = response.prompt_eval_count or 0
+    span["completion_tokens"] = response.eval_count or 0
+
 def invoke_ollama(model, system_prompt, user_prompt, output_format=None):
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    response = chat(
-        messages=messages,
-        model=model,
-        format=output_format.model_json_schema() if output_format else None
-    )
+    with trace_call("llm", f"ollama/{model}") as span:
+        key = llm_cache_key("ollama", model, system_prompt, user_prompt, output_format)
+        cached = _get_cached_response(key, output_format)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+
+        started_at = time.perf_counter()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        response = get_governor("ollama").call(lambda: get_ollama_client().chat(
+            messages=messages,
+            model=model,
+            format=output_format.model_json_schema() if output_format else None,
+            keep_alive=get_ollama_keep_alive()
+        ), span)
+        _record_ollama_usage(span, response)
+
+        if output_format:
+            result = output_format.model_validate_json(response.message.content)
+        else:
+            result = response.message.content
+        _set_cached_response(key, result, started_at, output_format)
+        return result
+
+async def ainvoke_ollama(model, system_prompt, user_prompt, output_format=None):
+    """Async version of `invoke_ollama` using the shared Ollama `AsyncClient`."""
+    with trace_call("llm", f"ollama/{model}") as span:
+        key = llm_cache_key("ollama", model, system_prompt, user_prompt, output_format)
+        cached = _get_cached_response(key, output_format)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+
+        started_at = time.perf_counter()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        response = await get_governor("ollama").acall(lambda: get_async_ollama_client().chat(
+            messages=messages,
+            model=model,
+            format=output_format.model_json_schema() if output_format else None,
+            keep_alive=get_ollama_keep_alive()
+        ), span)
+        _record_ollama_usage(span, response)
+
+        if output_format:
+            result = output_format.model_validate_json(response.message.content)
+        else:
+            result = response.message.content
+        _set_cached_response(key, result, started_at, output_format)
+        return result
+
+def _parse_llm_response(span, response, output_format=None):
+    """Record token usage on the trace span and extract the result from the LLM response."""
+    # Structured output is requested with `include_raw=True` to keep the usage metadata
+    message = response["raw"] if output_format else response
+    usage = getattr(message, "usage_metadata", None) or {}
+    span["prompt_tokens"] = usage.get("input_tokens", 0)
+    span["completion_tokens"] = usage.get("output_tokens", 0)
 
     if output_format:
-        return output_format.model_validate_json(response.message.content)
-    else:
-        return response.message.content
-    
+        if response.get("parsing_error"):
+            raise response["parsing_error"]
+        return response["parsed"]
+    return response.content # str response
+
 def invoke_llm(
     #model,  # Specify the model name from OpenRouter
     system_prompt,
@@ -71,35 +264,449 @@ def invoke_llm(
     #     #openai_api_key=os.getenv("OPENAI_API_KEY"),
     #     #openai_api_base= "https://openrouter.ai/api/v1",
     # )
-    
-    from langchain_deepseek import ChatDeepSeek
-    llm = ChatDeepSeek(
-        model="deepseek-chat",
-        temperature=temperature,
-    
+
+    with trace_call("llm", DEEPSEEK_MODEL) as span:
+        # Responses are served from the on-disk cache when enabled (LLM_CACHE_PATH)
+        key = llm_cache_key("deepseek", DEEPSEEK_MODEL, system_prompt, user_prompt, output_format, temperature)
+        cached = _get_cached_response(key, output_format)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+
+        started_at = time.perf_counter()
+        # Pooled client from the registry, structured output is set up
+        # there when a response format is provided
+        llm = get_chat_model("deepseek", DEEPSEEK_MODEL, temperature, output_format)
+
+        # Invoke LLM
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        # Rate limited and retried by the provider's governor
+        response = get_governor("deepseek").call(lambda: llm.invoke(messages), span)
+
+        result = _parse_llm_response(span, response, output_format)
+        _set_cached_response(key, result, started_at, output_format)
+        return result
+
+async def ainvoke_llm(
+    system_prompt,
+    user_prompt,
+    output_format=None,
+    temperature=0
+):
+    """Async version of `invoke_llm`, awaiting the provider call with `ainvoke`."""
+    with trace_call("llm", DEEPSEEK_MODEL) as span:
+        key = llm_cache_key("deepseek", DEEPSEEK_MODEL, system_prompt, user_prompt, output_format, temperature)
+        cached = _get_cached_response(key, output_format)
+        if cached is not None:
+            span["cache_hit"] = True
+            return cached
+
+        started_at = time.perf_counter()
+        llm = get_async_chat_model("deepseek", DEEPSEEK_MODEL, temperature, output_format)
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        response = await get_governor("deepseek").acall(lambda: llm.ainvoke(messages), span)
+
+        result = _parse_llm_response(span, response, output_format)
+        _set_cached_response(key, result, started_at, output_format)
+        return result
+
+def _record_first_token(span, started_at):
+    if "first_token_time" not in span:
+        span["first_token_time"] = time.perf_counter() - started_at
+
+def _stream_not_started(span):
+    # A stream can't be retried once tokens were forwarded to the caller
+    return lambda: "first_token_time" not in span
+
+def stream_llm(
+    system_prompt,
+    user_prompt,
+    on_token,
+    temperature=0
+):
+    """
+    Stream a free-text completion, calling `on_token` with each text chunk as it arrives.
+
+    Args:
+        system_prompt: The system prompt
+        user_prompt: The user prompt
+        on_token: Callable receiving every text chunk
+        temperature: Sampling temperature
+
+    Returns:
+        The full response text
+    """
+    with trace_call("llm", DEEPSEEK_MODEL, streaming=True) as span:
+        key = llm_cache_key("deepseek", DEEPSEEK_MODEL, system_prompt, user_prompt, None, temperature)
+        cached = _get_cached_response(key)
+        if cached is not None:
+            span["cache_hit"] = True
+            on_token(cached)
+            return cached
+
+        started_at = time.perf_counter()
+        llm = get_chat_model("deepseek", DEEPSEEK_MODEL, temperature)
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        # Chunks are summed into the full message, usage metadata included
+        def consume():
+            response = None
+            for chunk in llm.stream(messages, stream_usage=True):
+                response = chunk if response is None else response + chunk
+                if chunk.content:
+                    _record_first_token(span, started_at)
+                    on_token(chunk.content)
+            return response
+
+        # Retried only until the first token was forwarded, never hedged
+        response = get_governor("deepseek").call(consume, span, hedge=False, can_retry=_stream_not_started(span))
+
+        result = _parse_llm_response(span, response) if response is not None else ""
+        _set_cached_response(key, result, started_at)
+        return result
+
+async def astream_llm(
+    system_prompt,
+    user_prompt,
+    on_token,
+    temperature=0
+):
+    """Async version of `stream_llm`, consuming the provider stream with `astream`."""
+    with trace_call("llm", DEEPSEEK_MODEL, streaming=True) as span:
+        key = llm_cache_key("deepseek", DEEPSEEK_MODEL, system_prompt, user_prompt, None, temperature)
+        cached = _get_cached_response(key)
+        if cached is not None:
+            span["cache_hit"] = True
+            on_token(cached)
+            return cached
+
+        started_at = time.perf_counter()
+        llm = get_async_chat_model("deepseek", DEEPSEEK_MODEL, temperature)
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        async def consume():
+            response = None
+            async for chunk in llm.astream(messages, stream_usage=True):
+                response = chunk if response is None else response + chunk
+                if chunk.content:
+                    _record_first_token(span, started_at)
+                    on_token(chunk.content)
+            return response
+
+        response = await get_governor("deepseek").acall(consume, span, hedge=False, can_retry=_stream_not_started(span))
+
+        result = _parse_llm_response(span, response) if response is not None else ""
+        _set_cached_response(key, result, started_at)
+        return result
+
+def _answer_callback(span, started_at, on_token):
+    # Time to the first answer token, the reasoning is not shown
+    def on_answer(text):
+        _record_first_token(span, started_at)
+        on_token(text)
+    return on_answer
+
+def stream_ollama(model, system_prompt, user_prompt, on_token, on_reasoning=None):
+    """
+    Streaming version of `invoke_ollama`, calling `on_token` with each answer chunk as it arrives.
+
+    The reasoning of R1 models (between `<think>` tags) is split from the
+    answer while streaming: it goes to `on_reasoning` if given, and is left
+    out of the returned and cached text.
+    """
+    with trace_call("llm", f"ollama/{model}", streaming=True) as span:
+        key = llm_cache_key("ollama", model, system_prompt, user_prompt)
+        cached = _get_cached_response(key)
+        if cached is not None:
+            span["cache_hit"] = True
+            on_token(cached)
+            return cached
+
+        started_at = time.perf_counter()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        def consume():
+            parser = ThinkTagParser(on_answer=_answer_callback(span, started_at, on_token), on_reasoning=on_reasoning)
+            for chunk in get_ollama_client().chat(messages=messages, model=model, stream=True, keep_alive=get_ollama_keep_alive()):
+                if chunk.message.content:
+                    parser.feed(chunk.message.content)
+                if chunk.done:
+                    # Token counts come with the last chunk
+                    _record_ollama_usage(span, chunk)
+            return parser.close()
+
+        result = get_governor("ollama").call(consume, span, hedge=False, can_retry=_stream_not_started(span))
+        _set_cached_response(key, result, started_at)
+        return result
+
+async def astream_ollama(model, system_prompt, user_prompt, on_token, on_reasoning=None):
+    """Async version of `stream_ollama`."""
+    with trace_call("llm", f"ollama/{model}", streaming=True) as span:
+        key = llm_cache_key("ollama", model, system_prompt, user_prompt)
+        cached = _get_cached_response(key)
+        if cached is not None:
+            span["cache_hit"] = True
+            on_token(cached)
+            return cached
+
+        started_at = time.perf_counter()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        async def consume():
+            parser = ThinkTagParser(on_answer=_answer_callback(span, started_at, on_token), on_reasoning=on_reasoning)
+            stream = await get_async_ollama_client().chat(messages=messages, model=model, stream=True, keep_alive=get_ollama_keep_alive())
+            async for chunk in stream:
+                if chunk.message.content:
+                    parser.feed(chunk.message.content)
+                if chunk.done:
+                    _record_ollama_usage(span, chunk)
+            return parser.close()
+
+        result = await get_governor("ollama").acall(consume, span, hedge=False, can_retry=_stream_not_started(span))
+        _set_cached_response(key, result, started_at)
+        return result
+
+def warm_up_models(configurable):
+    """
+    Load the local models of a run configuration before the first request.
+
+    Local embeddings are loaded and run once, the Ollama model is loaded and
+    kept in memory for `OLLAMA_KEEP_ALIVE`. API backends need no warm-up.
+    """
+    if get_embedding_backend() == "local":
+        print("--- Warming up the embedding model ---")
+        warm_up_embeddings()
+    if configurable.get("llm_backend", DEFAULT_LLM_BACKEND) == "ollama":
+        model = configurable.get("ollama_model", DEFAULT_OLLAMA_MODEL)
+        print(f"--- Warming up {model} ---")
+        warm_up_ollama(model)
+
+def normalize_query(query):
+    """Case and whitespace insensitive form of a search query."""
+    return " ".join(query.lower().split())
+
+def normalize_url(url):
+    """Canonical form of a URL: lowercase host, no fragment, no tracking parameters, sorted query."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_")
     )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
 
-    # If Response format is provided use structured output
-    if output_format:
-        llm = llm.with_structured_output(output_format)
-    
-    # Invoke LLM
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    response = llm.invoke(messages)
-    
-    if output_format:
-        return response
-    return response.content # str response
+_tavily_client = None
+_tavily_lock = threading.Lock()
+_async_tavily_clients = weakref.WeakKeyDictionary()
+
+def get_tavily_client():
+    """Shared Tavily client, created on first use."""
+    global _tavily_client
+    with _tavily_lock:
+        if _tavily_client is None:
+            _tavily_client = TavilyClient()
+        return _tavily_client
+
+def get_async_tavily_client():
+    """Shared `AsyncTavilyClient` for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _tavily_lock:
+        if loop not in _async_tavily_clients:
+            _async_tavily_clients[loop] = AsyncTavilyClient()
+        return _async_tavily_clients[loop]
+
+async def aclose_async_clients():
+    """
+    Close the async provider clients (LLM, Ollama, Tavily) of the running event loop.
+
+    Await it before a loop started with `asyncio.run` ends, the next loop
+    opens its own clients.
+    """
+    await aclose_async_llm_clients()
+    with _tavily_lock:
+        client = _async_tavily_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+def run_until_complete(coroutine):
+    """Run a coroutine on a new event loop (`asyncio.run`), closing the provider clients it opened."""
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await aclose_async_clients()
+    return asyncio.run(run())
+
+class TavilyBackend:
+    """Web search through the Tavily search and extract APIs."""
+
+    name = "tavily"
+
+    def search(self, query, max_results, include_raw_content=False):
+        response = get_governor("tavily").call(
+            lambda: get_tavily_client().search(query, max_results=max_results, include_raw_content=include_raw_content)
+        )
+        return response["results"]
+
+    async def asearch(self, query, max_results, include_raw_content=False):
+        response = await get_governor("tavily").acall(
+            lambda: get_async_tavily_client().search(query, max_results=max_results, include_raw_content=include_raw_content)
+        )
+        return response["results"]
+
+    def extract(self, url):
+        results = get_governor("tavily").call(lambda: get_tavily_client().extract(urls=[url]))["results"]
+        return results[0]["raw_content"] if results else None
+
+    async def aextract(self, url):
+        results = (await get_governor("tavily").acall(lambda: get_async_tavily_client().extract(urls=[url])))["results"]
+        return results[0]["raw_content"] if results else None
 
-def tavily_search(query, include_raw_content=True, max_results=3):
-    """ Search the web using the Tavily API.
+class LocalSearchBackend:
+    """
+    Offline stand-in for web search over the .txt and .md files of a directory.
+
+    Files are ranked with BM25 and returned as `file://` results, so the web
+    research path can run in tests without network access or API keys.
+    """
+
+    name = "local"
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.index = BM25Index(":memory:")
+        paths = [
+            os.path.join(root, filename)
+            for root, _, filenames in os.walk(self.directory)
+            for filename in sorted(filenames)
+            if filename.endswith((".txt", ".md"))
+        ]
+        texts = [self._read(path) for path in paths]
+        self.index.add([f"file://{path}" for path in paths], texts, [{"title": os.path.basename(path)} for path in paths])
+
+    @staticmethod
+    def _read(path):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+
+    def search(self, query, max_results, include_raw_content=False):
+        results = []
+        for doc, score in self.index.search(query, k=max_results):
+            result = {"title": doc.metadata["title"], "url": doc.id, "content": doc.page_content[:500], "score": score}
+            if include_raw_content:
+                result["raw_content"] = doc.page_content
+            results.append(result)
+        return results
+
+    async def asearch(self, query, max_results, include_raw_content=False):
+        return await asyncio.to_thread(self.search, query, max_results, include_raw_content)
+
+    def extract(self, url):
+        path = urlsplit(url).path
+        return self._read(path) if os.path.isfile(path) else None
+
+    async def aextract(self, url):
+        return await asyncio.to_thread(self.extract, url)
+
+_web_search_backend = None
+
+def set_web_search_backend(backend):
+    """Use `backend` for every web search, None restores the configured one."""
+    global _web_search_backend
+    _web_search_backend = backend
+
+def get_web_search_backend():
+    """
+    Get the web search backend.
+
+    `WEB_SEARCH_BACKEND` selects "tavily" (default) or "local", the latter
+    searching the files under `WEB_SEARCH_LOCAL_PATH` (./files by default).
+    """
+    global _web_search_backend
+    with _tavily_lock:
+        if _web_search_backend is None:
+            if os.environ.get("WEB_SEARCH_BACKEND", "tavily") == "local":
+                _web_search_backend = LocalSearchBackend(os.environ.get("WEB_SEARCH_LOCAL_PATH", "./files"))
+            else:
+                _web_search_backend = TavilyBackend()
+        return _web_search_backend
+
+def _cached_search(cache, backend, query, max_results, span):
+    key = cache_key("web_search", backend.name, normalize_query(query), max_results)
+    results = cache.get(key) if cache is not None else None
+    span["cache_hit"] = results is not None
+    return key, results
+
+def _page_key(url):
+    return cache_key("web_page", normalize_url(url))
+
+def _cache_search(cache, key, results, cost):
+    """Cache a search response, its page contents apart, keyed by URL."""
+    if cache is None:
+        return
+    for result in results:
+        if result.get("raw_content"):
+            cache.set(_page_key(result["url"]), result["raw_content"], cost)
+    cache.set(key, [{name: value for name, value in result.items() if name != "raw_content"} for result in results], cost)
+
+def _missing_pages(cache, results):
+    """Fill `raw_content` from the page cache, returning the results still to fetch."""
+    missing = []
+    for result in results:
+        if result.get("raw_content"):
+            continue
+        raw_content = cache.get(_page_key(result["url"])) if cache is not None else None
+        if raw_content is None:
+            missing.append(result)
+        else:
+            result["raw_content"] = raw_content
+    return missing
+
+def _store_page(cache, result, raw_content, started_at, span):
+    """
+    Set `raw_content` of a fetched page and cache it.
+
+    A page that could not be fetched keeps no `raw_content`, its result
+    snippet is used instead.
+    """
+    if raw_content is None:
+        span["pages_failed"] = span.get("pages_failed", 0) + 1
+        return
+    result["raw_content"] = raw_content
+    if cache is not None:
+        cache.set(_page_key(result["url"]), raw_content, time.perf_counter() - started_at)
+
+def _fetch_failed(url, error):
+    print(f"Failed to fetch {url}, using its snippet: {error}")
+
+def web_search(query, include_raw_content=True, max_results=3):
+    """ Search the web, with cached responses and concurrently fetched pages.
+
+    Page contents come with the search response. Search responses and
+    pages are cached on disk (WEB_CACHE_PATH), keyed by normalized query
+    and URL, for WEB_CACHE_TTL seconds. Pages still missing (not returned
+    by the search, or expired from the cache) are fetched concurrently.
 
     Args:
         query (str): The search query to execute
-        include_raw_content (bool): Whether to include the raw_content from Tavily in the formatted string
+        include_raw_content (bool): Whether to include the raw_content of every result page
         max_results (int): Maximum number of results to return
 
     Returns:
@@ -110,12 +717,60 @@ def tavily_search(query, include_raw_content=True, max_results=3):
                 - content (str): Snippet/summary of the content
                 - raw_content (str): Full content of the page if available"""
 
-    tavily_client = TavilyClient()
-    return tavily_client.search(
-        query,
-        max_results=max_results,
-        include_raw_content=include_raw_content
-    )
+    backend = get_web_search_backend()
+    cache = get_web_cache()
+    with trace_call("search", backend.name) as span:
+        key, results = _cached_search(cache, backend, query, max_results, span)
+        if results is None:
+            started_at = time.perf_counter()
+            results = backend.search(query, max_results, include_raw_content)
+            _cache_search(cache, key, results, time.perf_counter() - started_at)
+
+        if include_raw_content:
+            missing = _missing_pages(cache, results)
+            span["pages_fetched"] = len(missing)
+            if missing:
+                # A failed fetch leaves its page out instead of failing the search
+                def fetch(result):
+                    started_at = time.perf_counter()
+                    try:
+                        raw_content = backend.extract(result["url"])
+                    except Exception as e:
+                        _fetch_failed(result["url"], e)
+                        raw_content = None
+                    _store_page(cache, result, raw_content, started_at, span)
+                with ThreadPoolExecutor(max_workers=min(len(missing), _web_fetch_concurrency())) as executor:
+                    list(executor.map(fetch, missing))
+
+        return {"query": query, "results": results}
+
+async def aweb_search(query, include_raw_content=True, max_results=3):
+    """Async version of `web_search`, fetching the missing pages with `asyncio.gather`."""
+    backend = get_web_search_backend()
+    cache = get_web_cache()
+    with trace_call("search", backend.name) as span:
+        key, results = await asyncio.to_thread(_cached_search, cache, backend, query, max_results, span)
+        if results is None:
+            started_at = time.perf_counter()
+            results = await backend.asearch(query, max_results, include_raw_content)
+            await asyncio.to_thread(_cache_search, cache, key, results, time.perf_counter() - started_at)
+
+        if include_raw_content:
+            missing = await asyncio.to_thread(_missing_pages, cache, results)
+            span["pages_fetched"] = len(missing)
+            semaphore = asyncio.Semaphore(_web_fetch_concurrency())
+            async def fetch(result):
+                async with semaphore:
+                    started_at = time.perf_counter()
+                    try:
+                        raw_content = await backend.aextract(result["url"])
+                    except Exception as e:
+                        _fetch_failed(result["url"], e)
+                        raw_content = None
+                await asyncio.to_thread(_store_page, cache, result, raw_content, started_at, span)
+            await asyncio.gather(*(fetch(result) for result in missing))
+
+        return {"query": query, "results": results}
 
 def get_report_structures(reports_folder="report_structures"):
     """
@@ -155,28 +810,18 @@ def process_uploaded_files(uploaded_files):
 
     try:
         for uploaded_file in uploaded_files:
-            file_extension = uploaded_file.name.split(".")[-1].lower()
             temp_file_path = os.path.join(temp_folder, uploaded_file.name)
 
             # Save file temporarily
             with open(temp_file_path, "wb") as f:
                 f.write(uploaded_file.getvalue())
 
-            # Choose the appropriate loader
-            if file_extension == "csv":
-                loader = CSVLoader(temp_file_path)
-            elif file_extension in ["txt", "md"]:
-                loader = TextLoader(temp_file_path)
-            elif file_extension == "pdf":
-                loader = PDFPlumberLoader(temp_file_path)
-            else:
-                continue
-
-            # Load and append documents
-            docs = loader.load()
-            add_documents(docs)
+            # Ingest the file, the manifest skips files already ingested with
+            # the same content and replaces the chunks of re-uploaded files
+            status = ingest_file(temp_file_path, source=f"uploads/{uploaded_file.name}")
+            print(f"--- {uploaded_file.name}: {status} ---")
 
         return True
     finally:
         # Remove the temp folder and its contents
-        shutil.rmtree(temp_folder, ignore_errors=True)
\ No newline at end of file
+        shutil.rmtree(temp_folder, ignore_errors=True)
@@ -1,46 +1,324 @@
+import asyncio
 import os
-from langchain_community.document_loaders import DirectoryLoader
-from langchain_experimental.text_splitter import SemanticChunker 
+import re
+import threading
+import time
+import uuid
+import numpy as np
+from langchain_experimental.text_splitter import SemanticChunker
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-#from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
+from chromadb.api.shared_system_client import SharedSystemClient
+from langchain_core.documents import Document
+from src.assistant.bm25 import BM25Index
+from src.assistant.embedding_cache import CachedEmbeddings, abatch_embed_queries, batch_embed_queries
+from src.assistant.governor import GovernedEmbeddings, get_governor
+from src.assistant.query_cache import get_query_cache
 
 VECTOR_DB_PATH = "database"
- 
-def get_or_create_vector_db():
-    """Get or create the vector DB."""
-    #embeddings = HuggingFaceEmbeddings()
+FILES_PATH = "./files"
+
+# Chunking parameters, recorded in the ingestion manifest
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 400
+
+# Lexical index kept next to the Chroma collection
+BM25_INDEX_FILE = "bm25_index.sqlite3"
+
+# Hybrid retrieval defaults: chunks returned, candidates fetched per
+# retriever and the reciprocal rank fusion constant
+DEFAULT_RETRIEVAL_K = 3
+DEFAULT_FETCH_K = 20
+DEFAULT_RRF_K = 60
+
+# Embeddings backend: "openai" (default) or "local" for sentence-transformers
+# on CPU, selected with EMBEDDING_BACKEND. Local models are loaded from
+# EMBEDDING_MODEL and encode EMBEDDING_BATCH_SIZE texts at a time.
+DEFAULT_EMBEDDING_BACKEND = "openai"
+DEFAULT_OPENAI_EMBEDDING_MODEL = "text-embedding-3-large"
+DEFAULT_LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_LOCAL_EMBEDDING_BATCH_SIZE = 32
+
+# Collection of the OpenAI embeddings, the langchain_chroma default
+DEFAULT_COLLECTION_NAME = "langchain"
+
+# Persistent embedding cache, set EMBEDDING_CACHE_PATH="" to disable it
+DEFAULT_EMBEDDING_CACHE_PATH = ".cache/embeddings"
+DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES = 500_000
+
+# Process-wide handles, opened once and shared by the graph, ingestion and scripts.
+# Chroma and the embeddings client are both safe to share across threads.
+_lock = threading.RLock()
+_embeddings = None
+_vectorstore = None
+_vectorstore_signature = None
+_bm25_index = None
+
+# Counters for the shared vector store handle
+VECTOR_DB_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "reloads": 0,
+    "open_time": 0.0,
+}
+
+def get_embedding_backend():
+    return os.environ.get("EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND)
+
+def get_embedding_model():
+    """Identifier of the configured embedding model."""
+    if get_embedding_backend() == "local":
+        return os.environ.get("EMBEDDING_MODEL", DEFAULT_LOCAL_EMBEDDING_MODEL)
+    return DEFAULT_OPENAI_EMBEDDING_MODEL
+
+def get_collection_name():
+    """
+    Name of the Chroma collection of the configured embeddings.
+
+    Vectors of different models can't be compared, so every local model
+    gets its own collection next to the OpenAI one.
+    """
+    if get_embedding_backend() == "local":
+        return "local_" + re.sub(r"[^A-Za-z0-9]+", "_", get_embedding_model()).strip("_")
+    return DEFAULT_COLLECTION_NAME
+
+def get_collection_file(filename):
+    """Path of a file kept alongside the collection (lexical index, manifest)."""
+    collection_name = get_collection_name()
+    if collection_name != DEFAULT_COLLECTION_NAME:
+        filename = f"{collection_name}.{filename}"
+    return os.path.join(VECTOR_DB_PATH, filename)
+
+def _build_embeddings():
+    backend = get_embedding_backend()
+    if backend == "local":
+        # Sentence-transformers model on CPU, no network calls once downloaded.
+        # Set EMBEDDING_ONNX=1 to run it with the ONNX runtime.
+        from langchain_huggingface import HuggingFaceEmbeddings
+        model_kwargs = {"device": os.environ.get("EMBEDDING_DEVICE", "cpu")}
+        if os.environ.get("EMBEDDING_ONNX"):
+            model_kwargs["backend"] = "onnx"
+        return HuggingFaceEmbeddings(
+            model_name=get_embedding_model(),
+            model_kwargs=model_kwargs,
+            encode_kwargs={
+                "batch_size": int(os.environ.get("EMBEDDING_BATCH_SIZE", DEFAULT_LOCAL_EMBEDDING_BATCH_SIZE)),
+                "normalize_embeddings": True,
+            },
+        )
+    if backend != "openai":
+        raise ValueError(f"Unsupported embedding backend: {backend}")
     embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
+        model=get_embedding_model(),
         # With the `text-embedding-3` class
         # of models, you can specify the size
         # of the embeddings you want returned.
         # dimensions=1024
+        max_retries=0,
     )
+    # Rate limits and retries of the embedding requests
+    return GovernedEmbeddings(embeddings, get_governor("openai"))
 
+def get_embeddings():
+    """Get the shared embeddings client, creating it on first use."""
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            _embeddings = _build_embeddings()
 
-    if os.path.exists(VECTOR_DB_PATH) and os.listdir(VECTOR_DB_PATH):
-        # Use the existing vector store
-        vectorstore = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
-    else:
-        # Load documents and create a new vector store
-        loader = DirectoryLoader("./files")
-        docs = loader.load()
+            # Serve repeated texts (re-ingestion, re-chunking, repeated queries)
+            # from the on-disk cache instead of the embeddings API
+            cache_path = os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH)
+            if cache_path:
+                max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES))
+                _embeddings = CachedEmbeddings(_embeddings, cache_path, max_entries=max_entries)
+        return _embeddings
 
-        # Process the new documents
-        semantic_text_splitter = SemanticChunker(embeddings)
-        documents = semantic_text_splitter.split_documents(docs)
+def embed_queries(queries):
+    """Embed search queries in one batch where the embeddings client allows it."""
+    return batch_embed_queries(get_embeddings(), list(queries)) if queries else []
 
-        # Split resulting documents into smaller chunks SemanticChunker
-        # doesn't have a max chunk size parameter, so we use 
-        # RecursiveCharacterTextSplitter to avoid having large chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=400)
-        split_documents = text_splitter.split_documents(documents)
-        vectorstore = Chroma.from_documents(split_documents, embeddings, persist_directory=VECTOR_DB_PATH)
+async def aembed_queries(queries):
+    """Async counterpart of `embed_queries`."""
+    return await abatch_embed_queries(get_embeddings(), list(queries)) if queries else []
+
+def _database_signature():
+    """
+    Fingerprint of the persisted collection on disk.
+
+    Changes whenever another process writes to the database, or when the
+    directory is removed or recreated.
+    """
+    signature = []
+    for filename in ("chroma.sqlite3", "chroma.sqlite3-wal"):
+        try:
+            stat = os.stat(os.path.join(VECTOR_DB_PATH, filename))
+        except FileNotFoundError:
+            signature.append(None)
+            continue
+        signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature) if signature[0] else None
+
+def split_documents(documents):
+    """Chunk documents semantically, then cap the chunk size."""
+    semantic_text_splitter = SemanticChunker(get_embeddings())
+    documents = semantic_text_splitter.split_documents(documents)
+
+    # Split resulting documents into smaller chunks SemanticChunker
+    # doesn't have a max chunk size parameter, so we use
+    # RecursiveCharacterTextSplitter to avoid having large chunks
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_documents(documents)
+
+def get_or_create_vector_db():
+    """
+    Get the shared vector store, opening (or creating) it on first use.
+
+    The handle is reused across calls and threads. It is reopened when the
+    collection on disk was changed by someone else since it was opened.
+    A new, empty collection is populated from ./files.
+    """
+    global _vectorstore, _vectorstore_signature
+    with _lock:
+        signature = _database_signature()
+        if _vectorstore is not None and signature == _vectorstore_signature:
+            VECTOR_DB_STATS["hits"] += 1
+            return _vectorstore
+
+        VECTOR_DB_STATS["misses"] += 1
+        if _vectorstore is not None:
+            VECTOR_DB_STATS["reloads"] += 1
+            # Chroma keeps one System (and its in-memory HNSW index) per path,
+            # the new handle would still search the vectors loaded at open
+            SharedSystemClient.clear_system_cache()
+
+        start = time.perf_counter()
+        _vectorstore = Chroma(
+            collection_name=get_collection_name(),
+            persist_directory=VECTOR_DB_PATH,
+            embedding_function=get_embeddings()
+        )
+        VECTOR_DB_STATS["open_time"] += time.perf_counter() - start
+        _vectorstore_signature = _database_signature()
+
+        vectorstore = _vectorstore
+        num_chunks = vectorstore._collection.count()
+        needs_bootstrap = num_chunks == 0 and os.path.isdir(FILES_PATH)
+        if num_chunks and get_bm25_index().count() == 0:
+            # Collection created before the lexical index existed
+            _rebuild_bm25_index(vectorstore)
+
+    if needs_bootstrap:
+        # Load documents from ./files into the new vector store, outside the
+        # lock since the ingestion pipeline uses the handle from other threads
+        from src.assistant.ingestion import sync_directory
+        sync_directory(FILES_PATH)
 
     return vectorstore
 
+def get_bm25_index():
+    """Get the shared BM25 index stored alongside the Chroma collection."""
+    global _bm25_index
+    with _lock:
+        if _bm25_index is None:
+            os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+            _bm25_index = BM25Index(get_collection_file(BM25_INDEX_FILE))
+        return _bm25_index
+
+def _rebuild_bm25_index(vectorstore, batch_size=1000):
+    """Index every chunk already in the vector store."""
+    print("--- Building BM25 index ---")
+    index = get_bm25_index()
+    offset = 0
+    while True:
+        batch = vectorstore.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        index.add(batch["ids"], batch["documents"], batch["metadatas"])
+        offset += len(batch["ids"])
+
+def reset_vector_db():
+    """Drop the shared handles so the next call reopens the collection."""
+    global _vectorstore, _vectorstore_signature, _bm25_index
+    with _lock:
+        _vectorstore = None
+        _vectorstore_signature = None
+        _bm25_index = None
+
+def warm_up_embeddings():
+    """Load the embedding model and run it once, so the first query doesn't pay for it."""
+    embeddings = get_embeddings()
+    # Bypass the embedding cache, the warm-up text would be served from it
+    getattr(embeddings, "embeddings", embeddings).embed_query("warm up")
+
+def get_vector_db_stats():
+    """Return a snapshot of the shared vector store counters."""
+    with _lock:
+        return dict(VECTOR_DB_STATS)
+
+def _refresh_signature(vectorstore):
+    """Our own writes change the files on disk, but the open handle is still current."""
+    global _vectorstore_signature
+    with _lock:
+        if vectorstore is _vectorstore:
+            _vectorstore_signature = _database_signature()
+
+def _invalidate_query_cache(ids, inserted):
+    """Drop cached query outcomes built from changed chunks."""
+    cache = get_query_cache()
+    if cache is not None:
+        # New chunks may answer queries that had no relevant documents before
+        cache.invalidate_chunks(ids, drop_irrelevant=inserted)
+
+def upsert_chunks(chunks, ids):
+    """
+    Insert or replace chunks in the vector store under the given IDs.
+
+    Args:
+        chunks: List of already split documents
+        ids: One ID per chunk
+    """
+    vectorstore = get_or_create_vector_db()
+    if chunks:
+        vectorstore.add_documents(chunks, ids=ids)
+        get_bm25_index().add(ids, [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks])
+        _invalidate_query_cache(ids, inserted=True)
+        _refresh_signature(vectorstore)
+    return vectorstore
+
+def upsert_embedded_chunks(chunks, ids, vectors):
+    """
+    Write chunks with precomputed embeddings in one bulk upsert.
+
+    Args:
+        chunks: List of already split documents
+        ids: One ID per chunk
+        vectors: One embedding per chunk
+    """
+    vectorstore = get_or_create_vector_db()
+    if chunks:
+        vectorstore._collection.upsert(
+            ids=list(ids),
+            embeddings=vectors,
+            metadatas=[chunk.metadata or None for chunk in chunks],
+            documents=[chunk.page_content for chunk in chunks],
+        )
+        get_bm25_index().add(ids, [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks])
+        _invalidate_query_cache(ids, inserted=True)
+        _refresh_signature(vectorstore)
+    return vectorstore
+
+def delete_chunks(ids):
+    """Remove chunks from the vector store by ID."""
+    vectorstore = get_or_create_vector_db()
+    if ids:
+        vectorstore.delete(ids=list(ids))
+        get_bm25_index().delete(ids)
+        _invalidate_query_cache(ids, inserted=False)
+        _refresh_signature(vectorstore)
+    return vectorstore
+
 def add_documents(documents):
     """
     Add new documents to the existing vector store.
@@ -48,34 +326,111 @@ def add_documents(documents):
     Args:
         documents: List of documents to add to the vector store
     """
-    #embeddings = HuggingFaceEmbeddings()
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        # With the `text-embedding-3` class
-        # of models, you can specify the size
-        # of the embeddings you want returned.
-        # dimensions=1024
-    )
     # Process the new documents
-    semantic_text_splitter = SemanticChunker(embeddings)
-    documents = semantic_text_splitter.split_documents(documents)
+    chunks = split_documents(documents)
+    return upsert_chunks(chunks, [str(uuid.uuid4()) for _ in chunks])
 
-    # Split resulting documents into smaller chunks SemanticChunker
-    # doesn't have a max chunk size parameter, so we use 
-    # RecursiveCharacterTextSplitter to avoid having large chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=400)
-    split_documents = text_splitter.split_documents(documents)
-
-    if os.path.exists(VECTOR_DB_PATH) and os.listdir(VECTOR_DB_PATH):
-        # Add to existing vector store
-        vectorstore = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
-        vectorstore.add_documents(split_documents)
-    else:
-        # Create new vector store if it doesn't exist
-        vectorstore = Chroma.from_documents(
-            split_documents,
-            embeddings,
-            persist_directory=VECTOR_DB_PATH
-        )
+def reciprocal_rank_fusion(rankings, k=DEFAULT_RRF_K):
+    """
+    Merge several ranked lists of documents with reciprocal rank fusion.
+
+    Args:
+        rankings: Lists of documents, best first, identified by `Document.id`
+        k: Fusion constant, larger values flatten the contribution of top ranks
+
+    Returns:
+        The documents ordered by fused score, each ID once
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+def _cosine_similarities(query_embedding, vectors):
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_embedding)
+    return (vectors @ query_embedding) / np.where(norms == 0, 1, norms)
+
+def _search_batch(vectorstore, queries, embeddings, k, fetch_k, rrf_k, mode):
+    """Rank chunks for several queries with a single collection query."""
+    n_results = max(fetch_k, k) if mode == "hybrid" else k
+    if not queries or vectorstore._collection.count() == 0:
+        return {query: [] for query in queries}
+
+    result = vectorstore._collection.query(
+        query_embeddings=embeddings,
+        n_results=n_results,
+        include=["documents", "metadatas", "embeddings"],
+    )
+
+    # One Document per chunk, shared by every query retrieving it
+    documents = {}
+    vectors = {}
+    def shared(id_, text, metadata):
+        if id_ not in documents:
+            documents[id_] = Document(id=id_, page_content=text, metadata=metadata or {})
+        return documents[id_]
+
+    rankings = {}
+    for query, ids, texts, metadatas, chunk_vectors in zip(
+        queries, result["ids"], result["documents"], result["metadatas"], result["embeddings"]
+    ):
+        dense = [shared(*row) for row in zip(ids, texts, metadatas)]
+        vectors.update(zip(ids, chunk_vectors))
+        if mode == "hybrid":
+            sparse = [shared(doc.id, doc.page_content, doc.metadata) for doc, _ in get_bm25_index().search(query, k=n_results)]
+            rankings[query] = reciprocal_rank_fusion([dense, sparse], k=rrf_k)[:k]
+        else:
+            rankings[query] = dense[:k]
+
+    # Chunks only found by BM25 still need their vector for the similarity score
+    missing = [doc.id for ranking in rankings.values() for doc in ranking if doc.id not in vectors]
+    if missing:
+        fetched = vectorstore._collection.get(ids=list(dict.fromkeys(missing)), include=["embeddings"])
+        vectors.update(zip(fetched["ids"], fetched["embeddings"]))
+
+    results = {}
+    for query, embedding in zip(queries, embeddings):
+        # BM25 can still hold chunks Chroma dropped (the two stores are not
+        # updated atomically), those have no vector and are left out
+        ranking = [doc for doc in rankings[query] if doc.id in vectors]
+        scores = _cosine_similarities(embedding, [vectors[doc.id] for doc in ranking]) if ranking else []
+        results[query] = [(doc, float(score)) for doc, score in zip(ranking, scores)]
+    return results
+
+def batch_search(queries, k=DEFAULT_RETRIEVAL_K, fetch_k=DEFAULT_FETCH_K, rrf_k=DEFAULT_RRF_K, mode="hybrid", embeddings=None):
+    """
+    Retrieve chunks for several queries at once.
+
+    All queries are embedded together (one request with the OpenAI client)
+    and searched with one vectorized collection query. Chunks retrieved by
+    several queries are fetched once and shared between their result lists.
+
+    Args:
+        queries: The search queries
+        k: Number of chunks to return per query
+        fetch_k: Number of candidates taken from each retriever in hybrid mode
+        rrf_k: Reciprocal rank fusion constant
+        mode: "hybrid" (BM25 + vector) or "similarity"
+        embeddings: Precomputed query embeddings, embedded here when omitted
+
+    Returns:
+        A dict mapping each query to its `k` best `(chunk, similarity)` pairs,
+        the cosine similarity between the chunk and the query embeddings
+    """
+    vectorstore = get_or_create_vector_db()
+    if embeddings is None:
+        embeddings = embed_queries(queries)
+    return _search_batch(vectorstore, list(queries), embeddings, k, fetch_k, rrf_k, mode)
 
-    return vectorstore
\ No newline at end of file
+async def abatch_search(queries, k=DEFAULT_RETRIEVAL_K, fetch_k=DEFAULT_FETCH_K, rrf_k=DEFAULT_RRF_K, mode="hybrid", embeddings=None):
+    """Async counterpart of `batch_search`."""
+    vectorstore = await asyncio.to_thread(get_or_create_vector_db)
+    if embeddings is None:
+        embeddings = await aembed_queries(queries)
+    return await asyncio.to_thread(_search_batch, vectorstore, list(queries), embeddings, k, fetch_k, rrf_k, mode)
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+# Tests import the app modules as `src.assistant.*`, like the scripts at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chromadb.api.shared_system_client import SharedSystemClient
+from benchmarks.fakes import FakeEmbeddings, Latency
+from src.assistant import vector_db
+
+EMBEDDING_SIZE = 16
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Empty working directory with the vector store on fake embeddings and no caches."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("QUERY_CACHE_PATH", "LLM_CACHE_PATH", "CHECKPOINT_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(vector_db, "_embeddings", FakeEmbeddings(size=EMBEDDING_SIZE, latency=Latency(0, 0)))
+    vector_db.reset_vector_db()
+    yield tmp_path
+    vector_db.reset_vector_db()
+    SharedSystemClient.clear_system_cache()
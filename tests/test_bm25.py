@@ -0,0 +1,42 @@
+from langchain_core.documents import Document
+from src.assistant.bm25 import BM25Index, tokenize
+from src.assistant.vector_db import reciprocal_rank_fusion
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("What is the Capital of France?") == ["capital", "france"]
+
+def test_search_ranks_by_term_frequency_and_rarity(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    index.add(
+        ["a", "b", "c"],
+        ["solar panels and solar inverters", "wind turbines", "solar power in general, wind too"],
+        [{"source": "a.txt"}, {"source": "b.txt"}, {"source": "c.txt"}],
+    )
+    results = index.search("solar inverters")
+    assert [doc.id for doc, _ in results] == ["a", "c"]
+    assert results[0][1] > results[1][1]
+    assert results[0][0].metadata == {"source": "a.txt"}
+    assert index.search("the of") == []
+
+def test_reindexing_and_deleting_chunks(tmp_path):
+    path = str(tmp_path / "bm25.sqlite3")
+    index = BM25Index(path)
+    index.add(["a", "b"], ["solar panels", "wind turbines"], [{}, {}])
+    index.add(["a"], ["hydro dams"], [{}])
+    assert index.search("solar") == []
+    assert [doc.id for doc, _ in index.search("hydro")] == ["a"]
+
+    index.delete(["b"])
+    assert index.count() == 1
+    # Shared by other processes through the SQLite file
+    assert BM25Index(path).count() == 1
+
+def test_reciprocal_rank_fusion_favors_documents_ranked_by_both():
+    a, b, c, d = (Document(id=id_, page_content=id_) for id_ in "abcd")
+    fused = reciprocal_rank_fusion([[a, b, c], [c, d, b]], k=60)
+    assert [doc.id for doc in fused] == ["c", "b", "a", "d"]
+
+def test_reciprocal_rank_fusion_keeps_each_document_once():
+    first = Document(id="a", page_content="first copy")
+    fused = reciprocal_rank_fusion([[first], [Document(id="a", page_content="second copy")]])
+    assert fused == [first]
@@ -0,0 +1,62 @@
+import asyncio
+import operator
+from typing import Annotated
+from typing_extensions import TypedDict
+from langgraph.graph import END, START, StateGraph
+from src.assistant.checkpoints import new_thread_id, node_updates, open_async_checkpointer, resume_input
+
+class State(TypedDict):
+    steps: Annotated[list, operator.add]
+
+def build_graph(checkpointer, fail):
+    def first(state):
+        return {"steps": ["first"]}
+
+    def second(state):
+        if fail["second"]:
+            fail["second"] = False
+            raise RuntimeError("interrupted")
+        return {"steps": ["second"]}
+
+    builder = StateGraph(State)
+    builder.add_node("first", first)
+    builder.add_node("second", second)
+    builder.add_edge(START, "first")
+    builder.add_edge("first", "second")
+    builder.add_edge("second", END)
+    return builder.compile(checkpointer=checkpointer)
+
+async def run(graph, inputs, config):
+    nodes = []
+    async for output in graph.astream(inputs, config=config, stream_mode="updates"):
+        nodes.extend(key for key, _ in node_updates(output))
+    return nodes
+
+def test_interrupted_run_resumes_and_completed_run_starts_over(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_PATH", str(tmp_path / "checkpoints.sqlite3"))
+    initial_state = {"steps": []}
+
+    async def main():
+        async with open_async_checkpointer() as checkpointer:
+            graph = build_graph(checkpointer, {"second": True})
+            config = {"configurable": {"thread_id": new_thread_id()}}
+            try:
+                await run(graph, await resume_input(graph, config, initial_state), config)
+            except RuntimeError:
+                pass
+
+            # Resumed: only the node that failed runs again, no `__metadata__` entry
+            assert await resume_input(graph, config, initial_state) is None
+            assert await run(graph, None, config) == ["second"]
+            assert (await graph.aget_state(config)).values["steps"] == ["first", "second"]
+
+            # Completed but not deleted: starts over without the old state
+            assert await resume_input(graph, config, initial_state) == initial_state
+            assert await run(graph, initial_state, config) == ["first", "second"]
+            assert (await graph.aget_state(config)).values["steps"] == ["first", "second"]
+
+    asyncio.run(main())
+
+def test_node_updates_skips_langgraph_entries():
+    output = {"first": {"steps": ["first"]}, "__metadata__": {"cached": True}, "__interrupt__": ()}
+    assert node_updates(output) == [("first", {"steps": ["first"]})]
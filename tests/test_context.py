@@ -0,0 +1,38 @@
+from src.assistant.context import SEPARATOR, TRUNCATION_MARKER, build_context
+from src.assistant.tokens import count_tokens
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+def test_context_fits_the_token_budget():
+    passages = [(f"doc{i}", words(f"w{i}_", 300)) for i in range(10)]
+    context, report = build_context(passages, token_budget=500)
+    assert count_tokens(context) <= 500
+    assert report["tokens_out"] <= 500
+    assert report["passages_kept"] < len(passages)
+    assert report["passages_total"] == len(passages)
+
+def test_near_duplicates_are_dropped():
+    text = words("same", 50)
+    passages = [("a", text), ("b", text + " extra"), ("c", words("other", 50))]
+    context, report = build_context(passages, token_budget=10_000)
+    assert report["duplicates_removed"] == 1
+    assert report["passages_kept"] == 2
+    assert "Source: b" not in context
+    assert context.count(SEPARATOR) == 1
+
+def test_passages_are_truncated_per_source():
+    passages = [("a", words("first", 200)), ("a", words("second", 200)), ("b", words("third", 50))]
+    context, report = build_context(passages, token_budget=10_000, max_tokens_per_source=100)
+    assert report["truncated"] == 1
+    assert context.count(TRUNCATION_MARKER) == 1
+    # The source is full after the first passage, the second one is skipped
+    assert "second0" not in context
+    assert "third49" in context
+
+def test_passages_without_room_for_text_are_skipped():
+    passages = [("a", words("first", 40)), ("b", words("second", 200))]
+    budget = count_tokens(build_context(passages[:1], token_budget=10_000)[0]) + 2
+    context, report = build_context(passages, token_budget=budget)
+    assert report["passages_kept"] == 1
+    assert not context.endswith(TRUNCATION_MARKER)
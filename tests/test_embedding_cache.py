@@ -0,0 +1,54 @@
+import asyncio
+import itertools
+import pytest
+from benchmarks.fakes import FakeEmbeddings, Latency
+from src.assistant import embedding_cache
+from src.assistant.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Strictly increasing access times, so LRU order does not depend on timer resolution."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+def slots(store):
+    return dict(store._conn.execute("SELECT key, slot FROM entries").fetchall())
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_entries=2)
+    store.put([("a", [1.0, 0.0]), ("b", [0.0, 1.0])])
+    store.get(["a"])
+    store.put([("c", [1.0, 1.0])])
+    assert set(store.get(["a", "b", "c"])) == {"a", "c"}
+
+def test_evicted_slots_are_reused(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_entries=2)
+    store.put([("a", [1.0, 0.0]), ("b", [0.0, 1.0])])
+    freed = slots(store)["a"]
+    store.put([("c", [2.0, 2.0])])
+    assert slots(store)["c"] == freed
+    assert store.get(["c"]) == {"c": [2.0, 2.0]}
+    assert store.get(["b"]) == {"b": [0.0, 1.0]}
+
+def test_overwriting_a_full_store_evicts_nothing(tmp_path):
+    store = EmbeddingStore(str(tmp_path), max_entries=2)
+    store.put([("a", [1.0, 0.0]), ("b", [0.0, 1.0])])
+    store.put([("a", [3.0, 3.0])])
+    assert store.get(["a", "b"]) == {"a": [3.0, 3.0], "b": [0.0, 1.0]}
+
+def test_store_is_shared_between_instances(tmp_path):
+    EmbeddingStore(str(tmp_path)).put([("a", [0.5] * 4)])
+    assert EmbeddingStore(str(tmp_path)).get(["a"]) == {"a": [0.5] * 4}
+
+def test_cached_embeddings_only_embed_missing_texts(tmp_path):
+    fake = FakeEmbeddings(size=8, latency=Latency(0, 0))
+    cached = CachedEmbeddings(fake, str(tmp_path))
+    first = cached.embed_documents(["a", "b", "a"])
+    # Stored as float32
+    assert cached.embed_documents(["b", "c"])[0] == pytest.approx(first[1], rel=1e-6)
+    assert asyncio.run(cached.aembed_documents(["a", "c"]))[0] == pytest.approx(first[0], rel=1e-6)
+    assert fake.requests == 2
+    # Queries are cached apart from documents
+    cached.embed_query("a")
+    assert fake.requests == 3
+    assert cached.stats()["misses"] == 4
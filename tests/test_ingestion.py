@@ -0,0 +1,19 @@
+from src.assistant.ingestion import load_manifest, sync_directory
+from src.assistant.vector_db import get_or_create_vector_db
+
+def write_files(directory, count):
+    directory.mkdir()
+    for i in range(count):
+        (directory / f"doc{i}.txt").write_text(f"Document {i} is about topic {i}. " * 20, encoding="utf-8")
+
+def test_files_are_loaded_in_worker_processes(workspace):
+    files = workspace / "files"
+    write_files(files, 4)
+    report = sync_directory(str(files), workers=2)
+    assert report["added"] == 4 and report["failed"] == 0
+    assert len(get_or_create_vector_db().get(include=[])["ids"]) == report["chunks"]
+
+    (files / "doc0.txt").unlink()
+    report = sync_directory(str(files), workers=2)
+    assert report["unchanged"] == 3 and report["removed"] == 1
+    assert len(load_manifest()["files"]) == 3
@@ -0,0 +1,57 @@
+import time
+from src.assistant import query_cache
+from src.assistant.query_cache import QueryResultCache, query_cache_config_key
+
+CONFIG_KEY = query_cache_config_key({}, "text-embedding-3-large", "langchain")
+
+def test_config_key_depends_on_embedding_model_and_collection():
+    assert query_cache_config_key({}, "text-embedding-3-large", "langchain") == CONFIG_KEY
+    assert query_cache_config_key({}, "all-MiniLM-L6-v2", "langchain") != CONFIG_KEY
+    assert query_cache_config_key({}, "text-embedding-3-large", "other") != CONFIG_KEY
+    assert query_cache_config_key({"retrieval_k": 5}, "text-embedding-3-large", "langchain") != CONFIG_KEY
+
+def store(cache, query, embedding, chunk_ids, is_relevant=True):
+    cache.store(query, embedding, CONFIG_KEY, chunk_ids, is_relevant, [f"summary of {query}"])
+
+def test_lookup_returns_the_most_similar_entry_above_the_threshold(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "queries.sqlite3"))
+    store(cache, "solar", [1.0, 0.0], ["c1"])
+    store(cache, "wind", [0.0, 1.0], ["c2"])
+    hit = cache.lookup([0.99, 0.05], CONFIG_KEY, threshold=0.95)
+    assert hit["query"] == "solar" and hit["chunk_ids"] == ["c1"]
+    assert cache.lookup([0.7, 0.7], CONFIG_KEY, threshold=0.95) is None
+    assert cache.lookup([1.0, 0.0], query_cache_config_key({}, "other-model", "langchain")) is None
+
+def test_updated_chunks_invalidate_their_entries(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "queries.sqlite3"))
+    store(cache, "solar", [1.0, 0.0], ["c1", "c2"])
+    store(cache, "wind", [0.0, 1.0], ["c3"])
+    cache.invalidate_chunks(["c2"])
+    assert cache.lookup([1.0, 0.0], CONFIG_KEY) is None
+    assert cache.lookup([0.0, 1.0], CONFIG_KEY)["query"] == "wind"
+    assert cache.stats()["invalidations"] == 1
+
+def test_new_chunks_invalidate_irrelevant_entries(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "queries.sqlite3"))
+    store(cache, "solar", [1.0, 0.0], [], is_relevant=False)
+    store(cache, "wind", [0.0, 1.0], ["c3"])
+    cache.invalidate_chunks(["c9"])
+    assert cache.lookup([1.0, 0.0], CONFIG_KEY) is not None
+    cache.invalidate_chunks(["c9"], drop_irrelevant=True)
+    assert cache.lookup([1.0, 0.0], CONFIG_KEY) is None
+    assert cache.lookup([0.0, 1.0], CONFIG_KEY) is not None
+
+def test_invalidation_by_another_process_is_seen(tmp_path):
+    path = str(tmp_path / "queries.sqlite3")
+    cache = QueryResultCache(path)
+    store(cache, "solar", [1.0, 0.0], ["c1"])
+    assert cache.lookup([1.0, 0.0], CONFIG_KEY) is not None
+    QueryResultCache(path).invalidate_chunks(["c1"])
+    assert cache.lookup([1.0, 0.0], CONFIG_KEY) is None
+
+def test_expired_entries_are_not_served(tmp_path, monkeypatch):
+    cache = QueryResultCache(str(tmp_path / "queries.sqlite3"), ttl=60)
+    store(cache, "solar", [1.0, 0.0], ["c1"])
+    now = time.time()
+    monkeypatch.setattr(query_cache.time, "time", lambda: now + 120)
+    assert cache.lookup([1.0, 0.0], CONFIG_KEY) is None
@@ -0,0 +1,19 @@
+from src.assistant.query_dedup import dedupe_queries
+
+def test_near_duplicates_merge_into_the_first_query():
+    queries = ["solar costs", "cost of solar", "wind turbines", "solar prices"]
+    embeddings = [[1.0, 0.0], [0.99, 0.05], [0.0, 1.0], [0.98, 0.1]]
+    kept, merged = dedupe_queries(queries, embeddings, threshold=0.9)
+    assert kept == [0, 2]
+    assert merged == {"solar costs": ["cost of solar", "solar prices"], "wind turbines": []}
+
+def test_distinct_queries_are_all_kept():
+    queries = ["a", "b", "c"]
+    kept, merged = dedupe_queries(queries, [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    assert kept == [0, 1, 2]
+    assert merged == {"a": [], "b": [], "c": []}
+
+def test_zero_vectors_and_empty_input():
+    kept, _ = dedupe_queries(["a", "b"], [[0.0, 0.0], [0.0, 0.0]])
+    assert kept == [0, 1]
+    assert dedupe_queries([], []) == ([], {})
@@ -0,0 +1,22 @@
+import pytest
+from fastapi import HTTPException
+from service import _client_configurable
+
+def test_client_settings_are_clamped():
+    settings = _client_configurable({"max_search_queries": 500, "retrieval_k": 0, "enable_web_search": False})
+    assert settings == {"max_search_queries": 10, "retrieval_k": 1, "enable_web_search": False}
+
+@pytest.mark.parametrize("configurable", [
+    {"max_concurrent_queries": 1},
+    {"llm_backend": "ollama"},
+    {"enable_web_search": "false"},
+    {"stream_report": 1},
+    {"max_search_queries": "3"},
+    {"max_search_queries": True},
+    {"report_structure": ["# Introduction"]},
+    {"report_structure": "#" * 100_000},
+])
+def test_invalid_client_settings_are_refused(configurable):
+    with pytest.raises(HTTPException) as error:
+        _client_configurable(configurable)
+    assert error.value.status_code == 400
@@ -0,0 +1,38 @@
+import pytest
+from src.assistant.utils import ThinkTagParser
+
+TEXT = "<think>Weighing the sources.</think>\n\nThe answer."
+
+def parse(chunks, keep_reasoning=True):
+    streamed = []
+    parser = ThinkTagParser(on_answer=streamed.append, keep_reasoning=keep_reasoning)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser, "".join(streamed)
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, len(TEXT)])
+def test_tags_split_across_chunks(size):
+    parser, streamed = parse([TEXT[i:i + size] for i in range(0, len(TEXT), size)])
+    assert parser.answer == "The answer."
+    assert parser.reasoning == "Weighing the sources."
+    assert streamed == "The answer."
+
+def test_reasoning_is_never_streamed_nor_kept_by_default():
+    reasoning = []
+    parser = ThinkTagParser(on_reasoning=reasoning.append)
+    for chunk in ["<thi", "nk>secret", "</th", "ink>answer"]:
+        parser.feed(chunk)
+    parser.close()
+    assert parser.answer == "answer"
+    assert parser.reasoning == ""
+    assert "".join(reasoning) == "secret"
+
+def test_partial_tag_that_is_not_a_tag_is_answer_text():
+    parser, streamed = parse(["a <thin", "g> b <", "/x>"])
+    assert parser.answer == "a <thing> b </x>"
+    assert streamed == "a <thing> b </x>"
+
+def test_unterminated_partial_tag_is_flushed_on_close():
+    parser, _ = parse(["answer <thi"])
+    assert parser.answer == "answer <thi"
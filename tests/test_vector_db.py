@@ -0,0 +1,30 @@
+import subprocess
+import sys
+import textwrap
+from langchain_core.documents import Document
+from src.assistant import vector_db
+
+# Writes chunks to the collection in the current directory from another process
+WRITER = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {root!r})
+    from langchain_core.documents import Document
+    from benchmarks.fakes import FakeEmbeddings, Latency
+    from src.assistant import vector_db
+    vector_db._embeddings = FakeEmbeddings(size={size}, latency=Latency(0, 0))
+    vector_db.get_or_create_vector_db().add_documents(
+        [Document(page_content=f"chunk {{i}}") for i in range(1, 6)],
+        ids=[f"c{{i}}" for i in range(1, 6)],
+    )
+""")
+
+def test_similarity_search_sees_chunks_written_by_another_process(workspace, request):
+    vector_db.get_or_create_vector_db().add_documents([Document(page_content="chunk 0")], ids=["c0"])
+    assert len(vector_db.batch_search(["query"], k=6, mode="similarity")["query"]) == 1
+
+    root = str(request.config.rootpath)
+    subprocess.run([sys.executable, "-c", WRITER.format(root=root, size=vector_db._embeddings.size)], check=True)
+
+    results = vector_db.batch_search(["query"], k=6, mode="similarity")["query"]
+    assert sorted(doc.id for doc, _ in results) == [f"c{i}" for i in range(6)]
+    assert vector_db.get_vector_db_stats()["reloads"] >= 1
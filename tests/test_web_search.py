@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from src.assistant import utils
+
+class FakeBackend:
+    """Search backend returning page contents for some results only."""
+
+    name = "fake"
+
+    def __init__(self, pages, failing=()):
+        self.pages = pages
+        self.failing = set(failing)
+        self.searches = 0
+        self.extracted = []
+
+    def search(self, query, max_results, include_raw_content=False):
+        self.searches += 1
+        results = []
+        for url, page in list(self.pages.items())[:max_results]:
+            result = {"title": url, "url": url, "content": f"snippet of {url}"}
+            # Like Tavily, the search cannot return the content of every page
+            if include_raw_content and url != "https://a.example/2":
+                result["raw_content"] = page
+            results.append(result)
+        return results
+
+    async def asearch(self, query, max_results, include_raw_content=False):
+        return self.search(query, max_results, include_raw_content)
+
+    def extract(self, url):
+        self.extracted.append(url)
+        if url in self.failing:
+            raise RuntimeError("fetch failed")
+        return self.pages[url]
+
+    async def aextract(self, url):
+        return self.extract(url)
+
+PAGES = {f"https://a.example/{i}": f"page {i}" for i in range(1, 4)}
+
+@pytest.fixture
+def backend(workspace, monkeypatch):
+    monkeypatch.setenv("WEB_CACHE_PATH", str(workspace / "web_cache.sqlite3"))
+    backend = FakeBackend(PAGES)
+    utils.set_web_search_backend(backend)
+    yield backend
+    utils.set_web_search_backend(None)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_pages_come_with_the_search_and_only_missing_ones_are_fetched(backend, mode):
+    search = utils.web_search if mode == "sync" else lambda q: asyncio.run(utils.aweb_search(q))
+    results = search("solar power")["results"]
+    assert [result["raw_content"] for result in results] == ["page 1", "page 2", "page 3"]
+    assert backend.searches == 1
+    assert backend.extracted == ["https://a.example/2"]
+
+    # Cached response and pages, no more provider calls
+    results = search("Solar  power")["results"]
+    assert [result["raw_content"] for result in results] == ["page 1", "page 2", "page 3"]
+    assert backend.searches == 1
+    assert backend.extracted == ["https://a.example/2"]
+
+def test_failed_page_fetch_keeps_the_snippet(backend):
+    backend.failing.add("https://a.example/2")
+    results = utils.web_search("wind power")["results"]
+    assert "raw_content" not in results[1]
+    assert results[0]["raw_content"] == "page 1"